@@ -0,0 +1,154 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Measures the cost of decoding large response bodies, with requests'
+Response.json() as before, and with each json_loads the client may use.
+
+The bodies are generated to the shape and size of real responses: a 25x25
+distance matrix, directions with alternatives, and a ten day hourly weather
+forecast. JSON libraries which aren't installed are skipped.
+
+    $ PYTHONPATH=. python benchmarks/json_decoding.py
+"""
+
+import importlib
+import json
+import timeit
+
+import requests
+
+from googlemaps import client as _client
+
+N = 20
+
+
+def distance_matrix(size=25):
+    element = {
+        "distance": {"text": "1,234 km", "value": 1234567},
+        "duration": {"text": "12 hours 34 mins", "value": 45240},
+        "duration_in_traffic": {"text": "13 hours 1 min", "value": 46860},
+        "status": "OK",
+    }
+    return {
+        "destination_addresses": ["%d Main St, Springfield, USA" % i
+                                  for i in range(size)],
+        "origin_addresses": ["%d High St, Shelbyville, USA" % i
+                             for i in range(size)],
+        "rows": [{"elements": [element] * size} for _ in range(size)],
+        "status": "OK",
+    }
+
+
+def directions(routes=3, steps=60):
+    location = {"lat": -33.8674869, "lng": 151.2069902}
+    step = {
+        "distance": {"text": "0.3 km", "value": 312},
+        "duration": {"text": "1 min", "value": 45},
+        "end_location": location,
+        "html_instructions": "Turn <b>left</b> onto <b>George St</b>"
+                             "<div style=\"font-size:0.9em\">Pass by the "
+                             "Town Hall (on the right)</div>",
+        "maneuver": "turn-left",
+        "polyline": {"points": "nnhgFoqubMbBzAx@n@lAbAh@`@v@l@" * 4},
+        "start_location": location,
+        "travel_mode": "DRIVING",
+    }
+    leg = {
+        "distance": {"text": "18.7 km", "value": 18672},
+        "duration": {"text": "27 mins", "value": 1620},
+        "end_address": "Parramatta NSW 2150, Australia",
+        "end_location": location,
+        "start_address": "Sydney NSW, Australia",
+        "start_location": location,
+        "steps": [step] * steps,
+    }
+    return {
+        "geocoded_waypoints": [{"geocoder_status": "OK",
+                                "place_id": "ChIJP3Sa8ziYEmsRUKgyFmh9AQM",
+                                "types": ["locality", "political"]}] * 2,
+        "routes": [{
+            "bounds": {"northeast": location, "southwest": location},
+            "copyrights": "Map data (c)2025",
+            "legs": [leg],
+            "overview_polyline": {"points": "nnhgFoqubMbBzAx@n@" * 200},
+            "summary": "M4",
+            "warnings": [],
+            "waypoint_order": [],
+        }] * routes,
+        "status": "OK",
+    }
+
+
+def weather_forecast(hours=240):
+    hour = {
+        "interval": {"startTime": "2025-01-28T22:00:00Z",
+                     "endTime": "2025-01-28T23:00:00Z"},
+        "displayDateTime": {"year": 2025, "month": 1, "day": 28, "hours": 14,
+                            "utcOffset": "-28800s"},
+        "weatherCondition": {
+            "iconBaseUri": "https://maps.gstatic.com/weather/v1/cloudy",
+            "description": {"text": "Cloudy", "languageCode": "en"},
+            "type": "CLOUDY",
+        },
+        "temperature": {"degrees": 13.1, "unit": "CELSIUS"},
+        "feelsLikeTemperature": {"degrees": 12.2, "unit": "CELSIUS"},
+        "dewPoint": {"degrees": 4.3, "unit": "CELSIUS"},
+        "precipitation": {"probability": {"percent": 10, "type": "RAIN"},
+                          "qpf": {"quantity": 0.0, "unit": "MILLIMETERS"}},
+        "wind": {"direction": {"degrees": 315, "cardinal": "NORTHWEST"},
+                 "speed": {"value": 9, "unit": "KILOMETERS_PER_HOUR"},
+                 "gust": {"value": 18, "unit": "KILOMETERS_PER_HOUR"}},
+        "relativeHumidity": 54,
+        "uvIndex": 0,
+        "cloudCover": 84,
+    }
+    return {"forecastHours": [hour] * hours,
+            "timeZone": {"id": "America/Los_Angeles"}}
+
+
+def requests_json(body):
+    """Decodes a body as requests.Response.json() does."""
+    response = requests.Response()
+    response._content = body
+    return response.json()
+
+
+def decoders():
+    yield "requests .json()", requests_json
+    yield "json.loads", json.loads
+    for name in _client._FAST_JSON_MODULES:
+        try:
+            yield "%s.loads" % name, importlib.import_module(name).loads
+        except ImportError:
+            pass
+
+
+def main():
+    fixtures = [("distance_matrix 25x25", distance_matrix()),
+                ("directions x3", directions()),
+                ("weather 240h", weather_forecast())]
+    for fixture, value in fixtures:
+        body = json.dumps(value).encode("utf-8")
+        print("%s (%d KB)" % (fixture, len(body) // 1024))
+        for name, loads in decoders():
+            seconds = min(timeit.repeat(lambda: loads(body), number=N,
+                                        repeat=3))
+            print("  %-20s %8.2f ms/body" % (name, seconds / N * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Compares parsing a large response in full with streaming its items
+through jsonstream.ArrayStream: the time until the first item can be used,
+the total time, and the peak memory held while the items are used one at a
+time.
+
+The bodies are those of benchmarks/json_decoding.py, with longer routes,
+read in the chunks a response would be. Timings exclude the network, so the
+time to the first item understates the gain when the body is still arriving.
+Each route is parsed again as more of it arrives, so streaming directions
+trades time for memory.
+
+    $ PYTHONPATH=. python benchmarks/json_streaming.py
+"""
+
+import json
+import time
+import tracemalloc
+
+from googlemaps import jsonstream
+
+from json_decoding import directions
+from json_decoding import distance_matrix
+
+
+def chunks(body):
+    size = jsonstream._CHUNK_SIZE
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def parse_in_full(body, key, skip_keys):
+    return iter(json.loads(b"".join(chunks(body)))[key])
+
+
+def parse_streaming(body, key, skip_keys):
+    return iter(jsonstream.ArrayStream(chunks(body), key, skip_keys))
+
+
+def measure(parse, body, key, skip_keys):
+    tracemalloc.start()
+    start = time.perf_counter()
+    items = parse(body, key, skip_keys)
+    next(items)
+    first = time.perf_counter() - start
+    for _ in items:
+        pass
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first, total, peak
+
+
+def main():
+    fixtures = [
+        ("distance_matrix 25x25", distance_matrix(), "rows", None),
+        ("directions x3, 300 steps", directions(steps=300), "routes",
+         None),
+        ("  skip_keys=['steps']", directions(steps=300), "routes",
+         ["steps"]),
+    ]
+    for fixture, value, key, skip_keys in fixtures:
+        body = json.dumps(value).encode("utf-8")
+        print("%s (%d KB)" % (fixture, len(body) // 1024))
+        for name, parse in (("in full", parse_in_full),
+                            ("streaming", parse_streaming)):
+            first, total, peak = measure(parse, body, key, skip_keys)
+            print("  %-10s first %7.2f ms   total %7.2f ms   peak %7.0f KB"
+                  % (name, first * 1000, total * 1000, peak / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Measures the cost of admitting one request through each rate limiter.
+
+The quotas are set high enough that no request is ever made to pause, so
+the timings are of the limiters' own bookkeeping.
+
+    $ PYTHONPATH=. python benchmarks/ratelimit_admission.py
+"""
+
+import os
+import tempfile
+import timeit
+
+from googlemaps import ratelimit
+
+N = 200000
+QPS = 1e9
+
+
+def report(name, limiter):
+    seconds = min(timeit.repeat(limiter.reserve, number=N, repeat=3))
+    print("%-32s %8.2f us/request" % (name, seconds / N * 1e6))
+
+
+def main():
+    report("TokenBucket", ratelimit.TokenBucket(QPS))
+    report("quota_rate_limiter (qps + qpm)",
+           ratelimit.quota_rate_limiter(QPS, QPS * 60))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "quota")
+        report("SharedRateLimiter (qps + qpm)",
+               ratelimit.SharedRateLimiter(path, QPS, QPS * 60))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Measures the throughput and latency of each transport, sending geocode
+requests from a pool of threads to a local stand-in for the API.
+
+The stand-in answers every request after a fixed delay, as a remote server
+would. The HTTP/1.1 transports get one connection per thread, while the
+HTTP/2 transport multiplexes all threads over a single connection to a
+stand-in speaking HTTP/2 without TLS (h2c). HTTP2Transport requires httpx
+with HTTP/2 support, and is skipped without it.
+
+    $ PYTHONPATH=. python benchmarks/transport_throughput.py
+"""
+
+import asyncio
+import concurrent.futures
+import http.server
+import json
+import threading
+import time
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+except ImportError:
+    h2 = None
+
+import requests
+
+import googlemaps
+from googlemaps import pool
+from googlemaps import transport
+
+REQUESTS = 2000
+THREADS = 50
+SERVER_DELAY = 0.01
+BODY = json.dumps({"status": "OK", "results": [
+    {"place_id": "ChIJP3Sa8ziYEmsRUKgyFmh9AQM",
+     "formatted_address": "Sydney NSW, Australia"}]}).encode("utf-8")
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(SERVER_DELAY)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+if h2 is not None:
+    class _H2Protocol(asyncio.Protocol):
+        """Answers each HTTP/2 stream after SERVER_DELAY."""
+
+        def connection_made(self, transport):
+            self.transport = transport
+            self.conn = h2.connection.H2Connection(
+                h2.config.H2Configuration(client_side=False))
+            self.conn.initiate_connection()
+            transport.write(self.conn.data_to_send())
+
+        def data_received(self, data):
+            loop = asyncio.get_event_loop()
+            for event in self.conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    loop.call_later(SERVER_DELAY, self.respond,
+                                    event.stream_id)
+            self.transport.write(self.conn.data_to_send())
+
+        def respond(self, stream_id):
+            self.conn.send_headers(stream_id, [
+                (":status", "200"), ("content-type", "application/json"),
+                ("content-length", str(len(BODY)))])
+            self.conn.send_data(stream_id, BODY, end_stream=True)
+            self.transport.write(self.conn.data_to_send())
+
+
+def serve_http1():
+    server = _Server(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return "http://127.0.0.1:%d" % server.server_port
+
+
+def serve_h2c():
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        loop.create_server(_H2Protocol, "127.0.0.1", 0))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return "http://127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+
+
+def report(name, base_url, backend):
+    client = googlemaps.Client(key="AIzaasdf", base_url=base_url,
+                               transport=backend, queries_per_second=None,
+                               queries_per_minute=1e9)
+    latencies = []
+
+    def call(i):
+        start = time.perf_counter()
+        client._request("/maps/api/geocode/json", {"address": str(i)})
+        latencies.append(time.perf_counter() - start)
+
+    call(-1)  # Warm up.
+    latencies.clear()
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(THREADS) as executor:
+        list(executor.map(call, range(REQUESTS)))
+    elapsed = time.perf_counter() - start
+    backend.close()
+
+    latencies.sort()
+    print("%-20s %8.0f req/s   p50 %6.1f ms   p99 %6.1f ms" % (
+        name, REQUESTS / elapsed,
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.99)] * 1000))
+
+
+def main():
+    http1 = serve_http1()
+    session = requests.Session()
+    pool.mount_adapters(session, THREADS)
+    report("RequestsTransport", http1, transport.RequestsTransport(session))
+    report("Urllib3Transport", http1,
+           transport.Urllib3Transport(pool_maxsize=THREADS))
+
+    if transport.httpx is None or h2 is None:
+        print("HTTP2Transport       skipped: pip install googlemaps[http2]")
+        return
+    report("HTTP2Transport", serve_h2c(),
+           transport.HTTP2Transport(http1=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,8 @@
 __version__ = "4.10.TEST.0"
 
 from googlemaps.client import Client
+from googlemaps.async_client import AsyncClient
 from googlemaps import exceptions
 
 
-__all__ = ["Client", "exceptions"]
+__all__ = ["Client", "AsyncClient", "exceptions"]
@@ -16,6 +16,7 @@
 #
 
 """Performs requests to the Google Maps Address Validation API."""
+from googlemaps import client as _client
 from googlemaps import exceptions
 
 
@@ -27,7 +28,7 @@ def _addressvalidation_extract(response):
     Mimics the exception handling logic in ``client._get_body``, but
     for addressvalidation which uses a different response format.
     """
-    body = response.json()
+    body = _client._decode_body(response)
     return body
 
     # if response.status_code in (200, 404):
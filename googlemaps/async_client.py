@@ -0,0 +1,662 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""
+Asynchronous client, performing the same API requests as googlemaps.Client
+on top of asyncio and aiohttp.
+"""
+
+import asyncio
+import collections
+from datetime import datetime
+import functools
+import time
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is only required for AsyncClient.
+    aiohttp = None
+
+import googlemaps
+import googlemaps.ratelimit
+import googlemaps.transport
+from googlemaps import client as _client
+
+logger = _client.logger
+
+# The arguments of googlemaps.Client which configure its requests session,
+# or warm up the connections of that session, and so don't apply to an
+# AsyncClient.
+_REQUESTS_ARGS = ("requests_session", "transport", "pool_maxsize",
+                  "pool_block", "pool_keepalive", "pools", "warmup_hosts",
+                  "warmup_connections", "rewarm_interval")
+
+
+class AsyncClient(_client.Client):
+    """Performs requests to the Google Maps API web services using asyncio.
+
+    Every API method of googlemaps.Client, as well as the weather, solar and
+    air quality functions, is available as a coroutine method, e.g.::
+
+        async with googlemaps.AsyncClient(key="AIza...") as client:
+            results = await asyncio.gather(
+                client.geocode("Sydney"), client.geocode("Melbourne"))
+    """
+
+    def __init__(self, *args, aiohttp_session=None, **kwargs):
+        """
+        Takes the same arguments as googlemaps.Client, other than
+        requests_session, transport, the pool_* arguments and those warming
+        up connections, as requests are sent with aiohttp instead.
+
+        :param aiohttp_session: Reused persistent session. If not set, a
+            session is created on the first request and closed by close().
+            Its connector's limits size its connection pools.
+        :type aiohttp_session: aiohttp.ClientSession
+
+        :raises ImportError: if aiohttp is not installed.
+        :raises TypeError: if given an argument which only applies to
+            googlemaps.Client.
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncClient requires aiohttp. Install it with "
+                              "`pip install googlemaps[async]`.")
+        for name in _REQUESTS_ARGS:
+            if name in kwargs:
+                raise TypeError("AsyncClient sends requests with aiohttp, "
+                                "so doesn't take %s. Configure the "
+                                "aiohttp_session instead." % name)
+
+        super().__init__(*args, **kwargs)
+        self.session = aiohttp_session
+        self._owns_session = aiohttp_session is None
+        # The tasks refreshing stale cached responses.
+        self._refreshes = set()
+
+    @property
+    def session(self):
+        """The aiohttp session, shared by the client's views."""
+        return self._root._session
+
+    @session.setter
+    def session(self, session):
+        self._root._session = session
+
+    def _init_transport(self, requests_session, transport, pool_settings):
+        # Requests are sent with the aiohttp session, by _send_request.
+        self.session = None
+        self.transport = None
+
+    def view(self, *args, **kwargs):
+        view = super().view(*args, **kwargs)
+        view._owns_session = False
+        return view
+
+    async def map(self, method, kwargs_iterable,
+                  max_workers=_client._DEFAULT_MAP_WORKERS, ordered=True):
+        """Calls an API method once per item of kwargs_iterable, with up to
+        max_workers calls in flight at once, yielding a MapResult for each
+        call as googlemaps.Client.map does. An asynchronous generator::
+
+            async for r in client.map("geocode", [{"address": "Sydney"},
+                                                  {"address": "Melbourne"}]):
+                if r.exception is None:
+                    print(r.kwargs["address"], r.result)
+
+        :param method: The name of an AsyncClient API method, e.g.
+            "geocode", or a function that takes a client as its first
+            argument, e.g. googlemaps.weather.weather_currentconditions.
+        :type method: string or function
+
+        :param kwargs_iterable: Keyword args for each call. This is consumed
+            lazily, so it may be a generator over a large input.
+        :type kwargs_iterable: iterable of dicts
+
+        :param max_workers: The number of calls to run concurrently.
+        :type max_workers: int
+
+        :param ordered: If True, results are yielded in the order of
+            kwargs_iterable. Otherwise they are yielded as they complete.
+        :type ordered: bool
+
+        :rtype: asynchronous iterator of MapResult
+        """
+        if isinstance(method, str):
+            func = getattr(self, method)
+        else:
+            func = functools.partial(make_api_method(method), self)
+
+        async def call(index, kwargs):
+            try:
+                return _client.MapResult(index, kwargs, await func(**kwargs),
+                                         None)
+            except Exception as e:
+                return _client.MapResult(index, kwargs, None, e)
+
+        pending = collections.deque()
+        try:
+            for index, kwargs in enumerate(kwargs_iterable):
+                pending.append(asyncio.ensure_future(call(index, kwargs)))
+                while len(pending) >= max_workers:
+                    for result in await _map_collect(pending, ordered):
+                        yield result
+            while pending:
+                for result in await _map_collect(pending, ordered):
+                    yield result
+        finally:
+            # Stop the calls in flight if the caller stops iterating early.
+            for task in pending:
+                task.cancel()
+
+    def warmup(self, *args, **kwargs):
+        """Not supported: aiohttp opens connections as requests need them,
+        and keeps them open for reuse.
+
+        :raises NotImplementedError: always.
+        """
+        raise NotImplementedError(
+            "AsyncClient doesn't warm up connections, which aiohttp opens "
+            "as requests need them.")
+
+    def pool_stats(self):
+        """Not supported: the connections are pooled by the aiohttp
+        session's connector, whose limits are in session.connector.
+
+        :raises NotImplementedError: always.
+        """
+        raise NotImplementedError(
+            "AsyncClient's connections are pooled by aiohttp. See "
+            "session.connector.")
+
+    def _after_fork(self, renewed):
+        super()._after_fork(renewed)
+        self._refreshes = _client._renew(renewed, self._refreshes, set)
+        if self._owns_session:
+            # The session's connections belong to the parent, as does the
+            # event loop it was created in, so the child creates its own.
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Closes the aiohttp session, if it was created by this client.
+        Views of the client leave it open."""
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _request(self, url, params, first_request_time=None,
+                       retry_counter=0, base_url=None, accepts_clientid=True,
+                       extract_body=None, requests_kwargs=None,
+                       post_json=None, extra_params=None,
+                       hedge_after_ms=None, deadline=None, revalidate=False):
+        """Performs HTTP GET/POST with credentials, returning the body as
+        JSON.
+
+        Takes the same arguments as googlemaps.Client._request, except:
+
+        :param extra_params: Additional URL parameters, as given to the API
+            method being called. Not read from the calling thread.
+        :type extra_params: dict
+
+        :raises ApiError: when the API returns an error.
+        :raises Timeout: if the request timed out, or could not complete
+            before the deadline.
+        :raises RetryBudgetExceeded: if the request failed, and the retry
+            budget did not allow it to be retried.
+        :raises CircuitOpen: if the circuit breaker for base_url is open.
+        :raises TransportError: when something went wrong while trying to
+            exceute a request.
+        """
+
+        if base_url is None:
+            base_url = self.base_url
+
+        if not first_request_time:
+            first_request_time = datetime.now()
+
+        # The URL is signed, and the request arguments built, once for all
+        # attempts.
+        full_url, prepared_kwargs = self._prepare_request(
+            url, params, base_url, accepts_clientid, requests_kwargs,
+            post_json, extra_params)
+
+        cache_key = self._cache_key(base_url, url, params, post_json,
+                                    prepared_kwargs, extra_params)
+        if cache_key is not None and not revalidate:
+            content, stale = self.cache.lookup(cache_key)
+            if content is not None:
+                if stale:
+                    self._revalidate(cache_key, url, params,
+                                     base_url=base_url,
+                                     accepts_clientid=accepts_clientid,
+                                     extract_body=extract_body,
+                                     requests_kwargs=requests_kwargs,
+                                     extra_params=extra_params)
+                return self._extract_body(
+                    googlemaps.transport.BufferedResponse(200, {}, content),
+                    extract_body)
+
+        send = functools.partial(
+            self._send_request, url, full_url, prepared_kwargs, base_url,
+            post_json, extract_body, first_request_time, retry_counter,
+            hedge_after_ms, deadline, cache_key)
+
+        flight_key = self._flight_key(full_url, post_json, prepared_kwargs)
+        if flight_key is None:
+            return (await send())[0]
+
+        while True:
+            flight, leader = self.flights.begin(flight_key)
+            if leader:
+                break
+            response = await _await_flight(flight, deadline)
+            if response is not None:
+                return self._extract_body(response, extract_body)
+
+        try:
+            result, response = await send()
+        except googlemaps.exceptions._DeadlineExceeded:
+            # The followers have deadlines of their own, so the flight is
+            # abandoned, and one of them sends the request instead.
+            self.flights.end(flight_key)
+            raise
+        except Exception as e:
+            self.flights.end(flight_key, exception=e)
+            raise
+        except BaseException:
+            # Cancelled, so a follower sends the request instead.
+            self.flights.end(flight_key)
+            raise
+        self.flights.end(flight_key, response)
+        return result
+
+    async def _send_request(self, url, full_url, prepared_kwargs, base_url,
+                            post_json, extract_body, first_request_time,
+                            retry_counter, hedge_after_ms, deadline,
+                            cache_key):
+        """Sends a prepared request, retrying it as needed. Takes the same
+        arguments as googlemaps.Client._send_request.
+
+        :returns: The result extracted from the response, and the response.
+        :rtype: tuple
+        """
+        final_requests_kwargs = _aiohttp_kwargs(prepared_kwargs)
+
+        # Determine GET/POST.
+        method = "GET"
+        if post_json is not None:
+            method = "POST"
+
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+
+        async def send(aiohttp_kwargs):
+            async with self.session.request(method, full_url,
+                                            **aiohttp_kwargs) as resp:
+                return googlemaps.transport.BufferedResponse(
+                    resp.status, resp.headers, await resp.read())
+
+        api = googlemaps.ratelimit.api_for_path(base_url, url)
+        rate_limiter = self.rate_limiters.get(base_url, url)
+        breaker = self.circuit_breakers.get(base_url)
+        delay_seconds = None
+        retry_after = None
+        if self.retry_budget is not None and retry_counter == 0:
+            self.retry_budget.record_request()
+
+        while True:
+            delay_seconds = self._retry_delay(first_request_time,
+                                              retry_counter, delay_seconds,
+                                              retry_after, deadline)
+            if delay_seconds:
+                await asyncio.sleep(delay_seconds)
+
+            self._check_deadline(deadline, rate_limiter)
+            breaker.before_request(base_url)
+            try:
+                rate_limit_delay = self._admit(rate_limiter, deadline)
+                if rate_limit_delay > 0:
+                    await asyncio.sleep(rate_limit_delay)
+
+                aiohttp_kwargs = final_requests_kwargs
+                attempt_kwargs, cut = _client._deadline_kwargs(
+                    prepared_kwargs, deadline)
+                if cut:
+                    aiohttp_kwargs = _aiohttp_kwargs(attempt_kwargs)
+                hedge_delay = self._hedge_delay(api, hedge_after_ms,
+                                                post_json, prepared_kwargs)
+            except BaseException:
+                # Not sent, so that a probe doesn't hold the breaker
+                # half-open.
+                breaker.release()
+                raise
+
+            try:
+                start = time.monotonic()
+                if hedge_delay is None:
+                    response = await send(aiohttp_kwargs)
+                else:
+                    response = await _send_hedged(
+                        functools.partial(send, aiohttp_kwargs), hedge_delay,
+                        rate_limiter)
+                if self.latencies is not None:
+                    self.latencies.record(api, time.monotonic() - start)
+            except asyncio.TimeoutError:
+                if cut:
+                    # Timing out is down to the deadline rather than the
+                    # server, so it isn't counted against it.
+                    breaker.release()
+                    raise googlemaps.exceptions._DeadlineExceeded()
+                breaker.record_failure()
+                raise googlemaps.exceptions.Timeout()
+            except Exception as e:
+                breaker.record_failure()
+                raise googlemaps.exceptions.TransportError(e)
+            except BaseException:
+                # Cancelled, so that a probe doesn't hold the breaker
+                # half-open.
+                breaker.release()
+                raise
+            breaker.record_status(response.status_code)
+
+            result = self._handle_response_cached(
+                response, extract_body, rate_limiter, retry_counter + 1,
+                cache_key, url)
+            if result is not _client._RETRY:
+                return result, response
+
+            retry_after = self._prepare_retry(response, rate_limiter)
+            retry_counter += 1
+
+    def _revalidate(self, cache_key, url, params, **kwargs):
+        """Fetches a fresh copy of a stale cached response in a background
+        task, unless it is already being fetched.
+
+        :param kwargs: Keyword args for _request.
+        :type kwargs: dict
+        """
+        if cache_key in self._revalidating:
+            return
+        self._revalidating.add(cache_key)
+
+        def done(task):
+            self._revalidating.discard(cache_key)
+            self._refreshes.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning("Failed to refresh cached response for %s: %s",
+                               url, task.exception())
+
+        # The event loop only keeps weak references to tasks.
+        task = asyncio.ensure_future(
+            self._request(url, params, revalidate=True, **kwargs))
+        self._refreshes.add(task)
+        task.add_done_callback(done)
+
+    async def _get(self, *args, **kwargs):  # Backwards compatibility.
+        return await self._request(*args, **kwargs)
+
+
+async def _send_hedged(send, hedge_delay, rate_limiter):
+    """Awaits send(), calling it again if it hasn't returned after
+    hedge_delay seconds, and returns whichever result arrives first. The
+    other call is cancelled. The second call is admitted by the rate limiter
+    like any other request.
+
+    :param send: Sends the request, returning its response.
+    :type send: coroutine function
+    """
+    primary = asyncio.ensure_future(send())
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if not done:
+            rate_limit_delay = rate_limiter.reserve()
+            if rate_limit_delay > 0:
+                done, _ = await asyncio.wait(tasks, timeout=rate_limit_delay)
+        if done:
+            return primary.result()
+
+        tasks.append(asyncio.ensure_future(send()))
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def _map_collect(pending, ordered):
+    """Removes and returns the results of one or more finished tasks from
+    the pending calls of AsyncClient.map.
+
+    :param pending: The tasks of the pending calls, in input order.
+    :type pending: collections.deque
+
+    :param ordered: Whether to wait for the earliest call, rather than
+        whichever completes first.
+    :type ordered: bool
+
+    :rtype: list of MapResult
+    """
+    if ordered:
+        # Left pending while awaited, so that it is cancelled if the caller
+        # stops iterating.
+        result = await pending[0]
+        pending.popleft()
+        return [result]
+
+    done, _ = await asyncio.wait(pending,
+                                 return_when=asyncio.FIRST_COMPLETED)
+    for task in done:
+        pending.remove(task)
+    return [task.result() for task in done]
+
+
+async def _await_flight(flight, deadline):
+    """Waits for the response to a request in flight, without cancelling the
+    request if the wait is cancelled.
+
+    :param flight: The flight of the request, from SingleFlight.begin().
+    :type flight: concurrent.futures.Future
+
+    :raises Timeout: if the deadline passes first.
+    """
+    timeout = None
+    if deadline is not None:
+        timeout = max(0.0, deadline - time.monotonic())
+    try:
+        return await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(flight)), timeout)
+    except asyncio.TimeoutError:
+        raise googlemaps.exceptions._DeadlineExceeded()
+
+
+def _aiohttp_kwargs(requests_kwargs):
+    """Translates keyword arguments for the requests library into their
+    aiohttp equivalents.
+
+    :param requests_kwargs: Keyword arguments for requests.Session.request.
+    :type requests_kwargs: dict
+
+    :rtype: dict
+    """
+    kwargs = dict(requests_kwargs)
+
+    # Bodies are always read in full before being handed to an extractor.
+    kwargs.pop("stream", None)
+
+    timeout = kwargs.pop("timeout", None)
+    if isinstance(timeout, tuple):
+        connect_timeout, read_timeout = timeout
+        kwargs["timeout"] = aiohttp.ClientTimeout(sock_connect=connect_timeout,
+                                                  sock_read=read_timeout)
+    else:
+        kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+
+    if not kwargs.pop("verify", True):
+        kwargs["ssl"] = False
+
+    proxies = kwargs.pop("proxies", None)
+    if proxies:
+        kwargs["proxy"] = proxies.get("https") or proxies.get("http")
+
+    return kwargs
+
+
+class _CapturedRequest(BaseException):
+    """Stops an API function at its request, carrying the arguments it passed
+    to _request.
+
+    Derives from BaseException so that it is not swallowed by error handling
+    inside the API function.
+    """
+
+    def __init__(self, url, params, kwargs):
+        self.url = url
+        self.params = params
+        self.kwargs = kwargs
+
+
+_NO_RESULT = object()
+
+
+class _RequestRecorder:
+    """Stands in for the client while an API function runs.
+
+    Without a result, the request the function builds is captured by raising
+    _CapturedRequest. With a result, that result is returned from _request,
+    so the function can finish its own post-processing, which may read the
+    client's base_url and rate_limiters.
+    """
+
+    def __init__(self, result=_NO_RESULT, client=None):
+        self._result = result
+        if client is not None:
+            self.base_url = client.base_url
+            self.rate_limiters = client.rate_limiters
+
+    def _request(self, url, params, **kwargs):
+        if self._result is _NO_RESULT:
+            raise _CapturedRequest(url, params, kwargs)
+        return self._result
+
+
+def make_api_method(func):
+    """
+    Turns an API function, which takes a client as its first argument, into a
+    coroutine method of AsyncClient.
+
+    The function is run once to build its request, which is then sent with
+    AsyncClient._request, and run a second time over the result. This reuses
+    the parameter validation and response post-processing of the
+    synchronous API unchanged. The `extra_params`, `hedge_after_ms` and
+    `deadline` keyword args are supported as in googlemaps.Client.
+    """
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        extra_params = kwargs.pop("extra_params", None)
+        hedge_after_ms = kwargs.pop("hedge_after_ms", None)
+        deadline = _client._deadline_from_timeout(kwargs.pop("deadline", None))
+        try:
+            func(_RequestRecorder(), *args, **kwargs)
+        except _CapturedRequest as captured:
+            request = captured
+
+        result = await self._request(request.url, request.params,
+                                     extra_params=extra_params,
+                                     hedge_after_ms=hedge_after_ms,
+                                     deadline=deadline,
+                                     **request.kwargs)
+        return func(_RequestRecorder(result, self), *args, **kwargs)
+    return wrapper
+
+
+from googlemaps.directions import directions
+from googlemaps.distance_matrix import distance_matrix
+from googlemaps.elevation import elevation
+from googlemaps.elevation import elevation_along_path
+from googlemaps.geocoding import geocode
+from googlemaps.geocoding import reverse_geocode
+from googlemaps.geolocation import geolocate
+from googlemaps.timezone import timezone
+from googlemaps.roads import snap_to_roads
+from googlemaps.roads import nearest_roads
+from googlemaps.roads import speed_limits
+from googlemaps.roads import snapped_speed_limits
+from googlemaps.places import find_place
+from googlemaps.places import places
+from googlemaps.places import places_nearby
+from googlemaps.places import place
+from googlemaps.places import places_photo
+from googlemaps.places import places_autocomplete
+from googlemaps.places import places_autocomplete_query
+from googlemaps.maps import static_map
+from googlemaps.addressvalidation import addressvalidation
+from googlemaps.weather import weather_currentconditions
+from googlemaps.weather import weather_history_hourly
+from googlemaps.weather import weather_forecast_hourly
+from googlemaps.weather import weather_forecast_daily
+from googlemaps.solar import solar_building_insights_closest
+from googlemaps.solar import solar_data_layers_get
+from googlemaps.airquality import airquality_heat_map
+from googlemaps.airquality import airquality_currentconditions
+from googlemaps.airquality import airquality_history
+
+
+AsyncClient.directions = make_api_method(directions)
+AsyncClient.distance_matrix = make_api_method(distance_matrix)
+AsyncClient.elevation = make_api_method(elevation)
+AsyncClient.elevation_along_path = make_api_method(elevation_along_path)
+AsyncClient.geocode = make_api_method(geocode)
+AsyncClient.reverse_geocode = make_api_method(reverse_geocode)
+AsyncClient.geolocate = make_api_method(geolocate)
+AsyncClient.timezone = make_api_method(timezone)
+AsyncClient.snap_to_roads = make_api_method(snap_to_roads)
+AsyncClient.nearest_roads = make_api_method(nearest_roads)
+AsyncClient.speed_limits = make_api_method(speed_limits)
+AsyncClient.snapped_speed_limits = make_api_method(snapped_speed_limits)
+AsyncClient.find_place = make_api_method(find_place)
+AsyncClient.places = make_api_method(places)
+AsyncClient.places_nearby = make_api_method(places_nearby)
+AsyncClient.place = make_api_method(place)
+AsyncClient.places_photo = make_api_method(places_photo)
+AsyncClient.places_autocomplete = make_api_method(places_autocomplete)
+AsyncClient.places_autocomplete_query = make_api_method(places_autocomplete_query)
+AsyncClient.static_map = make_api_method(static_map)
+AsyncClient.addressvalidation = make_api_method(addressvalidation)
+AsyncClient.weather_currentconditions = make_api_method(weather_currentconditions)
+AsyncClient.weather_history_hourly = make_api_method(weather_history_hourly)
+AsyncClient.weather_forecast_hourly = make_api_method(weather_forecast_hourly)
+AsyncClient.weather_forecast_daily = make_api_method(weather_forecast_daily)
+AsyncClient.solar_building_insights_closest = make_api_method(solar_building_insights_closest)
+AsyncClient.solar_data_layers_get = make_api_method(solar_data_layers_get)
+AsyncClient.airquality_heat_map = make_api_method(airquality_heat_map)
+AsyncClient.airquality_currentconditions = make_api_method(airquality_currentconditions)
+AsyncClient.airquality_history = make_api_method(airquality_history)
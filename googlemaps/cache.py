@@ -0,0 +1,1001 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""
+Response caches, which let a client answer repeated requests without sending
+them again.
+
+Responses are cached by the canonical URL of the request, without the
+credentials, i.e. the base URL, path and sorted query parameters. The body
+of each successful response is stored, and parsed again by the API method
+on every hit, so callers can't alter the cached copy.
+
+Once a response's TTL has passed, it may still be served for stale_ttl
+seconds while the client fetches a fresh copy in the background. Answers
+that found nothing (ZERO_RESULTS and NOT_FOUND) are kept for negative_ttl
+seconds, usually shorter than the TTL of the API. Both are tracked in a
+header which the client's store() prefixes to each cached body.
+
+A cache is a Cache whose ``get_many()`` method returns the cached bodies of
+a number of keys, and whose ``set_many()`` method stores (key, body, ttl)
+entries. Caches also implement ``delete()``, ``clear()`` and ``stats()``.
+MemoryCache, SQLiteCache and DbmCache are provided, and TieredCache puts a
+fast cache in front of a larger one.
+"""
+
+import collections
+import dbm
+import os
+import sqlite3
+import struct
+import threading
+import time
+from urllib.parse import urlparse
+import zlib
+
+_SQLITE_SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+
+-- The number and total size of the responses, kept up to date by triggers
+-- so that checking the limits doesn't scan the table.
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0);
+
+CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses
+BEGIN
+    UPDATE totals SET entries = entries + 1, bytes = bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS responses_update AFTER UPDATE OF size
+    ON responses
+BEGIN
+    UPDATE totals SET bytes = bytes + NEW.size - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses
+BEGIN
+    UPDATE totals SET entries = entries - 1, bytes = bytes - OLD.size;
+END;
+COMMIT;
+"""
+
+# How long a process waits for another's write to the database to finish,
+# in seconds.
+_SQLITE_BUSY_TIMEOUT = 30
+
+# The most keys looked up by one SQLite query, within the limit on the
+# number of parameters of older SQLite versions.
+_SQLITE_MAX_KEYS = 500
+
+# Precedes each body stored by Cache.store: the wall clock times at which it
+# becomes stale, and at which it can no longer be served, or 0 for never.
+_ENTRY_HEADER = struct.Struct("<dd")
+
+# Precedes each body in a DbmCache: its expiry time, or 0 if it never
+# expires.
+_DBM_HEADER = struct.Struct("<d")
+
+
+class Cache:
+    """Base class for response caches."""
+
+    def __init__(self, ttl=None, ttls=None, stale_ttl=0, negative_ttl=60):
+        """
+        :param ttl: How long responses are kept, in seconds. None to keep
+            them until evicted.
+        :type ttl: float
+
+        :param ttls: How long responses are kept for particular APIs, which
+            take precedence over ttl. Keyed by path prefix, e.g.
+            "/maps/api/geocode". A TTL of 0 stops the API's responses being
+            cached.
+        :type ttls: dict
+
+        :param stale_ttl: How long a response may still be served after its
+            TTL, in seconds, while a fresh copy is fetched.
+        :type stale_ttl: float
+
+        :param negative_ttl: How long answers that found nothing are kept,
+            in seconds. 0 to not cache them.
+        :type negative_ttl: float
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        # Longest prefixes first, so that the most specific TTL wins.
+        self.ttls = sorted((ttls or {}).items(), key=lambda t: len(t[0]),
+                           reverse=True)
+
+    def ttl_for(self, path):
+        """Returns how long responses to requests for a URL path are kept.
+
+        :param path: The URL path of the request.
+        :type path: string
+
+        :rtype: float
+        """
+        for prefix, ttl in self.ttls:
+            if path.startswith(prefix):
+                return ttl
+        return self.ttl
+
+    def lookup(self, key):
+        """Returns the response cached by store() for a request, and whether
+        it is stale, i.e. should be fetched again.
+
+        :param key: The canonical URL of the request.
+        :type key: string
+
+        :returns: The response body, or None if there isn't one, and whether
+            it is stale.
+        :rtype: tuple of bytes and bool
+        """
+        value = self.get(key)
+        if value is None or len(value) < _ENTRY_HEADER.size:
+            return None, False
+
+        fresh_until, expires = _ENTRY_HEADER.unpack_from(value)
+        now = time.time()
+        if expires and expires <= now:
+            return None, False
+        return value[_ENTRY_HEADER.size:], bool(fresh_until and
+                                                 fresh_until <= now)
+
+    def store(self, key, path, value, negative=False):
+        """Caches the response to a request, for the TTL of its API or the
+        negative TTL, followed by the stale TTL.
+
+        :param key: The canonical URL of the request.
+        :type key: string
+
+        :param path: The URL path of the request.
+        :type path: string
+
+        :param value: The response body.
+        :type value: bytes
+
+        :param negative: Whether the response found nothing.
+        :type negative: bool
+        """
+        entry = self._entry(path, value, negative)
+        if entry is not None:
+            self.set(key, *entry)
+
+    def _entry(self, path, value, negative):
+        """Returns the body and TTL store() caches a response with, or None
+        if it isn't cached.
+
+        :rtype: tuple of bytes and float
+        """
+        ttl = self.negative_ttl if negative else self.ttl_for(path)
+        if ttl == 0:
+            return None
+
+        if ttl is None:
+            header = _ENTRY_HEADER.pack(0, 0)
+        else:
+            fresh_until = time.time() + ttl
+            ttl += self.stale_ttl
+            header = _ENTRY_HEADER.pack(fresh_until, fresh_until +
+                                        self.stale_ttl)
+        return header + value, ttl
+
+    def get_many(self, keys):
+        """Returns the cached response bodies for a number of requests.
+
+        :param keys: The canonical URLs of the requests.
+        :type keys: iterable of strings
+
+        :returns: The body of each request that was cached, keyed by its
+            canonical URL.
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def set_many(self, entries):
+        """Caches the response bodies for a number of requests.
+
+        :param entries: The (key, body, ttl) of each response, where ttl is
+            how long to keep it in seconds, or None to keep it until evicted.
+        :type entries: iterable of tuples
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Removes the cached response for a request, if any.
+
+        :param key: The canonical URL of the request.
+        :type key: string
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """Removes every cached response."""
+        raise NotImplementedError
+
+    def stats(self):
+        """Returns counters for the cache, such as its hits and misses.
+
+        :rtype: dict
+        """
+        return {}
+
+    def export(self):
+        """Returns every unexpired response, as (key, body, ttl) tuples to
+        be given to prewarm() of another cache.
+
+        :rtype: list of tuples
+        """
+        raise NotImplementedError
+
+    def prewarm(self, entries):
+        """Caches many responses at once, e.g. those exported from another
+        cache. The same as set_many().
+
+        :param entries: The (key, body, ttl) of each response.
+        :type entries: iterable of tuples
+        """
+        self.set_many(entries)
+
+    def after_fork(self):
+        """Discards the state inherited from the parent process, such as
+        locks which its other threads may have held. Called in the child
+        after os.fork()."""
+        pass
+
+    def get(self, key):
+        """Returns the cached response body for a request, or None.
+
+        :param key: The canonical URL of the request.
+        :type key: string
+
+        :rtype: bytes
+        """
+        return self.get_many([key]).get(key)
+
+    def set(self, key, value, ttl=None):
+        """Caches the response body for a request.
+
+        :param key: The canonical URL of the request.
+        :type key: string
+
+        :param value: The response body.
+        :type value: bytes
+
+        :param ttl: How long to keep the response, in seconds, or None to
+            keep it until evicted.
+        :type ttl: float
+        """
+        self.set_many([(key, value, ttl)])
+
+
+class MemoryCache(Cache):
+    """A thread-safe in-memory cache, bounded by both its number of entries
+    and their total size. When full, the least recently used entries are
+    evicted first.
+
+    Entries expire after a time to live, which may be set per API, e.g.::
+
+        MemoryCache(ttl=300, ttls={"/maps/api/timezone": 86400})
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=300,
+                 ttls=None, clock=time.monotonic, stale_ttl=0,
+                 negative_ttl=60):
+        """
+        :param max_entries: The most responses held.
+        :type max_entries: int
+
+        :param max_bytes: The most bytes of response bodies held.
+        :type max_bytes: int
+
+        :param ttl: How long responses are kept, in seconds. None to keep
+            them until evicted.
+        :type ttl: float
+
+        :param ttls: How long responses are kept for particular APIs, which
+            take precedence over ttl. Keyed by path prefix, e.g.
+            "/maps/api/geocode". A TTL of 0 stops the API's responses being
+            cached.
+        :type ttls: dict
+
+        :param clock: Returns the current time in seconds. Monotonic by
+            default.
+        :type clock: function
+
+        :param stale_ttl: How long a response may still be served after its
+            TTL, in seconds, while a fresh copy is fetched.
+        :type stale_ttl: float
+
+        :param negative_ttl: How long answers that found nothing are kept,
+            in seconds.
+        :type negative_ttl: float
+
+        :raises ValueError: if max_entries or max_bytes is not positive.
+        """
+        if max_entries < 1 or max_bytes < 1:
+            raise ValueError("max_entries and max_bytes must be positive.")
+
+        super().__init__(ttl, ttls, stale_ttl, negative_ttl)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Maps each key to its (value, expiry time), least recently used
+        # first.
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None and entry[1] is not None and
+                    entry[1] <= self._clock()):
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        if len(value) > self.max_bytes:
+            return
+
+        expires = None if ttl is None else self._clock() + ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires)
+            self._bytes += len(value)
+
+            while (len(self._entries) > self.max_entries or
+                   self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _remove(self, key):
+        """Must be called with the lock held."""
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def get_many(self, keys):
+        results = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                results[key] = value
+        return results
+
+    def set_many(self, entries):
+        for key, value, ttl in entries:
+            self.set(key, value, ttl)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def export(self):
+        now = self._clock()
+        with self._lock:
+            entries = list(self._entries.items())
+        return [(key, value, None if expires is None else expires - now)
+                for key, (value, expires) in entries
+                if expires is None or expires > now]
+
+    def stats(self):
+        """Returns counters for the cache: the hits, misses and evictions
+        since it was created, and the number and total size of the responses
+        it currently holds.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+
+class SQLiteCache(Cache):
+    """A persistent cache in a SQLite database, which survives restarts and
+    may be shared by the processes on a host.
+
+    The database is in WAL mode, so readers aren't blocked by a process
+    writing to it. Response bodies are stored compressed. Like MemoryCache,
+    it is bounded by both its number of entries and their total size
+    (compressed), evicting the least recently used entries first.
+
+    Expiry times are wall clock times, so that they stay valid across
+    restarts, and when entries are exported to another host.
+    """
+
+    def __init__(self, path, max_entries=1000000,
+                 max_bytes=1024 * 1024 * 1024, ttl=86400, ttls=None,
+                 clock=time.time, stale_ttl=0, negative_ttl=60):
+        """
+        :param path: The database file, which is created if it does not
+            exist.
+        :type path: string
+
+        :param max_entries: The most responses held.
+        :type max_entries: int
+
+        :param max_bytes: The most bytes of compressed response bodies held.
+        :type max_bytes: int
+
+        :param ttl: How long responses are kept, in seconds. None to keep
+            them until evicted.
+        :type ttl: float
+
+        :param ttls: How long responses are kept for particular APIs, which
+            take precedence over ttl. Keyed by path prefix, e.g.
+            "/maps/api/geocode".
+        :type ttls: dict
+
+        :param clock: Returns the current wall clock time in seconds.
+        :type clock: function
+
+        :param stale_ttl: How long a response may still be served after its
+            TTL, in seconds, while a fresh copy is fetched.
+        :type stale_ttl: float
+
+        :param negative_ttl: How long answers that found nothing are kept,
+            in seconds.
+        :type negative_ttl: float
+
+        :raises ValueError: if max_entries or max_bytes is not positive.
+        """
+        if max_entries < 1 or max_bytes < 1:
+            raise ValueError("max_entries and max_bytes must be positive.")
+
+        super().__init__(ttl, ttls, stale_ttl, negative_ttl)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._pid = None
+        self._open()
+
+    def _open(self):
+        # SQLite connections must not be used across a fork, so each process
+        # opens the database for itself.
+        self._db = sqlite3.connect(self.path, timeout=_SQLITE_BUSY_TIMEOUT,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        self._pid = os.getpid()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SQLITE_SCHEMA)
+
+    def _connection(self):
+        """Returns the connection for this process. Must be called with the
+        lock held."""
+        if self._pid != os.getpid():
+            self._open()
+        return self._db
+
+    def _transaction(self):
+        """Returns a context manager for a write transaction. Must be called
+        with the lock held."""
+        return _SQLiteTransaction(self._db)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        now = self._clock()
+        rows = []
+        with self._lock:
+            db = self._connection()
+            for i in range(0, len(keys), _SQLITE_MAX_KEYS):
+                chunk = keys[i:i + _SQLITE_MAX_KEYS]
+                rows += db.execute(
+                    "SELECT key, value FROM responses WHERE key IN (%s) AND "
+                    "(expires IS NULL OR expires > ?)" %
+                    ",".join("?" * len(chunk)), chunk + [now]).fetchall()
+            if rows:
+                db.executemany(
+                    "UPDATE responses SET accessed = ? WHERE key = ?",
+                    [(now, key) for key, _ in rows])
+            self._hits += len(rows)
+            self._misses += len(set(keys)) - len(rows)
+        return {key: zlib.decompress(value) for key, value in rows}
+
+    def set_many(self, entries):
+        """Caches the response bodies for a number of requests, in a single
+        transaction.
+
+        :param entries: The (key, body, ttl) of each response.
+        :type entries: iterable of tuples
+        """
+        now = self._clock()
+        rows = []
+        for key, value, ttl in entries:
+            value = zlib.compress(value)
+            if len(value) > self.max_bytes:
+                continue
+            expires = None if ttl is None else now + ttl
+            rows.append((key, value, len(value), expires, now))
+
+        with self._lock:
+            self._connection()
+            with self._transaction():
+                self._db.executemany(
+                    "INSERT INTO responses (key, value, size, expires, "
+                    "accessed) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+                    "size = excluded.size, expires = excluded.expires, "
+                    "accessed = excluded.accessed", rows)
+                self._evict(now)
+
+    def _evict(self, now):
+        """Removes expired responses, then the least recently used ones
+        until the cache is within its limits. Must be called within a
+        transaction."""
+        entries, size = self._totals()
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return
+
+        self._db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+        entries, size = self._totals()
+        while entries > self.max_entries or size > self.max_bytes:
+            excess = max(entries - self.max_entries, 0)
+            if size > self.max_bytes:
+                # Estimate the entries to evict from their average size, so
+                # that a byte limit doesn't cost a query per eviction.
+                excess = max(excess, -(-entries * (size - self.max_bytes) //
+                                       size))
+            cursor = self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM "
+                "responses ORDER BY accessed LIMIT ?)", (max(excess, 1),))
+            self._evictions += cursor.rowcount
+            entries, size = self._totals()
+
+    def _totals(self):
+        return self._db.execute(
+            "SELECT entries, bytes FROM totals").fetchone()
+
+    def delete(self, key):
+        with self._lock:
+            self._connection().execute("DELETE FROM responses WHERE key = ?",
+                                       (key,))
+
+    def export(self):
+        now = self._clock()
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT key, value, expires FROM responses "
+                "WHERE expires IS NULL OR expires > ?", (now,)).fetchall()
+        return [(key, zlib.decompress(value),
+                 None if expires is None else expires - now)
+                for key, value, expires in rows]
+
+    def clear(self):
+        with self._lock:
+            self._connection()
+            with self._transaction():
+                self._db.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Returns counters for the cache: the hits, misses and evictions
+        made by this process, and the number and total compressed size of
+        the responses the database currently holds.
+
+        :rtype: dict
+        """
+        with self._lock:
+            self._connection()
+            entries, size = self._totals()
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "entries": entries,
+                "bytes": size,
+            }
+
+    def after_fork(self):
+        # The database is opened again by the next lookup, as the process id
+        # has changed.
+        self._lock = threading.Lock()
+
+
+class _SQLiteTransaction:
+    """Runs a block in an immediate transaction, committing it if the block
+    succeeds and rolling it back otherwise."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __enter__(self):
+        self._db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._db.execute("COMMIT")
+        else:
+            self._db.execute("ROLLBACK")
+
+
+class DbmCache(Cache):
+    """A persistent cache in a database of the standard library's dbm
+    module, for hosts without SQLite.
+
+    Response bodies are stored compressed, along with their expiry time, and
+    expired responses are removed when they are next looked up. Unlike
+    SQLiteCache, the cache isn't bounded in size, and most dbm
+    implementations only allow one process to open the database at a time.
+    A child process forked while the parent has it open caches responses in
+    memory instead.
+    """
+
+    def __init__(self, path, ttl=86400, ttls=None, clock=time.time,
+                 stale_ttl=0, negative_ttl=60):
+        """
+        :param path: The database file, which is created if it does not
+            exist.
+        :type path: string
+
+        :param ttl: How long responses are kept, in seconds. None to keep
+            them until deleted.
+        :type ttl: float
+
+        :param ttls: How long responses are kept for particular APIs, which
+            take precedence over ttl. Keyed by path prefix, e.g.
+            "/maps/api/geocode".
+        :type ttls: dict
+
+        :param clock: Returns the current wall clock time in seconds.
+        :type clock: function
+
+        :param stale_ttl: How long a response may still be served after its
+            TTL, in seconds, while a fresh copy is fetched.
+        :type stale_ttl: float
+
+        :param negative_ttl: How long answers that found nothing are kept,
+            in seconds.
+        :type negative_ttl: float
+        """
+        super().__init__(ttl, ttls, stale_ttl, negative_ttl)
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = dbm.open(path, "c")
+        self._inherited = None
+        self._hits = 0
+        self._misses = 0
+
+    def _load(self, key, now):
+        """Returns the body cached under a key, removing it if it has
+        expired. Must be called with the lock held."""
+        key = _dbm_key(key)
+        data = self._db.get(key)
+        if data is None:
+            return None
+        expires, = _DBM_HEADER.unpack_from(data)
+        if expires and expires <= now:
+            del self._db[key]
+            return None
+        return zlib.decompress(data[_DBM_HEADER.size:])
+
+    def get_many(self, keys):
+        now = self._clock()
+        results = {}
+        with self._lock:
+            for key in keys:
+                value = self._load(key, now)
+                if value is None:
+                    self._misses += 1
+                else:
+                    self._hits += 1
+                    results[key] = value
+        return results
+
+    def set_many(self, entries):
+        now = self._clock()
+        with self._lock:
+            for key, value, ttl in entries:
+                expires = 0.0 if ttl is None else now + ttl
+                self._db[_dbm_key(key)] = (_DBM_HEADER.pack(expires) +
+                                           zlib.compress(value))
+
+    def delete(self, key):
+        key = _dbm_key(key)
+        with self._lock:
+            if key in self._db:
+                del self._db[key]
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._db.keys()):
+                del self._db[key]
+
+    def export(self):
+        now = self._clock()
+        entries = []
+        with self._lock:
+            for key in list(self._db.keys()):
+                expires, = _DBM_HEADER.unpack_from(self._db[key])
+                if not expires or expires > now:
+                    entries.append((key.decode("utf-8"),
+                                    self._load(key, now),
+                                    expires - now if expires else None))
+        return entries
+
+    def stats(self):
+        """Returns counters for the cache: the hits and misses since it was
+        opened, and the number of responses it currently holds, expired or
+        not.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "entries": len(self._db),
+            }
+
+    def after_fork(self):
+        # The parent's handle is kept but not used, as closing it could write
+        # to the database the parent still has open.
+        self._lock = threading.Lock()
+        self._inherited = self._db
+        try:
+            self._db = dbm.open(self.path, "c")
+        except dbm.error:
+            # Locked by the parent.
+            self._db = {}
+
+    def close(self):
+        """Closes the database."""
+        with self._lock:
+            if not isinstance(self._db, dict):
+                self._db.close()
+
+
+def _dbm_key(key):
+    """Returns a key of DbmCache as the bytes dbm stores it as."""
+    return key.encode("utf-8") if isinstance(key, str) else key
+
+
+class TieredCache(Cache):
+    """Puts a small, fast cache (L1), such as a MemoryCache, in front of a
+    larger or shared one (L2), such as a SQLiteCache.
+
+    Lookups are read through: keys missing from L1 are looked up in L2, and
+    responses found there are copied into L1. Writes go to L1 at once, and
+    are written back to L2 in batches, once write_back_size responses are
+    pending or the oldest has waited write_back_delay seconds. Callers must
+    call close() or flush() before exiting, or the responses still pending
+    are never written to L2.
+
+    Responses are kept in each tier for that tier's TTLs, and ttl_for()
+    and the other TTL attributes are those of L1. Responses copied from L2
+    into L1 are kept for the TTL of their API, but are still only served
+    until the expiry they were stored with in L2.
+    """
+
+    def __init__(self, l1, l2, write_back_size=100, write_back_delay=5,
+                 clock=time.monotonic):
+        """
+        :param l1: The cache consulted first.
+        :type l1: Cache
+
+        :param l2: The cache consulted when a response isn't in l1.
+        :type l2: Cache
+
+        :param write_back_size: The number of pending writes which are
+            written back to l2 at once. 1 to write every response to l2
+            straight away.
+        :type write_back_size: int
+
+        :param write_back_delay: The longest time a write may be pending, in
+            seconds, after which a background thread writes it back.
+        :type write_back_delay: float
+
+        :param clock: Returns the current time in seconds. Monotonic by
+            default.
+        :type clock: function
+
+        :raises ValueError: if write_back_size is not positive.
+        """
+        if write_back_size < 1:
+            raise ValueError("write_back_size must be positive.")
+
+        self.l1 = l1
+        self.l2 = l2
+        self.write_back_size = write_back_size
+        self.write_back_delay = write_back_delay
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Pending writes to l2, as (body, ttl, time cached) keyed by key.
+        self._pending = collections.OrderedDict()
+        self._pending_since = None
+        self._timer = None
+
+    @property
+    def ttl(self):
+        return self.l1.ttl
+
+    @property
+    def ttls(self):
+        return self.l1.ttls
+
+    @property
+    def stale_ttl(self):
+        return self.l1.stale_ttl
+
+    @property
+    def negative_ttl(self):
+        return self.l1.negative_ttl
+
+    def ttl_for(self, path):
+        return self.l1.ttl_for(path)
+
+    def _l1_ttl(self, key):
+        """Returns the TTL of a response copied from L2 into L1."""
+        ttl = self.l1.ttl_for(urlparse(key).path)
+        if ttl is None:
+            return None
+        return ttl + self.l1.stale_ttl
+
+    def get_many(self, keys):
+        keys = list(keys)
+        results = self.l1.get_many(keys)
+        missing = [key for key in keys if key not in results]
+        if not missing:
+            return results
+
+        with self._lock:
+            pending = {key: self._pending[key][0] for key in missing
+                       if key in self._pending}
+        results.update(pending)
+        missing = [key for key in missing if key not in pending]
+        if missing:
+            found = self.l2.get_many(missing)
+            if found:
+                self.l1.set_many((key, value, self._l1_ttl(key))
+                                 for key, value in found.items())
+            results.update(found)
+        return results
+
+    def store(self, key, path, value, negative=False):
+        self.l1.store(key, path, value, negative)
+        entry = self.l2._entry(path, value, negative)
+        if entry is not None:
+            self._write_back([(key,) + entry])
+
+    def set_many(self, entries):
+        entries = list(entries)
+        self.l1.set_many(entries)
+        self._write_back(entries)
+
+    def _write_back(self, entries):
+        """Queues (key, body, ttl) entries to be written back to l2, and
+        writes back those pending if they are due."""
+        now = self._clock()
+        with self._lock:
+            if not self._pending:
+                self._pending_since = now
+                self._timer = threading.Timer(self.write_back_delay,
+                                              self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            for key, value, ttl in entries:
+                self._pending[key] = (value, ttl, now)
+            due = (len(self._pending) >= self.write_back_size or
+                   now - self._pending_since >= self.write_back_delay)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Writes every pending response back to l2."""
+        now = self._clock()
+        with self._lock:
+            pending = list(self._pending.items())
+            self._pending.clear()
+            self._pending_since = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        # Responses expire from l2 when they would have, had they been
+        # written to it straight away.
+        entries = [(key, value,
+                    None if ttl is None else ttl - (now - cached))
+                   for key, (value, ttl, cached) in pending]
+        if entries:
+            self.l2.set_many(entries)
+
+    def delete(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+        self.l1.delete(key)
+        self.l2.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._pending_since = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.l1.clear()
+        self.l2.clear()
+
+    def close(self):
+        """Writes every pending response back to l2. The tiers themselves
+        are left open."""
+        self.flush()
+
+    def export(self):
+        self.flush()
+        return self.l2.export()
+
+    def stats(self):
+        """Returns the counters of each tier, and the number of writes
+        pending for l2.
+
+        :rtype: dict
+        """
+        with self._lock:
+            pending = len(self._pending)
+        return {"l1": self.l1.stats(), "l2": self.l2.stats(),
+                "pending": pending}
+
+    def after_fork(self):
+        # The pending writes are left to the parent to write back, and its
+        # timer thread isn't in the child.
+        self._lock = threading.Lock()
+        self._pending = collections.OrderedDict()
+        self._pending_since = None
+        self._timer = None
+        self.l1.after_fork()
+        self.l2.after_fork()
@@ -0,0 +1,262 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""
+Circuit breakers, which stop a client sending requests to a host that keeps
+failing, so that callers fail fast instead of waiting out timeouts and
+retries.
+
+A breaker starts closed, letting every request through. After a number of
+consecutive failures (transport errors, timeouts or 5xx responses) it opens,
+and requests are rejected with CircuitOpen without being sent. Once
+reset_timeout has passed, it half-opens and lets a few probe requests
+through: if they succeed it closes again, otherwise it reopens.
+"""
+
+import threading
+import time
+
+import googlemaps.exceptions
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """A thread-safe circuit breaker for one host."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30,
+                 half_open_probes=1, clock=time.monotonic):
+        """
+        :param failure_threshold: The number of consecutive failures which
+            open the breaker. If None, the breaker never opens.
+        :type failure_threshold: int
+
+        :param reset_timeout: How long the breaker stays open before letting
+            probe requests through, in seconds.
+        :type reset_timeout: float
+
+        :param half_open_probes: The number of probe requests let through at
+            once while half-open. The breaker closes once this many have
+            succeeded in a row.
+        :type half_open_probes: int
+
+        :param clock: Returns the current time in seconds. Monotonic by
+            default.
+        :type clock: function
+
+        :raises ValueError: if failure_threshold or half_open_probes is not
+            positive, or reset_timeout is negative.
+        """
+        if failure_threshold is not None and failure_threshold < 1:
+            raise ValueError("failure_threshold must be positive.")
+        if half_open_probes < 1:
+            raise ValueError("half_open_probes must be positive.")
+        if reset_timeout < 0:
+            raise ValueError("reset_timeout must not be negative.")
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probes = 0
+        self._probe_successes = 0
+
+    def _update(self):
+        """Half-opens the breaker once reset_timeout has passed. Must be
+        called with the lock held."""
+        if (self._state == OPEN and
+                self._clock() - self._opened_at >= self.reset_timeout):
+            self._state = HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+
+    def _remaining(self):
+        """Returns the seconds until an open breaker half-opens. Must be
+        called with the lock held."""
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._failures = 0
+
+    @property
+    def state(self):
+        """The current state: CLOSED, OPEN or HALF_OPEN.
+
+        :rtype: string
+        """
+        with self._lock:
+            self._update()
+            return self._state
+
+    def retry_in(self):
+        """Returns the number of seconds until an open breaker lets probe
+        requests through, or 0 if it isn't open.
+
+        :rtype: float
+        """
+        with self._lock:
+            self._update()
+            return self._remaining()
+
+    def before_request(self, base_url=None):
+        """Admits a request, which must then be reported with
+        record_success, record_failure, record_status or release.
+
+        :param base_url: The host the request is for, to report in the
+            exception.
+        :type base_url: string
+
+        :raises CircuitOpen: if the breaker is open, or is half-open and
+            already has its probe requests in flight.
+        """
+        with self._lock:
+            self._update()
+            if self._state == CLOSED:
+                return
+            if (self._state == HALF_OPEN and
+                    self._probes < self.half_open_probes):
+                self._probes += 1
+                return
+            retry_in = self._remaining()
+        raise googlemaps.exceptions.CircuitOpen(base_url, retry_in)
+
+    def record_success(self):
+        """Records that an admitted request succeeded."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._state = CLOSED
+                    self._failures = 0
+            elif self._state == CLOSED:
+                self._failures = 0
+
+    def record_failure(self):
+        """Records that an admitted request failed."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._open()
+            elif self._state == CLOSED:
+                self._failures += 1
+                if (self.failure_threshold is not None and
+                        self._failures >= self.failure_threshold):
+                    self._open()
+
+    def record_status(self, status_code):
+        """Records the HTTP status of the response to an admitted request.
+        Server errors (5xx) count as failures, and anything else as success.
+
+        :param status_code: The HTTP status of the response.
+        :type status_code: int
+        """
+        if status_code >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def release(self):
+        """Records that an admitted request was abandoned before it
+        completed, e.g. because it was cancelled."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def after_fork(self):
+        """Gives the breaker a fresh lock in a child process, after
+        os.fork(). The probes in flight are the parent's, so they don't
+        count against the child's."""
+        self._lock = threading.Lock()
+        self._probes = 0
+
+
+class CircuitBreakerRegistry:
+    """Holds a separate circuit breaker for each host a client calls, so
+    that one failing API doesn't stop requests to the others.
+    """
+
+    def __init__(self, factory, overrides=None):
+        """
+        :param factory: Creates the circuit breaker for a host. It is called
+            with the host's base URL.
+        :type factory: function
+
+        :param overrides: Circuit breakers for particular hosts, keyed by
+            base URL.
+        :type overrides: dict
+        """
+        self._factory = factory
+        self._overrides = dict(overrides or {})
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, base_url):
+        """Returns the circuit breaker for a host.
+
+        :param base_url: The base URL of the request.
+        :type base_url: string
+
+        :rtype: CircuitBreaker
+        """
+        breaker = self._overrides.get(base_url)
+        if breaker is None:
+            breaker = self._breakers.get(base_url)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(base_url)
+                if breaker is None:
+                    breaker = self._breakers[base_url] = self._factory(
+                        base_url)
+        return breaker
+
+    def breakers(self):
+        """Returns the circuit breakers created so far, and the overrides,
+        keyed by base URL.
+
+        :rtype: dict
+        """
+        with self._lock:
+            breakers = dict(self._breakers)
+        breakers.update(self._overrides)
+        return breakers
+
+    def states(self):
+        """Returns the state of each circuit breaker, keyed by base URL.
+
+        :rtype: dict
+        """
+        return {base_url: breaker.state
+                for base_url, breaker in self.breakers().items()}
+
+    def after_fork(self):
+        """Gives the registry and its circuit breakers fresh locks in a child
+        process, after os.fork()."""
+        self._lock = threading.Lock()
+        breakers = {id(breaker): breaker
+                    for breaker in self.breakers().values()}
+        for breaker in breakers.values():
+            breaker.after_fork()
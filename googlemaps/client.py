@@ -22,20 +22,33 @@ HTTP requests).
 
 import base64
 import collections
+import concurrent.futures
+import contextvars
+import copy
 import logging
 from datetime import datetime
 from datetime import timedelta
 import functools
 import hashlib
 import hmac
+import importlib
+import json
+import os
 import re
 import requests
-import random
 import time
-import math
-import sys
+import threading
+import weakref
 
 import googlemaps
+import googlemaps.cache
+import googlemaps.circuitbreaker
+import googlemaps.hedging
+import googlemaps.pool
+import googlemaps.ratelimit
+import googlemaps.retry
+import googlemaps.singleflight
+import googlemaps.transport
 
 try: # Python 3
     from urllib.parse import urlencode
@@ -48,7 +61,42 @@ _X_GOOG_MAPS_EXPERIENCE_ID = "X-Goog-Maps-Experience-ID"
 _USER_AGENT = "GoogleGeoApiClientPython/%s" % googlemaps.__version__
 _DEFAULT_BASE_URL = "https://maps.googleapis.com"
 
-_RETRIABLE_STATUSES = {500, 503, 504}
+# Returned by Client._handle_response for a request that should be retried.
+_RETRY = object()
+
+# Matches the default connection pool size of a requests.Session.
+_DEFAULT_MAP_WORKERS = 10
+
+# Runs the refreshes of stale cached responses and warming up.
+_BACKGROUND_WORKERS = _DEFAULT_MAP_WORKERS
+
+# The API statuses of answers that found nothing, which are cached for the
+# cache's negative_ttl.
+_NEGATIVE_STATUSES = {"ZERO_RESULTS", "NOT_FOUND"}
+
+# The options given to the API method being called, which apply to each
+# request it makes.
+_CallOptions = collections.namedtuple(
+    "_CallOptions", ["extra_params", "hedge_after_ms", "deadline"])
+_call_options = contextvars.ContextVar(
+    "googlemaps_call_options", default=_CallOptions(None, None, None))
+
+# The JSON libraries whose loads() may replace json.loads, fastest first.
+_FAST_JSON_MODULES = ("orjson", "simdjson", "ujson")
+
+# Every client and view, so that their state can be renewed in a forked child.
+_clients = weakref.WeakSet()
+
+# The json_loads of the client extracting a response, for the extract_body
+# functions of the API modules, which are only given the response.
+_json_loads = contextvars.ContextVar("googlemaps_json_loads",
+                                     default=json.loads)
+
+MapResult = collections.namedtuple("MapResult",
+                                   ["index", "kwargs", "result", "exception"])
+MapResult.__doc__ = """The outcome of one call made by Client.map: the position
+and keyword args of the call in the input, and either its result or the
+exception it raised."""
 
 
 class Client:
@@ -60,7 +108,16 @@ class Client:
                  queries_per_second=60, queries_per_minute=6000,channel=None,
                  retry_over_query_limit=True, experience_id=None, 
                  requests_session=None,
-                 base_url=_DEFAULT_BASE_URL):
+                 base_url=_DEFAULT_BASE_URL, rate_limiter=None,
+                 rate_limiters=None, adaptive_rate_limit=False,
+                 retry_policy=None, retry_budget=None,
+                 circuit_breaker_threshold=None,
+                 circuit_breaker_reset_timeout=30, circuit_breakers=None,
+                 hedge_percentile=95, cache=None, coalesce_requests=False,
+                 pool_maxsize=None, pool_block=False, pool_keepalive=None,
+                 pools=None, transport=None, warmup_hosts=None,
+                 warmup_connections=1, rewarm_interval=None,
+                 json_loads=None):
         """
         :param key: Maps API key. Required, unless "client_id" and
             "client_secret" are set. Most users should use an API key.
@@ -98,15 +155,76 @@ class Client:
             seconds.
         :type retry_timeout: int
 
-        :param queries_per_second: Number of queries per second permitted. Unset queries_per_minute to None. If set smaller number will be used.
+        :param retry_policy: Decides which failed requests are retried, how
+            many times, and the backoff between attempts. Defaults to
+            retrying 429, 500, 503 and 504 responses with exponential backoff.
+        :type retry_policy: googlemaps.retry.RetryPolicy
+
+        :param retry_budget: Caps retries across all requests made by the
+            client, e.g. googlemaps.retry.RetryBudget(ratio=0.1) to retry at
+            most one in ten requests once an API degrades. Requests beyond
+            the budget raise RetryBudgetExceeded instead of being retried.
+            Unlimited by default.
+        :type retry_budget: googlemaps.retry.RetryBudget
+
+        :param circuit_breaker_threshold: If set, requests to a host fail
+            fast with CircuitOpen, without being sent, once this many
+            consecutive requests to it have failed with a transport error,
+            timeout or 5xx response. The state of each host's breaker is
+            reported by circuit_breakers.states(). Disabled by default.
+        :type circuit_breaker_threshold: int
+
+        :param circuit_breaker_reset_timeout: How long a host's circuit
+            breaker stays open before a probe request is let through, in
+            seconds.
+        :type circuit_breaker_reset_timeout: float
+
+        :param circuit_breakers: Circuit breakers for particular hosts, which
+            take precedence over circuit_breaker_threshold. Keyed by
+            base_url, e.g. "https://roads.googleapis.com".
+        :type circuit_breakers: dict
+
+        :param hedge_percentile: When an API method is called with
+            hedge_after_ms, a duplicate request is sent once the original has
+            taken longer than this percentile of recent requests to the same
+            API. Until enough requests have been made to measure it, or if
+            this is None, the duplicate is sent after hedge_after_ms.
+        :type hedge_percentile: float
+
+        :param cache: Caches the responses to GET requests, so that repeated
+            requests are answered without being sent, e.g.
+            googlemaps.cache.MemoryCache(), googlemaps.cache.SQLiteCache to
+            keep them across restarts, or a TieredCache of the two. Streamed responses, such as
+            static maps and place photos, are never cached. Hits and misses
+            are counted by cache.stats(). Once a response is stale, it is
+            served while a fresh copy is fetched in the background.
+            Disabled by default.
+        :type cache: googlemaps.cache.Cache
+
+        :param coalesce_requests: If True, a request made while an identical
+            one is in flight waits for that request's response, or
+            exception, instead of being sent. The number of requests
+            coalesced is reported by flights.stats().
+        :type coalesce_requests: bool
+
+        :param queries_per_second: Number of queries per second permitted
+            to each API: each path prefix under /maps/api/, e.g. geocode,
+            and each other host, e.g. roads.googleapis.com, has its own
+            limiter, so a client calling N APIs may send N times this rate.
+            Set to None to only enforce queries_per_minute.
             If the rate limit is reached, the client will sleep for the
             appropriate amount of time before it runs the current query.
-        :type queries_per_second: int
-
-        :param queries_per_minute: Number of queries per minute permitted. Unset queries_per_second to None. If set smaller number will be used.
+            May be fractional.
+        :type queries_per_second: int or float
+
+        :param queries_per_minute: Number of queries per minute permitted
+            to each API, as for queries_per_second.
+            Set to None to only enforce queries_per_second. When both are set,
+            both are enforced: queries may be sent at up to
+            queries_per_second, for as long as the per-minute budget lasts.
             If the rate limit is reached, the client will sleep for the
             appropriate amount of time before it runs the current query.
-        :type queries_per_minute: int
+        :type queries_per_minute: int or float
 
         :param retry_over_query_limit: If True, requests that result in a
             response indicating the query rate limit was exceeded will be
@@ -126,15 +244,87 @@ class Client:
             library, which among other things allow for proxy auth to be
             implemented. See the official requests docs for more info:
             http://docs.python-requests.org/en/latest/api/#main-interface
+            Other transports only take those of
+            googlemaps.transport.Transport.request().
         :type requests_kwargs: dict
 
         :param requests_session: Reused persistent session for flexibility.
+            Its connection pools are left as they are, and the pool_*
+            arguments ignored.
         :type requests_session: requests.Session
+
+        :param pool_maxsize: The most connections kept open to each host.
+            By default, enough for the threads of the client's own thread
+            pools, raised by map() to cover its max_workers.
+        :type pool_maxsize: int
+
+        :param pool_block: If True, a request which finds all connections to
+            its host in use waits for one, rather than opening a connection
+            which is closed after the request.
+        :type pool_block: bool
+
+        :param pool_keepalive: If set, TCP keep-alive probes are sent on
+            connections idle for this many seconds, so that pooled
+            connections stay open.
+        :type pool_keepalive: int
+
+        :param pools: googlemaps.pool.PoolAdapter arguments for particular
+            hosts, keyed by base_url, e.g.
+            {"https://roads.googleapis.com": {"pool_maxsize": 50}}. The use
+            of each host's pool is reported by pool_stats().
+        :type pools: dict
+
+        :param transport: Sends the client's HTTP requests, e.g.
+            googlemaps.transport.Urllib3Transport() for less overhead per
+            request, or googlemaps.transport.HTTP2Transport() to multiplex
+            concurrent requests over one connection per host. Defaults to a
+            googlemaps.transport.RequestsTransport over the requests session.
+        :type transport: googlemaps.transport.Transport
+
+        :param warmup_hosts: Base URLs of hosts to open connections to in
+            the background as soon as the client is created, e.g.
+            googlemaps.pool.GOOGLE_HOSTS. See warmup().
+        :type warmup_hosts: list of strings
+
+        :param warmup_connections: The number of connections opened to each
+            of warmup_hosts.
+        :type warmup_connections: int
+
+        :param rewarm_interval: If set, connections to warmup_hosts are
+            opened again every this many seconds, replacing those closed
+            while idle.
+        :type rewarm_interval: float
+
+        :param json_loads: Decodes the JSON body of each response from its
+            bytes, e.g. orjson.loads. Defaults to the loads() of orjson,
+            simdjson or ujson, the first of them that is installed, or else
+            json.loads.
+        :type json_loads: function
         
         :param base_url: The base URL for all requests. Defaults to the Maps API
             server. Should not have a trailing slash.
         :type base_url: string
 
+        :param rate_limiter: Paces every request attempt, retries included,
+            in place of the limiters built from queries_per_second and
+            queries_per_minute. Use this to configure the burst size, or to
+            share one limiter between several clients. By default, each API
+            is given its own limiter enforcing those quotas.
+        :type rate_limiter: googlemaps.ratelimit.RateLimiter
+
+        :param rate_limiters: Rate limiters for particular APIs, which take
+            precedence over rate_limiter. Keyed by (base_url, path prefix),
+            e.g. ("https://maps.googleapis.com", "/maps/api/geocode"), or by
+            base_url alone, e.g. "https://solar.googleapis.com".
+        :type rate_limiters: dict
+
+        :param adaptive_rate_limit: If True, each API's rate is cut whenever
+            a request is rejected for exceeding the query rate limit, and
+            raised again as requests succeed, up to queries_per_second and
+            queries_per_minute. The rates in use are reported by
+            rate_limiters.effective_rates().
+        :type adaptive_rate_limit: bool
+
         """
         if not key and not (client_secret and client_id):
             raise ValueError("Must provide API key or enterprise credentials "
@@ -150,7 +340,20 @@ class Client:
                     "and hyphen (-) characters are allowed. If used without "
                     "client_id, it must be 0-999.")
 
-        self.session = requests_session or requests.Session()
+        # The client whose connection pools and thread pools this one
+        # shares, itself unless it is a view.
+        self._root = self
+        self._pool_settings = None
+        # The size of the pools mounted on the session, 0 for none.
+        self._pool_maxsize = 0
+        # The most threads the client has been sized for.
+        self._workers = _DEFAULT_MAP_WORKERS
+        self._pool_lock = threading.Lock()
+        self._init_transport(requests_session, transport,
+                             {"pool_maxsize": pool_maxsize,
+                              "pool_block": pool_block,
+                              "keepalive": pool_keepalive,
+                              "pools": pools})
         self.key = key
 
         if timeout and (connect_timeout or read_timeout):
@@ -179,27 +382,87 @@ class Client:
             "timeout": self.timeout,
             "verify": True,  # NOTE(cbro): verify SSL certs.
         })
+        if self.transport is not None:
+            self.transport.check_kwargs(self.requests_kwargs)
         
         self.queries_per_second = queries_per_second
         self.queries_per_minute = queries_per_minute
-        try: 
-            if (type(self.queries_per_second) == int and type(self.queries_per_minute) == int ):
-                self.queries_quota =  math.floor(min(self.queries_per_second, self.queries_per_minute/60))
-            elif (self.queries_per_second and type(self.queries_per_second) == int ):
-                self.queries_quota = math.floor(self.queries_per_second)
-            elif (self.queries_per_minute and type(self.queries_per_minute) == int ):
-                self.queries_quota = math.floor(self.queries_per_minute/60)
-            else:
-                sys.exit("MISSING VALID NUMBER for queries_per_second or queries_per_minute")
+        quotas = []
+        if queries_per_second:
+            quotas.append(queries_per_second)
+        if queries_per_minute:
+            quotas.append(queries_per_minute / 60.0)
+        self.queries_quota = min(quotas) if quotas else None
+
+        if rate_limiter is None:
+            # Fail early if the quotas are missing.
+            googlemaps.ratelimit.quota_rate_limiter(queries_per_second,
+                                                    queries_per_minute)
             logger.info("API queries_quota: %s", self.queries_quota)
-
-        except NameError:
-            sys.exit("MISSING VALUE for queries_per_second or queries_per_minute")
+            factory = lambda api: googlemaps.ratelimit.quota_rate_limiter(
+                queries_per_second, queries_per_minute,
+                adaptive=adaptive_rate_limit)
+        else:
+            factory = lambda api: rate_limiter
+        self.rate_limiter = rate_limiter
+        self.rate_limiters = googlemaps.ratelimit.RateLimiterRegistry(
+            factory, rate_limiters)
 
         self.retry_over_query_limit = retry_over_query_limit
-        self.sent_times = collections.deque("", self.queries_quota)
+        self.retry_policy = retry_policy or googlemaps.retry.RetryPolicy()
+        self.retry_budget = retry_budget
+        breaker_factory = lambda base_url: (
+            googlemaps.circuitbreaker.CircuitBreaker(
+                circuit_breaker_threshold, circuit_breaker_reset_timeout))
+        self.circuit_breakers = (
+            googlemaps.circuitbreaker.CircuitBreakerRegistry(
+                breaker_factory, circuit_breakers))
+        self.latencies = None
+        if hedge_percentile is not None:
+            self.latencies = googlemaps.hedging.LatencyTracker(
+                hedge_percentile)
+        self.cache = cache
+        self.flights = None
+        if coalesce_requests:
+            self.flights = googlemaps.singleflight.SingleFlight()
+        self._executor = None
+        self._hedge_executor = None
+        self._hedge_workers = 0
+        self._executor_lock = threading.Lock()
+        # The cache keys of stale responses being fetched again.
+        self._revalidating = set()
+        self.json_loads = json_loads or _default_json_loads()
+        self.extra_params = {}
         self.set_experience_id(experience_id)
         self.base_url = base_url
+        # The hosts, connections and interval of the periodic warming up,
+        # or None.
+        self._rewarm_settings = None
+        _clients.add(self)
+
+        if warmup_hosts:
+            warmup_hosts = list(warmup_hosts)
+            self._background().submit(self.warmup, warmup_hosts,
+                                      warmup_connections)
+            if rewarm_interval:
+                self._rewarm_settings = (warmup_hosts, warmup_connections,
+                                         rewarm_interval)
+                self._start_rewarm()
+
+    def _init_transport(self, requests_session, transport, pool_settings):
+        """Sets up the session and transport requests are sent with, sizing
+        the session's connection pools if the client created it.
+
+        :param pool_settings: The pool_* arguments of __init__.
+        :type pool_settings: dict
+        """
+        self.session = requests_session
+        if requests_session is None:
+            self.session = requests.Session()
+            self._pool_settings = pool_settings
+            self._size_pools(_DEFAULT_MAP_WORKERS)
+        self.transport = (transport or
+                          googlemaps.transport.RequestsTransport(self.session))
 
     def set_experience_id(self, *experience_id_args):
         """Sets the value for the HTTP header field name
@@ -212,7 +475,9 @@ class Client:
             self.clear_experience_id()
             return
 
-        headers = self.requests_kwargs.pop("headers", {})
+        # The headers are replaced rather than changed, as requests being
+        # sent may be reading them.
+        headers = dict(self.requests_kwargs.get("headers", {}))
         headers[_X_GOOG_MAPS_EXPERIENCE_ID] = ",".join(experience_id_args)
         self.requests_kwargs["headers"] = headers
 
@@ -231,14 +496,235 @@ class Client:
         'X-Goog-Maps-Experience-ID' if set.
         """
         headers = self.requests_kwargs.get("headers")
-        if headers is None:
+        if headers is None or _X_GOOG_MAPS_EXPERIENCE_ID not in headers:
             return
-        headers.pop(_X_GOOG_MAPS_EXPERIENCE_ID, {})
+        headers = dict(headers)
+        del headers[_X_GOOG_MAPS_EXPERIENCE_ID]
         self.requests_kwargs["headers"] = headers
 
+    def view(self, extra_params=None, headers=None, experience_id=None):
+        """Returns a view of this client, which sends requests with its own
+        URL parameters and headers, but shares the client's connections,
+        rate limiters, circuit breakers, cache and thread pools. Views are
+        cheap, so that one client can serve callers, e.g. threads or
+        tenants, that each need their own settings::
+
+            tenant = client.view(experience_id="tenant-a",
+                                 extra_params={"region": "au"})
+            tenant.geocode("Sydney")
+
+        Changing the experience ID of a view doesn't affect the client.
+
+        :param extra_params: URL parameters added to each request, which
+            the `extra_params` of an API method call take precedence over.
+        :type extra_params: dict
+
+        :param headers: HTTP headers added to each request.
+        :type headers: dict
+
+        :param experience_id: The value for the HTTP header field name
+            'X-Goog-Maps-Experience-ID'.
+        :type experience_id: str
+
+        :rtype: Client
+        """
+        view = copy.copy(self)
+        view.extra_params = dict(self.extra_params, **(extra_params or {}))
+        view.requests_kwargs = dict(self.requests_kwargs)
+        view.requests_kwargs["headers"] = dict(
+            self.requests_kwargs.get("headers", {}), **(headers or {}))
+        if experience_id is not None:
+            view.set_experience_id(experience_id)
+        _clients.add(view)
+        return view
+
+    def warmup(self, hosts=None, connections_per_host=1, timeout=10):
+        """Opens connections to API hosts, and parks them in the connection
+        pools, so that the first requests to each host don't wait for DNS,
+        TCP and TLS. Hosts are connected to at once. Failures are logged
+        rather than raised, as warming up is only an optimization.
+
+        :param hosts: The base URLs of the hosts. Defaults to those of all
+            the APIs, googlemaps.pool.GOOGLE_HOSTS.
+        :type hosts: list of strings
+
+        :param connections_per_host: The number of connections to open to
+            each host, up to the size of its pool.
+        :type connections_per_host: int
+
+        :param timeout: The connect timeout, in seconds.
+        :type timeout: float
+
+        :returns: The number of connections open to each host, keyed by
+            base URL.
+        :rtype: dict
+        """
+        hosts = list(hosts or googlemaps.pool.GOOGLE_HOSTS)
+
+        def warm(base_url):
+            try:
+                return self.transport.warmup(base_url, connections_per_host,
+                                             timeout)
+            except Exception as e:
+                logger.warning("Failed to warm up connections to %s: %s",
+                               base_url, e)
+                return 0
+
+        with concurrent.futures.ThreadPoolExecutor(len(hosts)) as executor:
+            return dict(zip(hosts, executor.map(warm, hosts)))
+
+    def pool_stats(self):
+        """Returns the use of the session's connection pools, keyed by host:
+        the most connections kept ("maxsize"), the connections in use and
+        idle, the connections opened and the requests sent, and how many of
+        those reused a connection ("reused").
+
+        Empty if the session was given to the client.
+
+        :rtype: dict
+        """
+        return googlemaps.pool.pool_stats(self.session)
+
+    def _size_pools(self, workers):
+        """Sizes the client's pools for a number of threads making requests:
+        its thread pool for hedged requests, and the connection pools of its
+        own session, which also cover the hedged duplicates and its
+        background thread pool. Pools are only ever grown, and connection
+        pools only if pool_maxsize wasn't given.
+        """
+        root = self._root
+        with self._pool_lock:
+            root._workers = max(root._workers, workers)
+            settings = self._pool_settings
+            if settings is None:
+                return
+            maxsize = settings["pool_maxsize"]
+            if maxsize is None:
+                maxsize = 2 * workers + _BACKGROUND_WORKERS
+            if maxsize > root._pool_maxsize:
+                if root._pool_maxsize:
+                    # Grown in place, keeping the connections already open.
+                    googlemaps.pool.resize_pools(self.session, maxsize,
+                                                 settings["pools"])
+                else:
+                    googlemaps.pool.mount_adapters(
+                        self.session, maxsize, settings["pool_block"],
+                        settings["keepalive"], settings["pools"])
+                root._pool_maxsize = maxsize
+
+    def _start_rewarm(self):
+        """Starts the thread which warms up the client's connections every
+        rewarm_interval seconds."""
+        threading.Thread(target=_rewarm, daemon=True,
+                         args=(weakref.ref(self),) +
+                         self._rewarm_settings).start()
+
+    def _after_fork(self, renewed):
+        """Replaces the connection pools, locks and thread pools inherited
+        by a child process after os.fork(), which the parent is still using,
+        or which threads that don't exist in the child may have held, and
+        restarts the periodic warming up, whose thread the child lacks.
+
+        :param renewed: The replacements made so far, keyed by the id of the
+            inherited object, so that a client and its views go on sharing
+            them.
+        :type renewed: dict
+        """
+        self._pool_lock = _renew(renewed, self._pool_lock, threading.Lock)
+        self._executor_lock = _renew(renewed, self._executor_lock,
+                                     threading.Lock)
+        root = self._root
+        if root._executor is not None:
+            root._executor = _renew(
+                renewed, root._executor,
+                lambda: concurrent.futures.ThreadPoolExecutor(
+                    _BACKGROUND_WORKERS))
+        if root._hedge_executor is not None:
+            root._hedge_executor = _renew(
+                renewed, root._hedge_executor,
+                lambda: concurrent.futures.ThreadPoolExecutor(
+                    root._hedge_workers))
+        self._revalidating = _renew(renewed, self._revalidating, set)
+
+        for component in (self.transport, self.rate_limiter,
+                          self.rate_limiters, self.retry_budget,
+                          self.circuit_breakers, self.latencies,
+                          self.flights, self.cache):
+            if component is not None:
+                _renew(renewed, component, component.after_fork)
+
+        # Views share the warming up of their client.
+        if self._rewarm_settings is not None and self._root is self:
+            self._start_rewarm()
+
+    def map(self, method, kwargs_iterable, max_workers=_DEFAULT_MAP_WORKERS,
+            ordered=True):
+        """Calls an API method once per item of kwargs_iterable, from a pool
+        of threads, yielding a MapResult for each call.
+
+        All calls share this client's session and rate limit. An exception
+        raised by one call is reported in its MapResult, rather than
+        aborting the remaining calls. For example::
+
+            for r in client.map("geocode", [{"address": "Sydney"},
+                                            {"address": "Melbourne"}]):
+                if r.exception is None:
+                    print(r.kwargs["address"], r.result)
+
+        :param method: The name of a Client API method, e.g. "geocode", or a
+            function that takes a client as its first argument, e.g.
+            googlemaps.weather.weather_currentconditions.
+        :type method: string or function
+
+        :param kwargs_iterable: Keyword args for each call. This is consumed
+            lazily, so it may be a generator over a large input.
+        :type kwargs_iterable: iterable of dicts
+
+        :param max_workers: The number of calls to run concurrently.
+        :type max_workers: int
+
+        :param ordered: If True, results are yielded in the order of
+            kwargs_iterable. Otherwise they are yielded as they complete.
+        :type ordered: bool
+
+        :rtype: iterator of MapResult
+        """
+        if isinstance(method, str):
+            func = getattr(self, method)
+        else:
+            func = functools.partial(method, self)
+
+        def call(index, kwargs):
+            try:
+                return MapResult(index, kwargs, func(**kwargs), None)
+            except Exception as e:
+                return MapResult(index, kwargs, None, e)
+
+        self._size_pools(max_workers)
+
+        # Bound the number of submitted calls, so that a large input isn't
+        # queued up in memory all at once.
+        max_pending = max_workers * 2
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            pending = collections.deque()
+            try:
+                for index, kwargs in enumerate(kwargs_iterable):
+                    pending.append(executor.submit(call, index, kwargs))
+                    while len(pending) >= max_pending:
+                        yield from _map_collect(pending, ordered)
+                while pending:
+                    yield from _map_collect(pending, ordered)
+            finally:
+                # Stop queued calls if the caller stops iterating early.
+                for future in pending:
+                    future.cancel()
+
     def _request(self, url, params, first_request_time=None, retry_counter=0,
              base_url=None, accepts_clientid=True,
-             extract_body=None, requests_kwargs=None, post_json=None):
+             extract_body=None, requests_kwargs=None, post_json=None,
+             hedge_after_ms=None, deadline=None, extra_params=None,
+             revalidate=False):
         """Performs HTTP GET/POST with credentials, returning the body as
         JSON.
 
@@ -273,8 +759,34 @@ class Client:
             per-request basis.
         :type requests_kwargs: dict
 
+        :param hedge_after_ms: If set, a GET request which hasn't been
+            answered after this many milliseconds, or the client's
+            hedge_percentile of recent latencies once known, is sent again,
+            and the first response used. Defaults to the `hedge_after_ms`
+            given to the API method being called.
+        :type hedge_after_ms: int
+
+        :param deadline: The time.monotonic() value by which the request must
+            complete, across all attempts. Backoff and rate limit pauses
+            which would run past it are refused, and each attempt's HTTP
+            timeout is cut to the time remaining. Defaults to the `deadline`
+            given to the API method being called.
+        :type deadline: float
+
+        :param extra_params: Additional URL parameters. Defaults to the
+            `extra_params` given to the API method being called.
+        :type extra_params: dict
+
+        :param revalidate: If True, the request is sent without consulting
+            the cache, and its response cached.
+        :type revalidate: bool
+
         :raises ApiError: when the API returns an error.
-        :raises Timeout: if the request timed out.
+        :raises Timeout: if the request timed out, or could not complete
+            before the deadline.
+        :raises RetryBudgetExceeded: if the request failed, and the retry
+            budget did not allow it to be retried.
+        :raises CircuitOpen: if the circuit breaker for base_url is open.
         :raises TransportError: when something went wrong while trying to
             exceute a request.
         """
@@ -285,69 +797,524 @@ class Client:
         if not first_request_time:
             first_request_time = datetime.now()
 
+        if extra_params is None:
+            extra_params = _call_options.get().extra_params or {}
+
+        # The URL is signed, and the request arguments built, once for all
+        # attempts.
+        full_url, final_requests_kwargs = self._prepare_request(
+            url, params, base_url, accepts_clientid, requests_kwargs,
+            post_json, extra_params)
+
+        cache_key = self._cache_key(base_url, url, params, post_json,
+                                    final_requests_kwargs, extra_params)
+        if cache_key is not None and not revalidate:
+            content, stale = self.cache.lookup(cache_key)
+            if content is not None:
+                if stale:
+                    self._revalidate(cache_key, url, params,
+                                     base_url=base_url,
+                                     accepts_clientid=accepts_clientid,
+                                     extract_body=extract_body,
+                                     requests_kwargs=requests_kwargs,
+                                     extra_params=extra_params)
+                return self._extract_body(
+                    googlemaps.transport.BufferedResponse(200, {}, content),
+                    extract_body)
+
+        if hedge_after_ms is None:
+            hedge_after_ms = _call_options.get().hedge_after_ms
+        if deadline is None:
+            deadline = _call_options.get().deadline
+        send = functools.partial(
+            self._send_request, url, full_url, final_requests_kwargs,
+            base_url, post_json, extract_body, first_request_time,
+            retry_counter, hedge_after_ms, deadline, cache_key)
+
+        flight_key = self._flight_key(full_url, post_json,
+                                      final_requests_kwargs)
+        if flight_key is None:
+            return send()[0]
+
+        while True:
+            flight, leader = self.flights.begin(flight_key)
+            if leader:
+                break
+            response = self._await_flight(flight, deadline)
+            if response is not None:
+                return self._extract_body(response, extract_body)
+
+        try:
+            result, response = send()
+        except googlemaps.exceptions._DeadlineExceeded:
+            # The followers have deadlines of their own, so the flight is
+            # abandoned, and one of them sends the request instead.
+            self.flights.end(flight_key)
+            raise
+        except Exception as e:
+            self.flights.end(flight_key, exception=e)
+            raise
+        except BaseException:
+            self.flights.end(flight_key)
+            raise
+        self.flights.end(flight_key, response)
+        return result
+
+    def _send_request(self, url, full_url, final_requests_kwargs, base_url,
+                      post_json, extract_body, first_request_time,
+                      retry_counter, hedge_after_ms, deadline, cache_key):
+        """Sends a prepared request, retrying it as needed. Takes the
+        arguments of _request, plus:
+
+        :param full_url: The signed URL of the request.
+        :type full_url: string
+
+        :param final_requests_kwargs: The keyword args to send it with.
+        :type final_requests_kwargs: dict
+
+        :param cache_key: The key to cache its response under, or None.
+        :type cache_key: string
+
+        :returns: The result extracted from the response, and the response.
+        :rtype: tuple
+        """
+        # Determine GET/POST.
+        requests_method = functools.partial(self.transport.request, "GET")
+        if post_json is not None:
+            requests_method = functools.partial(self.transport.request,
+                                                "POST")
+
+        api = googlemaps.ratelimit.api_for_path(base_url, url)
+        rate_limiter = self.rate_limiters.get(base_url, url)
+        breaker = self.circuit_breakers.get(base_url)
+        delay_seconds = None
+        retry_after = None
+        if self.retry_budget is not None and retry_counter == 0:
+            self.retry_budget.record_request()
+
+        while True:
+            delay_seconds = self._retry_delay(first_request_time,
+                                              retry_counter, delay_seconds,
+                                              retry_after, deadline)
+            if delay_seconds:
+                time.sleep(delay_seconds)
+
+            self._check_deadline(deadline, rate_limiter)
+            breaker.before_request(base_url)
+            try:
+                rate_limit_delay = self._admit(rate_limiter, deadline)
+                if rate_limit_delay > 0:
+                    time.sleep(rate_limit_delay)
+                attempt_kwargs, cut = _deadline_kwargs(final_requests_kwargs,
+                                                       deadline)
+                hedge_delay = self._hedge_delay(api, hedge_after_ms,
+                                                post_json, attempt_kwargs)
+            except BaseException:
+                # Not sent, so that a probe doesn't hold the breaker
+                # half-open.
+                breaker.release()
+                raise
+
+            try:
+                start = time.monotonic()
+                if hedge_delay is None:
+                    response = requests_method(full_url, **attempt_kwargs)
+                else:
+                    response = self._send_hedged(
+                        requests_method, full_url, attempt_kwargs,
+                        hedge_delay, rate_limiter, deadline)
+                if self.latencies is not None:
+                    self.latencies.record(api, time.monotonic() - start)
+            except googlemaps.exceptions._DeadlineExceeded:
+                breaker.release()
+                raise
+            except googlemaps.exceptions.Timeout:
+                if cut:
+                    # Timing out is down to the deadline rather than the
+                    # server, so it isn't counted against it.
+                    breaker.release()
+                    raise googlemaps.exceptions._DeadlineExceeded()
+                breaker.record_failure()
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                raise googlemaps.exceptions.TransportError(e)
+            except BaseException:
+                # Interrupted, e.g. by KeyboardInterrupt, so that a probe
+                # doesn't hold the breaker half-open.
+                breaker.release()
+                raise
+            breaker.record_status(response.status_code)
+
+            result = self._handle_response_cached(
+                response, extract_body, rate_limiter, retry_counter + 1,
+                cache_key, url)
+            if result is not _RETRY:
+                return result, response
+
+            retry_after = self._prepare_retry(response, rate_limiter)
+            retry_counter += 1
+
+    def _flight_key(self, full_url, post_json, requests_kwargs):
+        """Returns the key identical requests in flight are coalesced under:
+        the signed URL, followed by the body of a POST request. Returns None
+        if the request isn't coalesced, because coalescing is disabled, or
+        its response is streamed.
+
+        :rtype: string
+        """
+        if self.flights is None or requests_kwargs.get("stream"):
+            return None
+        if post_json is None:
+            return full_url
+        return full_url + "\n" + json.dumps(post_json, sort_keys=True)
+
+    def _await_flight(self, flight, deadline):
+        """Waits for the response to a request in flight.
+
+        :raises Timeout: if the deadline passes first.
+        """
+        timeout = None
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.monotonic())
+        try:
+            return flight.result(timeout)
+        except concurrent.futures.TimeoutError:
+            raise googlemaps.exceptions._DeadlineExceeded()
+
+    def _background(self):
+        """Returns the thread pool which runs cache refreshes and warming
+        up."""
+        root = self._root
+        with self._executor_lock:
+            if root._executor is None:
+                root._executor = concurrent.futures.ThreadPoolExecutor(
+                    _BACKGROUND_WORKERS)
+            return root._executor
+
+    def _hedging(self):
+        """Returns the thread pool which runs hedged requests, with a thread
+        for the request and one for its duplicate for each thread the client
+        has been sized for, so that hedged requests don't queue behind each
+        other."""
+        root = self._root
+        with self._executor_lock:
+            if root._hedge_workers < 2 * root._workers:
+                # The threads of the pool replaced exit once it has run the
+                # requests already given to it.
+                root._hedge_workers = 2 * root._workers
+                root._hedge_executor = concurrent.futures.ThreadPoolExecutor(
+                    root._hedge_workers)
+            return root._hedge_executor
+
+    def _revalidate(self, cache_key, url, params, **kwargs):
+        """Fetches a fresh copy of a stale cached response in the background,
+        unless it is already being fetched.
+
+        :param kwargs: Keyword args for _request.
+        :type kwargs: dict
+        """
+        with self._executor_lock:
+            if cache_key in self._revalidating:
+                return
+            self._revalidating.add(cache_key)
+
+        def done(future):
+            with self._executor_lock:
+                self._revalidating.discard(cache_key)
+            if future.exception() is not None:
+                logger.warning("Failed to refresh cached response for %s: %s",
+                               url, future.exception())
+
+        future = self._background().submit(self._request, url, params,
+                                           revalidate=True, **kwargs)
+        future.add_done_callback(done)
+
+    def _hedge_delay(self, api, hedge_after_ms, post_json, requests_kwargs):
+        """Returns the number of seconds after which a request is hedged, or
+        None if it isn't. Only GET requests are hedged, since they are
+        idempotent, and not streamed ones, whose body is read by the caller.
+
+        :rtype: float
+        """
+        if (hedge_after_ms is None or post_json is not None or
+                requests_kwargs.get("stream")):
+            return None
+
+        if self.latencies is not None:
+            latency = self.latencies.latency(api)
+            if latency is not None:
+                return latency
+        return hedge_after_ms / 1000.0
+
+    def _send_hedged(self, requests_method, url, requests_kwargs,
+                     hedge_delay, rate_limiter, deadline=None):
+        """Sends a request, sending it again if it hasn't been answered after
+        hedge_delay seconds, and returns whichever response arrives first.
+        The duplicate is admitted by the rate limiter like any other
+        request.
+
+        :param deadline: The time.monotonic() value by which the request must
+            complete, if any.
+        :type deadline: float
+
+        :rtype: requests.Response
+
+        :raises Timeout: if no thread is free to send the request before the
+            deadline.
+        """
+        executor = self._hedging()
+        send = functools.partial(requests_method, url, **requests_kwargs)
+        started = threading.Event()
+
+        def send_primary():
+            started.set()
+            return send()
+
+        primary = executor.submit(send_primary)
+        # Time spent waiting for a thread doesn't count towards hedge_delay,
+        # as a duplicate would only wait behind it.
+        timeout = None
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.monotonic())
+        if not started.wait(timeout) and primary.cancel():
+            raise googlemaps.exceptions._DeadlineExceeded()
+        if concurrent.futures.wait([primary], hedge_delay).done:
+            return primary.result()
+
+        rate_limit_delay = rate_limiter.reserve()
+        if (rate_limit_delay > 0 and
+                concurrent.futures.wait([primary], rate_limit_delay).done):
+            return primary.result()
+
+        pending = {primary, executor.submit(send)}
+        error = None
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        _discard_hedged(loser)
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def _prepare_retry(self, response, rate_limiter):
+        """Withdraws a retry from the retry budget, and returns the pause the
+        server asked for before it, if any.
+
+        :param response: The response to the attempt being retried.
+        :type response: requests.Response
+
+        :rtype: float
+
+        :raises RetryBudgetExceeded: if the retry budget is spent, from the
+            error the response would otherwise be reported as.
+        """
+        if self.retry_budget is not None and not self.retry_budget.try_retry():
+            error = _retry_error(response, self.json_loads)
+            raise googlemaps.exceptions.RetryBudgetExceeded(
+                response.status_code) from error
+
+        retry_after = self.retry_policy.retry_after(response)
+        if retry_after is not None:
+            rate_limiter.record_retry_after(retry_after)
+        return retry_after
+
+    def _retry_delay(self, first_request_time, retry_counter, previous_delay,
+                     retry_after, deadline=None):
+        """Returns the number of seconds to pause before an attempt, or None
+        before the first.
+
+        :param previous_delay: The pause before the previous attempt, if any.
+        :type previous_delay: float
+
+        :param retry_after: The pause the server asked for in its response to
+            the previous attempt, if any.
+        :type retry_after: float
+
+        :param deadline: The time.monotonic() value by which the request must
+            complete, if any.
+        :type deadline: float
+
+        :raises Timeout: if the attempt could not start before retry_timeout
+            or the deadline.
+        """
         elapsed = datetime.now() - first_request_time
         if elapsed > self.retry_timeout:
             raise googlemaps.exceptions.Timeout()
+        if deadline is not None and time.monotonic() >= deadline:
+            raise googlemaps.exceptions._DeadlineExceeded()
 
-        if retry_counter > 0:
-            # 0.5 * (1.5 ^ i) is an increased sleep time of 1.5x per iteration,
-            # starting at 0.5s when retry_counter=0. The first retry will occur
-            # at 1, so subtract that first.
-            delay_seconds = 0.5 * 1.5 ** (retry_counter - 1)
+        if retry_counter == 0:
+            return None
+
+        if retry_after is not None:
+            delay_seconds = retry_after
+        else:
+            delay_seconds = self.retry_policy.delay(retry_counter,
+                                                    previous_delay)
+
+        # Fail now rather than sleep past the deadline.
+        if elapsed + timedelta(seconds=delay_seconds) > self.retry_timeout:
+            raise googlemaps.exceptions.Timeout()
+        if (deadline is not None and
+                time.monotonic() + delay_seconds >= deadline):
+            raise googlemaps.exceptions._DeadlineExceeded()
+        return delay_seconds
+
+    def _check_deadline(self, deadline, rate_limiter):
+        """Refuses an attempt which could not be sent before the deadline,
+        allowing for the pause the rate limiter would impose, so that no
+        quota is spent on it.
+
+        :param deadline: The time.monotonic() value by which the request must
+            complete, if any.
+        :type deadline: float
+
+        :raises Timeout: if the deadline would pass before the attempt is
+            sent.
+        """
+        if deadline is None:
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or rate_limiter.wait_time() >= remaining:
+            raise googlemaps.exceptions._DeadlineExceeded()
 
-            # Jitter this value by 50% and pause.
-            time.sleep(delay_seconds * (random.random() + 0.5))
+    def _admit(self, rate_limiter, deadline):
+        """Reserves an attempt's admission by the rate limiter, and returns
+        the pause before it may be sent. The pause is checked against the
+        deadline once reserved, since other requests may have been admitted
+        since _check_deadline.
 
-        authed_url = self._generate_auth_url(url, params, accepts_clientid)
+        :param deadline: The time.monotonic() value by which the request must
+            complete, if any.
+        :type deadline: float
+
+        :rtype: float
+
+        :raises Timeout: if the deadline would pass before the attempt is
+            sent.
+        """
+        delay_seconds = rate_limiter.reserve()
+        if (deadline is not None and
+                time.monotonic() + delay_seconds >= deadline):
+            raise googlemaps.exceptions._DeadlineExceeded()
+        return delay_seconds
+
+    def _prepare_request(self, url, params, base_url, accepts_clientid,
+                         requests_kwargs, post_json, extra_params=None):
+        """Returns the full URL of a request, and the keyword args to send it
+        with.
+
+        :rtype: tuple of string and dict
+        """
+        authed_url = self._generate_auth_url(url, params, accepts_clientid,
+                                             extra_params)
 
         # Default to the client-level self.requests_kwargs, with method-level
         # requests_kwargs arg overriding.
         requests_kwargs = requests_kwargs or {}
         final_requests_kwargs = dict(self.requests_kwargs, **requests_kwargs)
-
-        # Determine GET/POST.
-        requests_method = self.session.get
         if post_json is not None:
-            requests_method = self.session.post
             final_requests_kwargs["json"] = post_json
-        #return base_url + authed_url,final_requests_kwargs
+
+        return base_url + authed_url, final_requests_kwargs
+
+    def _cache_key(self, base_url, url, params, post_json, requests_kwargs,
+                   extra_params=None):
+        """Returns the key the response to a request is cached under: its
+        canonical URL, without credentials. Returns None if the response
+        isn't cached, because there is no cache, or it is a POST request,
+        or its response is streamed.
+
+        :rtype: string
+        """
+        if (self.cache is None or post_json is not None or
+                requests_kwargs.get("stream") or
+                self.cache.ttl_for(url) == 0):
+            return None
+
+        params = self._canonical_params(params, extra_params)
+        return base_url + url + "?" + urlencode_params(params)
+
+    def _cache_response(self, cache_key, url, response, negative=None):
+        """Caches the body of a successful response to a request, if it has
+        a cache key.
+
+        :param negative: Whether the response found nothing. If None, this
+            is read from the status in the response.
+        :type negative: bool
+        """
+        if cache_key is None or response.status_code != 200:
+            return
+
+        if negative is None:
+            # Only parse the bodies which could hold a ZERO_RESULTS status.
+            negative = (b"ZERO_RESULTS" in response.content and
+                        _response_status(response, self.json_loads) ==
+                        "ZERO_RESULTS")
+        self.cache.store(cache_key, url, response.content, negative)
+
+    def _handle_response_cached(self, response, extract_body, rate_limiter,
+                                attempts, cache_key, url):
+        """Handles a response like _handle_response, then caches it if it is
+        a success, or an answer that found nothing."""
         try:
-            response = requests_method(base_url + authed_url,
-                                       **final_requests_kwargs)
-        except requests.exceptions.Timeout:
-            raise googlemaps.exceptions.Timeout()
-        except Exception as e:
-            raise googlemaps.exceptions.TransportError(e)
-
-        if response.status_code in _RETRIABLE_STATUSES:
-            # Retry request.
-            return self._request(url, params, first_request_time,
-                                 retry_counter + 1, base_url, accepts_clientid,
-                                 extract_body, requests_kwargs, post_json)
-
-        # Check if the time of the nth previous query (where n is
-        # queries_per_second) is under a second ago - if so, sleep for
-        # the difference.
-        if self.sent_times and len(self.sent_times) == self.queries_quota:
-            elapsed_since_earliest = time.time() - self.sent_times[0]
-            if elapsed_since_earliest < 1:
-                time.sleep(1 - elapsed_since_earliest)
+            result = self._handle_response(response, extract_body,
+                                           rate_limiter, attempts)
+        except googlemaps.exceptions.ApiError as e:
+            if e.status in _NEGATIVE_STATUSES:
+                self._cache_response(cache_key, url, response, negative=True)
+            raise
+        if result is not _RETRY:
+            self._cache_response(cache_key, url, response)
+        return result
+
+    def _extract_body(self, response, extract_body):
+        if extract_body:
+            # The extractor decodes the body with this client's json_loads.
+            token = _json_loads.set(self.json_loads)
+            try:
+                return extract_body(response)
+            finally:
+                _json_loads.reset(token)
+        return self._get_body(response)
+
+    def _handle_response(self, response, extract_body, rate_limiter,
+                         attempts):
+        """Returns the result extracted from a response, or _RETRY if the
+        request should be attempted again.
+
+        :param attempts: The number of attempts made so far, including the
+            one which got this response.
+        :type attempts: int
+
+        :raises ApiError: when the API returns an error.
+        """
+        # HTTP 429 is the transport-level equivalent of OVER_QUERY_LIMIT.
+        over_query_limit = response.status_code == 429
+        if over_query_limit:
+            rate_limiter.record_over_query_limit()
+
+        if (self.retry_policy.retries_status(response.status_code, attempts)
+                and (self.retry_over_query_limit or not over_query_limit)):
+            return _RETRY
 
         try:
-            if extract_body:
-                result = extract_body(response)
-            else:
-                result = self._get_body(response)
-            self.sent_times.append(time.time())
+            result = self._extract_body(response, extract_body)
+            rate_limiter.record_success()
             return result
         except googlemaps.exceptions._RetriableRequest as e:
-            if isinstance(e, googlemaps.exceptions._OverQueryLimit) and not self.retry_over_query_limit:
-                raise
+            if isinstance(e, googlemaps.exceptions._OverQueryLimit):
+                rate_limiter.record_over_query_limit()
+                if not self.retry_over_query_limit:
+                    raise
 
-            # Retry request.
-            return self._request(url, params, first_request_time,
-                                 retry_counter + 1, base_url, accepts_clientid,
-                                 extract_body, requests_kwargs, post_json)
+            if not self.retry_policy.allows_retry(attempts):
+                raise
+            return _RETRY
 
     def _get(self, *args, **kwargs):  # Backwards compatibility.
         return self._request(*args, **kwargs)
@@ -356,7 +1323,7 @@ class Client:
         if response.status_code != 200:
             raise googlemaps.exceptions.HTTPError(response.status_code)
 
-        body = response.json()
+        body = self.json_loads(response.content)
 
         try:
             api_status = body["status"]
@@ -376,7 +1343,31 @@ class Client:
             api_status, body.get("error_message")
         )
 
-    def _generate_auth_url(self, path, params, accepts_clientid):
+    def _canonical_params(self, params, extra_params=None):
+        """Returns the URL parameters of a request, merged with extra_params,
+        in a deterministic order.
+
+        :param params: URL parameters.
+        :type params: dict or list of key/value tuples
+
+        :param extra_params: Additional URL parameters. Defaults to the
+            `extra_params` given to the API method being called.
+        :type extra_params: dict
+
+        :rtype: list of key/value tuples
+        """
+        # Deterministic ordering through sorting by key.
+        # Useful for tests, and for caching.
+        if extra_params is None:
+            extra_params = _call_options.get().extra_params or {}
+        if self.extra_params:
+            extra_params = dict(self.extra_params, **extra_params)
+        if type(params) is dict:
+            return sorted(dict(extra_params, **params).items())
+        return sorted(extra_params.items()) + params[:] # Take a copy.
+
+    def _generate_auth_url(self, path, params, accepts_clientid,
+                           extra_params=None):
         """Returns the path and query string portion of the request URL, first
         adding any necessary parameters.
 
@@ -386,16 +1377,14 @@ class Client:
         :param params: URL parameters.
         :type params: dict or list of key/value tuples
 
+        :param extra_params: Additional URL parameters. Defaults to the
+            `extra_params` given to the API method being called.
+        :type extra_params: dict
+
         :rtype: string
 
         """
-        # Deterministic ordering through sorting by key.
-        # Useful for tests, and in the future, any caching.
-        extra_params = getattr(self, "_extra_params", None) or {}
-        if type(params) is dict:
-            params = sorted(dict(extra_params, **params).items())
-        else:
-            params = sorted(extra_params.items()) + params[:] # Take a copy.
+        params = self._canonical_params(params, extra_params)
 
         if accepts_clientid and self.client_id and self.client_secret:
             if self.channel:
@@ -439,25 +1428,176 @@ from googlemaps.addressvalidation import addressvalidation
 def make_api_method(func):
     """
     Provides a single entry point for modifying all API methods.
-    For now this is limited to allowing the client object to be modified
-    with an `extra_params` keyword arg to each method, that is then used
-    as the params for each web service request.
+    For now this is limited to an `extra_params` keyword arg to each method,
+    that is then used as the params for each web service request.
 
     Please note that this is an unsupported feature for advanced use only.
-    It's also currently incompatibile with multiple threads, see GH #160.
+    The params are held in a context variable for the duration of the call,
+    never on the client, so concurrent calls from several threads (see GH
+    #160) don't see each other's params. For params shared by many calls,
+    use Client.view().
+
+    Each method also accepts a `hedge_after_ms` keyword arg, to hedge its
+    requests (see Client._request), and a `deadline` keyword arg, the number
+    of seconds the call may take, retries and rate limiting included.
     """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        args[0]._extra_params = kwargs.pop("extra_params", None)
-        result = func(*args, **kwargs)
+        token = _call_options.set(_CallOptions(
+            kwargs.pop("extra_params", None),
+            kwargs.pop("hedge_after_ms", None),
+            _deadline_from_timeout(kwargs.pop("deadline", None))))
         try:
-            del args[0]._extra_params
-        except AttributeError:
-            pass
-        return result
+            return func(*args, **kwargs)
+        finally:
+            _call_options.reset(token)
     return wrapper
 
 
+def _after_fork():
+    """Gives the clients of a child process, after os.fork(), their own
+    connection pools, locks and thread pools."""
+    renewed = {}
+    for client in list(_clients):
+        client._after_fork(renewed)
+
+
+if hasattr(os, "register_at_fork"):  # Not available on Windows.
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _renew(renewed, inherited, factory):
+    """Returns the replacement for an object inherited by a forked child,
+    calling factory for it once, however many clients share the object."""
+    key = id(inherited)
+    if key not in renewed:
+        # The inherited object is kept, so that its id isn't reused.
+        renewed[key] = (inherited, factory())
+    return renewed[key][1]
+
+
+def _rewarm(client_ref, hosts, connections, interval):
+    """Warms up a client's connections every interval seconds, until the
+    client is garbage collected."""
+    while True:
+        time.sleep(interval)
+        client = client_ref()
+        if client is None:
+            return
+        client.warmup(hosts, connections)
+        del client
+
+
+def _default_json_loads():
+    """Returns the loads() of the fastest JSON library installed, or
+    json.loads."""
+    for name in _FAST_JSON_MODULES:
+        try:
+            return importlib.import_module(name).loads
+        except ImportError:
+            continue
+    return json.loads
+
+
+def _decode_body(response):
+    """Decodes the JSON body of a response from its bytes, with the
+    json_loads of the client extracting it. For the extract_body functions
+    given to Client._request.
+
+    :raises ValueError: if the body isn't valid JSON.
+    """
+    return _json_loads.get()(response.content)
+
+
+def _response_status(response, json_loads=json.loads):
+    """Returns the API status in the body of a response, or None."""
+    try:
+        body = json_loads(response.content)
+    except ValueError:
+        return None
+    if isinstance(body, dict):
+        return body.get("status")
+    return None
+
+
+def _retry_error(response, json_loads=json.loads):
+    """Returns the error for a response which would have been retried: an
+    HTTPError for its HTTP status, or an ApiError for the API status in its
+    body."""
+    if response.status_code != 200:
+        return googlemaps.exceptions.HTTPError(response.status_code)
+    return googlemaps.exceptions.ApiError(_response_status(response,
+                                                           json_loads))
+
+
+def _deadline_from_timeout(seconds):
+    """Returns the time.monotonic() value a given number of seconds from
+    now, or None if seconds is None."""
+    if seconds is None:
+        return None
+    return time.monotonic() + seconds
+
+
+def _deadline_kwargs(requests_kwargs, deadline):
+    """Returns the keyword args for an attempt at a request, with its HTTP
+    timeout cut to the time remaining before the deadline, and whether it
+    was cut, so that the attempt timing out is down to the deadline rather
+    than the API.
+
+    :param requests_kwargs: Keyword args for the requests library.
+    :type requests_kwargs: dict
+
+    :param deadline: The time.monotonic() value by which the request must
+        complete, if any.
+    :type deadline: float
+
+    :rtype: tuple of dict and bool
+    """
+    if deadline is None:
+        return requests_kwargs, False
+
+    # Never zero, which requests rejects.
+    remaining = max(deadline - time.monotonic(), 0.001)
+    configured = requests_kwargs.get("timeout")
+    if isinstance(configured, tuple):
+        timeout = tuple(min(t, remaining) if t else remaining
+                        for t in configured)
+    else:
+        timeout = min(configured, remaining) if configured else remaining
+    return dict(requests_kwargs, timeout=timeout), timeout != configured
+
+
+def _discard_hedged(future):
+    """Cancels the losing request of a hedged pair, or if it is already
+    running, closes its response once it arrives."""
+    if not future.cancel():
+        future.add_done_callback(
+            lambda f: f.exception() is None and f.result().close())
+
+
+def _map_collect(pending, ordered):
+    """Removes and returns the results of one or more finished futures from
+    the pending calls of Client.map.
+
+    :param pending: The futures of the pending calls, in input order.
+    :type pending: collections.deque
+
+    :param ordered: Whether to wait for the earliest submitted call, rather
+        than whichever completes first.
+    :type ordered: bool
+
+    :rtype: list of MapResult
+    """
+    if ordered:
+        return [pending.popleft().result()]
+
+    done, _ = concurrent.futures.wait(
+        pending, return_when=concurrent.futures.FIRST_COMPLETED)
+    for future in done:
+        pending.remove(future)
+    return [future.result() for future in done]
+
+
 Client.directions = make_api_method(directions)
 Client.distance_matrix = make_api_method(distance_matrix)
 Client.elevation = make_api_method(elevation)
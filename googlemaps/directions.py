@@ -18,13 +18,15 @@
 """Performs requests to the Google Maps Directions API."""
 
 from googlemaps import convert
+from googlemaps import jsonstream
 
 
 def directions(client, origin, destination,
                mode=None, waypoints=None, alternatives=False, avoid=None,
                language=None, units=None, region=None, departure_time=None,
                arrival_time=None, optimize_waypoints=False, transit_mode=None,
-               transit_routing_preference=None, traffic_model=None):
+               transit_routing_preference=None, traffic_model=None,
+               stream_routes=False, skip_keys=None):
     """Get directions between an origin point and a destination point.
 
     :param origin: The address or latitude/longitude value from which you wish
@@ -95,7 +97,19 @@ def directions(client, origin, destination,
         departure_time.
     :type units: string
 
-    :rtype: list of routes
+    :param stream_routes: If True, the response is parsed as it arrives,
+        and an iterator is returned which yields each route once it has
+        been read, e.g. for the alternatives of long routes. Errors from the
+        API are raised by the iterator, after any routes, and are not
+        retried.
+    :type stream_routes: bool
+
+    :param skip_keys: With stream_routes, keys whose values are dropped
+        wherever they appear in a route, so that they don't take up memory,
+        e.g. ["steps"] or ["html_instructions"].
+    :type skip_keys: list of strings
+
+    :rtype: list of routes, or an iterator of routes with stream_routes
     """
 
     params = {
@@ -150,4 +164,13 @@ def directions(client, origin, destination,
     if traffic_model:
         params["traffic_model"] = traffic_model
 
+    if stream_routes:
+        response = client._request("/maps/api/directions/json", params,
+                                   extract_body=jsonstream.extract_response,
+                                   requests_kwargs={"stream": True})
+        rate_limiter = client.rate_limiters.get(client.base_url,
+                                                "/maps/api/directions/json")
+        return jsonstream.iter_results(response, "routes", skip_keys,
+                                       rate_limiter)
+
     return client._request("/maps/api/directions/json", params).get("routes", [])
@@ -18,12 +18,14 @@
 """Performs requests to the Google Maps Distance Matrix API."""
 
 from googlemaps import convert
+from googlemaps import jsonstream
 
 
 def distance_matrix(client, origins, destinations,
                     mode=None, language=None, avoid=None, units=None,
                     departure_time=None, arrival_time=None, transit_mode=None,
-                    transit_routing_preference=None, traffic_model=None, region=None):
+                    transit_routing_preference=None, traffic_model=None, region=None,
+                    stream_rows=False, skip_keys=None):
     """ Gets travel distance and time for a matrix of origins and destinations.
 
     :param origins: One or more addresses, Place IDs, and/or latitude/longitude
@@ -87,8 +89,21 @@ def distance_matrix(client, origins, destinations,
         values are a ccTLD code.
     :type region: string
 
+    :param stream_rows: If True, the response is parsed as it arrives, and
+        an iterator is returned which yields each row once it has been
+        read, in the order of origins, instead of the whole matrix. Errors
+        from the API are raised by the iterator, after any rows, and are
+        not retried.
+    :type stream_rows: bool
+
+    :param skip_keys: With stream_rows, keys whose values are dropped
+        wherever they appear in a row, so that they don't take up memory,
+        e.g. ["duration_in_traffic"].
+    :type skip_keys: list of strings
+
     :rtype: matrix of distances. Results are returned in rows, each row
-        containing one origin paired with each destination.
+        containing one origin paired with each destination. With
+        stream_rows, an iterator of rows.
     """
 
     params = {
@@ -136,4 +151,13 @@ def distance_matrix(client, origins, destinations,
     if region:
         params["region"] = region
 
+    if stream_rows:
+        response = client._request("/maps/api/distancematrix/json", params,
+                                   extract_body=jsonstream.extract_response,
+                                   requests_kwargs={"stream": True})
+        rate_limiter = client.rate_limiters.get(
+            client.base_url, "/maps/api/distancematrix/json")
+        return jsonstream.iter_results(response, "rows", skip_keys,
+                                       rate_limiter)
+
     return client._request("/maps/api/distancematrix/json", params)
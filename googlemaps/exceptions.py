@@ -55,6 +55,40 @@ class Timeout(Exception):
     """The request timed out."""
     pass
 
+class RetryBudgetExceeded(Exception):
+    """The request failed, and was not retried because the client's retry
+    budget was spent. The error of the failed attempt is its __cause__."""
+    def __init__(self, status_code=None):
+        self.status_code = status_code
+
+    def __str__(self):
+        if self.status_code is None:
+            return "Retry budget exceeded"
+        return "Retry budget exceeded after HTTP %d" % self.status_code
+
+class CircuitOpen(Exception):
+    """The request was not sent, because the circuit breaker for its host is
+    open after repeated failures."""
+    def __init__(self, base_url=None, retry_in=None):
+        self.base_url = base_url
+        self.retry_in = retry_in
+
+    def __str__(self):
+        if self.retry_in:
+            return "Circuit open for %s, retry in %.1fs" % (self.base_url,
+                                                             self.retry_in)
+        return "Circuit open for %s" % self.base_url
+
+class _DeadlineExceeded(Timeout):
+    """Signifies that the request could not complete before the deadline
+    given by its caller.
+
+    Unlike a timeout of the client's own, this only concerns the caller,
+    so it isn't passed on to the callers of identical requests coalesced
+    with it.
+    """
+    pass
+
 class _RetriableRequest(Exception):
     """Signifies that the request can be retried."""
     pass
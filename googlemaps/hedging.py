@@ -0,0 +1,100 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""
+Support for hedged requests, which cut tail latency by sending a duplicate
+of a slow request and taking whichever response arrives first.
+
+A request is hedged once it has been outstanding for longer than most
+recent requests to the same API took, as measured by a LatencyTracker.
+"""
+
+import collections
+import threading
+
+
+class LatencyTracker:
+    """Keeps the latencies of recent requests to each API, and reports a
+    percentile of them. Thread-safe.
+    """
+
+    def __init__(self, percentile=95, window=100, min_samples=20):
+        """
+        :param percentile: The percentile of recent latencies reported, from
+            0 to 100.
+        :type percentile: float
+
+        :param window: The number of recent requests to each API kept.
+        :type window: int
+
+        :param min_samples: The number of requests to an API which must have
+            been recorded before a percentile is reported for it.
+        :type min_samples: int
+
+        :raises ValueError: if percentile is out of range, or window or
+            min_samples is not positive.
+        """
+        if not 0 <= percentile <= 100:
+            raise ValueError("percentile must be between 0 and 100.")
+        if window < 1 or min_samples < 1:
+            raise ValueError("window and min_samples must be positive.")
+
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min(min_samples, window)
+        self._lock = threading.Lock()
+        self._latencies = {}
+
+    def record(self, api, seconds):
+        """Records the latency of a request.
+
+        :param api: The API the request was made to, e.g. its
+            (base_url, path prefix) key.
+        :type api: tuple
+
+        :param seconds: The time the request took to complete.
+        :type seconds: float
+        """
+        with self._lock:
+            latencies = self._latencies.get(api)
+            if latencies is None:
+                latencies = self._latencies[api] = collections.deque(
+                    maxlen=self.window)
+            latencies.append(seconds)
+
+    def latency(self, api):
+        """Returns the percentile of recent latencies for an API, in
+        seconds, or None if too few requests to it have been recorded.
+
+        :param api: The API, as given to record().
+        :type api: tuple
+
+        :rtype: float
+        """
+        with self._lock:
+            latencies = self._latencies.get(api)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            latencies = sorted(latencies)
+
+        index = int(round(self.percentile / 100.0 * (len(latencies) - 1)))
+        return latencies[index]
+
+    def after_fork(self):
+        """Gives the tracker a fresh lock in a child process, after
+        os.fork()."""
+        self._lock = threading.Lock()
@@ -0,0 +1,233 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""
+Incremental parsing of large JSON responses, such as the rows of a distance
+matrix or the routes of directions with alternatives, so that each item can
+be used as soon as it has arrived, without the whole body being held in
+memory.
+
+Only the outer object is parsed incrementally. Each item of the streamed
+array, and each other member of the object, is parsed by the json module
+once all of its text has been read.
+"""
+
+import codecs
+import json
+
+from googlemaps import exceptions
+
+# The bytes read from the response at a time.
+_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+# The characters which may follow a value.
+_DELIMITERS = _WHITESPACE + ",:]}"
+
+
+class ArrayStream:
+    """Parses a JSON object as its text is read, yielding the items of one
+    of its arrays as each is complete. Once the items are exhausted, the
+    object's other members are in ``fields``. For example::
+
+        stream = ArrayStream(response.iter_content(65536), "rows")
+        for row in stream:
+            print(row)
+        print(stream.fields["status"])
+    """
+
+    def __init__(self, chunks, key, skip_keys=None):
+        """
+        :param chunks: The text of the object, as bytes encoded in UTF-8.
+        :type chunks: iterable of bytes
+
+        :param key: The key of the array whose items are yielded.
+        :type key: string
+
+        :param skip_keys: Keys whose values are dropped wherever they appear
+            within an item, e.g. ["steps"], so that they don't take up
+            memory.
+        :type skip_keys: collection of strings
+
+        :raises ValueError: while iterating, if the text isn't a valid JSON
+            object.
+        """
+        self.key = key
+        self.fields = {}
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._text = ""
+        self._pos = 0
+        # The number of characters parsed and dropped from _text.
+        self._offset = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+        self._item_decoder = self._decoder
+        if skip_keys:
+            skip_keys = frozenset(skip_keys)
+            self._item_decoder = json.JSONDecoder(
+                object_pairs_hook=lambda pairs: {
+                    k: v for k, v in pairs if k not in skip_keys})
+
+    def __iter__(self):
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self._value(self._decoder)
+            self._expect(":")
+            if key == self.key:
+                yield from self._items()
+            else:
+                self.fields[key] = self._value(self._decoder)
+            char = self._next()
+            if char == "}":
+                return
+            if char != ",":
+                self._error(",")
+
+    def _items(self):
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._value(self._item_decoder)
+            char = self._next()
+            if char == "]":
+                return
+            if char != ",":
+                self._error(",")
+
+    def _read(self, wanted=1):
+        """Reads at least wanted more characters of text, or the rest of
+        it, returning False if it had already ended."""
+        if self._eof:
+            return False
+        # Drop the text already parsed, so that it isn't held in memory.
+        parts = [self._text[self._pos:]]
+        self._offset += self._pos
+        self._pos = 0
+        read = 0
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk)
+            parts.append(text)
+            read += len(text)
+            if read >= wanted:
+                break
+        else:
+            self._eof = True
+            parts.append(self._utf8.decode(b"", final=True))
+        self._text = "".join(parts)
+        return True
+
+    def _peek(self):
+        """Returns the next character other than whitespace, without
+        consuming it, or "" at the end of the text."""
+        while True:
+            while (self._pos < len(self._text) and
+                   self._text[self._pos] in _WHITESPACE):
+                self._pos += 1
+            if self._pos < len(self._text):
+                return self._text[self._pos]
+            if not self._read():
+                return ""
+
+    def _next(self):
+        """Consumes and returns the next character other than whitespace."""
+        char = self._peek()
+        self._pos += 1
+        return char
+
+    def _expect(self, char):
+        if self._next() != char:
+            self._error(char)
+
+    def _error(self, char):
+        """Raises the error for a character which isn't the one expected."""
+        raise ValueError("Expected %r at character %d of the JSON text" %
+                         (char, self._offset + self._pos - 1))
+
+    def _value(self, decoder):
+        """Parses the JSON value at the current position, reading more text
+        until all of it has been read."""
+        self._peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self._text, self._pos)
+            except json.JSONDecodeError:
+                # The value is parsed again from its start once there is as
+                # much text again, so that a large value isn't parsed once
+                # per chunk.
+                if not self._read(len(self._text) - self._pos):
+                    raise
+                continue
+            # A number at the end of the text read so far may be cut short,
+            # so a value is only complete once what follows it has been read.
+            if self._eof or (end < len(self._text) and
+                             self._text[end] in _DELIMITERS):
+                self._pos = end
+                return value
+            self._read()
+
+
+def iter_results(response, key, skip_keys=None, rate_limiter=None):
+    """Yields the items of an array in the body of a streamed response from
+    a Maps web service API, raising the API's error once they run out, if
+    there was one. The response is closed once the items are exhausted.
+
+    :param response: The response, made with the "stream" requests kwarg.
+    :type response: requests.Response
+
+    :param key: The key of the array in the body, e.g. "rows".
+    :type key: string
+
+    :param skip_keys: Keys whose values are dropped from the items.
+    :type skip_keys: collection of strings
+
+    :param rate_limiter: The rate limiter of the API, told if the status
+        is OVER_QUERY_LIMIT. The response was recorded as a success when it
+        arrived, before its status had been read.
+    :type rate_limiter: googlemaps.ratelimit.RateLimiter
+
+    :raises ApiError: when the API returns an error.
+    """
+    stream = ArrayStream(response.iter_content(_CHUNK_SIZE), key, skip_keys)
+    try:
+        yield from stream
+    finally:
+        response.close()
+
+    status = stream.fields.get("status")
+    if status == "OVER_QUERY_LIMIT" and rate_limiter is not None:
+        rate_limiter.record_over_query_limit()
+    if status not in ("OK", "ZERO_RESULTS"):
+        raise exceptions.ApiError(status, stream.fields.get("error_message"))
+
+
+def extract_response(response):
+    """Returns a streamed response from a Maps web service API, for
+    iter_results(), once its HTTP status shows it has a body to parse.
+
+    :raises HTTPError: if the HTTP status isn't 200.
+    """
+    if response.status_code != 200:
+        response.close()
+        raise exceptions.HTTPError(response.status_code)
+    return response
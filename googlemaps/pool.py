@@ -0,0 +1,327 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""
+Connection pooling for the requests session a client sends requests with.
+
+A requests.Session keeps up to 10 connections to each host by default. When
+more threads than that call the same host, the connections over the limit
+are closed after each request, and every request over the limit pays for a
+new TCP connection and TLS handshake. The adapters here keep a pool sized
+to the client's concurrency for each host, and count how often connections
+are reused.
+"""
+
+import concurrent.futures
+import socket
+
+import requests.adapters
+import urllib3.connectionpool
+import urllib3.exceptions
+from urllib3.connection import HTTPConnection
+
+# The hosts of the APIs the client calls.
+GOOGLE_HOSTS = (
+    "https://maps.googleapis.com",
+    "https://roads.googleapis.com",
+    "https://addressvalidation.googleapis.com",
+    "https://weather.googleapis.com",
+    "https://solar.googleapis.com",
+    "https://airquality.googleapis.com",
+    "https://www.googleapis.com",
+)
+
+
+class _CountingPool:
+    """Counts the requests sent over a connection which was already open,
+    whether by an earlier request or by open_connections()."""
+
+    num_reused = 0
+
+    def _make_request(self, conn, *args, **kwargs):
+        if conn.sock is not None:
+            self.num_reused += 1
+        return super()._make_request(conn, *args, **kwargs)
+
+
+class _CountingHTTPConnectionPool(
+        _CountingPool, urllib3.connectionpool.HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSConnectionPool(
+        _CountingPool, urllib3.connectionpool.HTTPSConnectionPool):
+    pass
+
+
+_POOL_CLASSES = {"http": _CountingHTTPConnectionPool,
+                 "https": _CountingHTTPSConnectionPool}
+
+
+class PoolAdapter(requests.adapters.HTTPAdapter):
+    """An HTTPAdapter which can enable TCP keep-alive on its connections,
+    and reports the use of its connection pools.
+    """
+
+    __attrs__ = requests.adapters.HTTPAdapter.__attrs__ + ["keepalive"]
+
+    def __init__(self, pool_connections=len(GOOGLE_HOSTS), pool_maxsize=10,
+                 pool_block=False, keepalive=None):
+        """
+        :param pool_connections: The number of hosts to keep a pool for.
+        :type pool_connections: int
+
+        :param pool_maxsize: The most connections kept open to each host.
+        :type pool_maxsize: int
+
+        :param pool_block: If True, a request which finds all of a host's
+            connections in use waits for one to be returned, instead of
+            opening a connection which is closed once the request completes.
+        :type pool_block: bool
+
+        :param keepalive: If set, TCP keep-alive probes are sent on a
+            connection once it has been idle this many seconds, so that
+            connections parked in the pool aren't dropped by NATs and load
+            balancers.
+        :type keepalive: int
+        """
+        self.keepalive = keepalive
+        super().__init__(pool_connections=pool_connections,
+                         pool_maxsize=pool_maxsize, pool_block=pool_block)
+
+    def init_poolmanager(self, connections, maxsize, block=False,
+                         **pool_kwargs):
+        if self.keepalive is not None:
+            pool_kwargs["socket_options"] = _keepalive_options(self.keepalive)
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = _POOL_CLASSES
+
+    def resize(self, maxsize):
+        """Grows the adapter's connection pools to keep up to maxsize
+        connections to each host. The pools are grown in place, so that the
+        connections open in them, and their counts, are kept.
+
+        :param maxsize: The most connections kept open to each host.
+        :type maxsize: int
+        """
+        if maxsize <= self._pool_maxsize:
+            return
+        self._pool_maxsize = maxsize
+        for manager in [self.poolmanager] + list(self.proxy_manager.values()):
+            manager.connection_pool_kw["maxsize"] = maxsize
+            # The pools are keyed by their settings, maxsize included.
+            with manager.pools.lock:
+                container = manager.pools._container
+                for key in list(container):
+                    pool = container.pop(key)
+                    _grow(pool, maxsize)
+                    container[key._replace(key_maxsize=maxsize)] = pool
+
+    def stats(self):
+        """Returns the use of the pool for each host connected to, keyed by
+        host: the most connections kept ("maxsize"), the connections in use
+        and idle in the pool, and the number of connections opened and
+        requests sent over them, and how many of those requests reused a
+        connection already open ("reused"), including one opened by
+        open_connections().
+
+        :rtype: dict
+        """
+        stats = {}
+        pools = self.poolmanager.pools
+        with pools.lock:
+            pools = list(pools._container.values())
+        for pool in pools:
+            queue = pool.pool
+            if queue is None:  # Closed.
+                continue
+            with queue.mutex:
+                idle = sum(1 for conn in queue.queue if conn is not None)
+                free = len(queue.queue)
+            host = "%s://%s" % (pool.scheme, pool.host)
+            if pool.port not in (None, 80, 443):
+                host += ":%d" % pool.port
+            stats[host] = {
+                "maxsize": queue.maxsize,
+                "in_use": max(0, queue.maxsize - free),
+                "idle": idle,
+                "connections": pool.num_connections,
+                "requests": pool.num_requests,
+                "reused": getattr(pool, "num_reused", 0),
+            }
+        return stats
+
+
+def mount_adapters(session, pool_maxsize, pool_block=False, keepalive=None,
+                   pools=None):
+    """Mounts PoolAdapters on a session: one for each host in pools, and one
+    shared by all other hosts.
+
+    :param session: The session to mount the adapters on.
+    :type session: requests.Session
+
+    :param pool_maxsize: The most connections kept open to each host.
+    :type pool_maxsize: int
+
+    :param pool_block: Whether requests wait for a free connection.
+    :type pool_block: bool
+
+    :param keepalive: The idle seconds before TCP keep-alive probes are sent.
+    :type keepalive: int
+
+    :param pools: PoolAdapter arguments for particular hosts, which take
+        precedence over the others, keyed by base URL, e.g.
+        {"https://roads.googleapis.com": {"pool_maxsize": 50}}.
+    :type pools: dict
+    """
+    defaults = {"pool_maxsize": pool_maxsize, "pool_block": pool_block,
+                "keepalive": keepalive}
+    adapter = PoolAdapter(**defaults)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    for base_url, overrides in (pools or {}).items():
+        # requests picks the adapter with the longest matching prefix.
+        session.mount(base_url.rstrip("/") + "/",
+                      PoolAdapter(pool_connections=1,
+                                  **dict(defaults, **overrides)))
+
+
+def pool_stats(session):
+    """Returns the use of the connection pools of a session's PoolAdapters,
+    keyed by host, as described by PoolAdapter.stats().
+
+    :param session: The session.
+    :type session: requests.Session
+
+    :rtype: dict
+    """
+    stats = {}
+    adapters = {id(a): a for a in session.adapters.values()
+                if isinstance(a, PoolAdapter)}
+    for adapter in adapters.values():
+        stats.update(adapter.stats())
+    return stats
+
+
+def resize_pools(session, pool_maxsize, pools=None):
+    """Grows the connection pools of the PoolAdapters mounted on a session
+    by mount_adapters() to a new pool_maxsize, keeping the connections open
+    in them. The hosts given their own pool_maxsize in pools are left
+    alone.
+
+    :param session: The session the adapters are mounted on.
+    :type session: requests.Session
+
+    :param pool_maxsize: The most connections kept open to each host.
+    :type pool_maxsize: int
+
+    :param pools: The pools given to mount_adapters().
+    :type pools: dict
+    """
+    fixed = {base_url.rstrip("/") + "/"
+             for base_url, overrides in (pools or {}).items()
+             if "pool_maxsize" in overrides}
+    adapters = {id(a): a for prefix, a in session.adapters.items()
+                if isinstance(a, PoolAdapter) and prefix not in fixed}
+    for adapter in adapters.values():
+        adapter.resize(pool_maxsize)
+
+
+def reset_pools(session):
+    """Replaces the connection pools of a session's adapters with empty
+    ones, in a process forked from the one that opened the connections.
+    The inherited connections are left for the parent to use, as requests
+    sent over them by both processes would interleave on the same socket.
+
+    :param session: The session.
+    :type session: requests.Session
+    """
+    adapters = {id(a): a for a in session.adapters.values()
+                if isinstance(a, requests.adapters.HTTPAdapter)}
+    for adapter in adapters.values():
+        adapter.proxy_manager = {}
+        adapter.init_poolmanager(adapter._pool_connections,
+                                 adapter._pool_maxsize,
+                                 block=adapter._pool_block)
+
+
+def open_connections(pool, connections, timeout=None):
+    """Opens connections in a urllib3 connection pool, and parks them there
+    for later requests, so that those don't wait for DNS, TCP and TLS.
+    Connections already open in the pool count towards the number opened.
+
+    :param pool: The pool of a host.
+    :type pool: urllib3.HTTPConnectionPool
+
+    :param connections: The number of connections wanted, capped at the size
+        of the pool.
+    :type connections: int
+
+    :param timeout: The connect timeout, in seconds.
+    :type timeout: float
+
+    :returns: The number of connections open in the pool.
+    :rtype: int
+    """
+    if pool.pool is None:  # Closed.
+        return 0
+
+    conns = []
+    try:
+        for _ in range(min(connections, pool.pool.maxsize)):
+            try:
+                conns.append(pool._get_conn(timeout=0))
+            except urllib3.exceptions.EmptyPoolError:
+                break  # The rest are in use.
+        closed = [conn for conn in conns if conn.sock is None]
+        if timeout is not None:
+            for conn in closed:
+                conn.timeout = timeout
+        if closed:
+            executor = concurrent.futures.ThreadPoolExecutor(len(closed))
+            with executor:
+                list(executor.map(lambda conn: conn.connect(), closed))
+    finally:
+        for conn in conns:
+            pool._put_conn(conn)
+    return len(conns)
+
+
+def _grow(pool, maxsize):
+    """Grows the queue of a urllib3 connection pool to maxsize."""
+    queue = pool.pool
+    if queue is None:  # Closed.
+        return
+    with queue.mutex:
+        # The empty slots go to the bottom of the LIFO queue, so that the
+        # connections already open are still taken first.
+        queue.queue[:0] = [None] * (maxsize - queue.maxsize)
+        queue.maxsize = maxsize
+        queue.not_empty.notify_all()
+
+
+def _keepalive_options(idle):
+    """Returns the socket options which enable TCP keep-alive, with probes
+    sent after idle seconds where the platform supports it."""
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle))
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, idle))
+    elif hasattr(socket, "TCP_KEEPALIVE"):  # macOS
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle))
+    return options
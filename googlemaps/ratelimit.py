@@ -0,0 +1,603 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""
+Rate limiters, which pace the requests made by a client to stay within the
+query quota of the API.
+
+A rate limiter is a RateLimiter whose ``reserve()`` method admits one
+request and returns the number of seconds the caller must pause before
+sending it. The client calls it before every attempt, retries included.
+Limiters may also implement ``wait_time()``, to report how long the next
+request would have to pause without admitting it, and are told of the
+outcome of each request through ``record_success()`` and
+``record_over_query_limit()``.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows.
+    fcntl = None
+
+
+class RateLimiter:
+    """Base class for rate limiters."""
+
+    def reserve(self):
+        """Admits one request, returning the number of seconds to pause
+        before sending it.
+
+        :rtype: float
+        """
+        raise NotImplementedError
+
+    def wait_time(self):
+        """Returns the number of seconds the next request would have to
+        pause, without admitting it.
+
+        :rtype: float
+        """
+        raise NotImplementedError
+
+    def effective_rate(self):
+        """Returns the number of requests currently permitted per second.
+
+        :rtype: float
+        """
+        raise NotImplementedError
+
+    def record_success(self):
+        """Records that a request was accepted by the API."""
+        pass
+
+    def record_over_query_limit(self):
+        """Records that a request was rejected by the API for exceeding its
+        query rate limit."""
+        pass
+
+    def record_retry_after(self, seconds):
+        """Records that the API asked for no requests to be sent for the
+        given number of seconds.
+
+        :param seconds: The time the API asked the client to wait.
+        :type seconds: float
+        """
+        pass
+
+    def after_fork(self):
+        """Discards the state inherited from the parent process, such as
+        locks which its other threads may have held. Called in the child
+        after os.fork()."""
+        pass
+
+    def acquire(self):
+        """Admits one request, pausing the calling thread until it may be
+        sent."""
+        delay_seconds = self.reserve()
+        if delay_seconds > 0:
+            time.sleep(delay_seconds)
+
+
+class TokenBucket(RateLimiter):
+    """A thread-safe token bucket.
+
+    Tokens are added at ``rate`` per second, up to ``burst`` tokens, and each
+    request takes one. When the bucket is empty, requests are still admitted,
+    but each is given a pause that puts it in line behind the requests
+    already waiting. For example, a quota of 6000 queries per minute is
+    ``TokenBucket(100, burst=6000)``.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        """
+        :param rate: The number of requests permitted per second. May be
+            fractional, e.g. 0.5 for one request every two seconds.
+        :type rate: float
+
+        :param burst: The number of requests that may be sent at once after a
+            quiet period. Defaults to one second's worth of requests, and at
+            least 1.
+        :type burst: float
+
+        :param clock: A monotonic clock returning seconds.
+        :type clock: function
+
+        :raises ValueError: if rate or burst are not positive.
+        """
+        if not rate or rate <= 0:
+            raise ValueError("rate must be a positive number.")
+
+        if burst is None:
+            burst = max(rate, 1)
+        if burst <= 0:
+            raise ValueError("burst must be a positive number.")
+
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._updated = clock()
+
+    def _tokens_at(self, t):
+        return min(self.burst, self._tokens + (t - self._updated) * self.rate)
+
+    def _ready_time(self, now):
+        """Returns the earliest time, no earlier than now, at which the
+        bucket holds a token. The bucket's lock must be held."""
+        # Once requests are queued, the bucket's state is as of the time the
+        # last of them is sent, which may be later than now.
+        t = max(now, self._updated)
+        tokens = self._tokens_at(t)
+        if tokens >= 1:
+            return t
+        return t + (1 - tokens) / self.rate
+
+    def _take(self, t):
+        """Takes a token at time t, as returned by _ready_time. The bucket's
+        lock must be held."""
+        self._tokens = self._tokens_at(t) - 1
+        self._updated = t
+
+    def reserve(self):
+        with self._lock:
+            now = self._clock()
+            t = self._ready_time(now)
+            self._take(t)
+            return t - now
+
+    def wait_time(self):
+        with self._lock:
+            now = self._clock()
+            return self._ready_time(now) - now
+
+    def effective_rate(self):
+        return self.rate
+
+    def record_retry_after(self, seconds):
+        with self._lock:
+            t = self._clock() + seconds
+            if t > self._updated:
+                # Hold every request until then, without letting the tokens
+                # earned meanwhile through as a burst.
+                self._tokens = min(self._tokens_at(t), 1)
+                self._updated = t
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """A token bucket which finds the rate the API actually permits, by
+    additive increase and multiplicative decrease (AIMD).
+
+    Each request rejected for exceeding the query rate limit cuts the rate by
+    a factor, and each successful request raises it a little, back up to the
+    configured rate. The burst size follows the rate.
+    """
+
+    def __init__(self, rate, min_rate=None, increase=None, decrease=0.5,
+                 cooldown=1.0, clock=time.monotonic):
+        """
+        :param rate: The highest number of requests permitted per second,
+            which is also the starting rate.
+        :type rate: float
+
+        :param min_rate: The lowest rate that decreases may reach. Defaults to
+            a hundredth of rate.
+        :type min_rate: float
+
+        :param increase: The number of requests per second the rate is raised
+            by, per second of successful requests. Defaults to a thirtieth of
+            rate, so that a halved rate recovers in about 15 seconds.
+        :type increase: float
+
+        :param decrease: The factor the rate is multiplied by when a request
+            is rejected.
+        :type decrease: float
+
+        :param cooldown: The number of seconds after a decrease during which
+            further rejections, likely of requests already in flight, don't
+            decrease the rate again.
+        :type cooldown: float
+
+        :param clock: A monotonic clock returning seconds.
+        :type clock: function
+        """
+        super().__init__(rate, clock=clock)
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 100.0
+        self.increase = increase if increase is not None else rate / 30.0
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._last_decrease = None
+
+    def _set_rate(self, now, rate):
+        # Settle the tokens earned at the old rate before changing it.
+        if now > self._updated:
+            self._tokens = self._tokens_at(now)
+            self._updated = now
+        self.rate = rate
+        self.burst = max(rate, 1)
+        self._tokens = min(self._tokens, self.burst)
+
+    def record_success(self):
+        with self._lock:
+            # At a rate of r, there are r successes per second, each raising
+            # the rate by increase / r.
+            rate = min(self.max_rate, self.rate + self.increase / self.rate)
+            self._set_rate(self._clock(), rate)
+
+    def record_over_query_limit(self):
+        with self._lock:
+            now = self._clock()
+            if (self._last_decrease is not None and
+                    now - self._last_decrease < self.cooldown):
+                return
+            self._last_decrease = now
+            self._set_rate(now, max(self.min_rate, self.rate * self.decrease))
+
+
+class CombinedRateLimiter(RateLimiter):
+    """Admits a request only when every one of several token buckets permits
+    it, e.g. a per-second ceiling on bursts within a per-minute budget.
+
+    A request takes a token from each bucket at the same moment, so the
+    buckets must not also be used on their own.
+    """
+
+    def __init__(self, *buckets, clock=time.monotonic):
+        """
+        :param buckets: The buckets to enforce.
+        :type buckets: TokenBucket
+
+        :param clock: A monotonic clock returning seconds.
+        :type clock: function
+        """
+        if not buckets:
+            raise ValueError("At least one bucket is required.")
+
+        self.buckets = buckets
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = self._clock()
+            t = max(bucket._ready_time(now) for bucket in self.buckets)
+            for bucket in self.buckets:
+                bucket._take(t)
+            return t - now
+
+    def wait_time(self):
+        with self._lock:
+            now = self._clock()
+            return max(bucket._ready_time(now) for bucket in self.buckets) - now
+
+    def effective_rate(self):
+        return min(bucket.effective_rate() for bucket in self.buckets)
+
+    def record_success(self):
+        with self._lock:
+            for bucket in self.buckets:
+                bucket.record_success()
+
+    def record_over_query_limit(self):
+        with self._lock:
+            for bucket in self.buckets:
+                bucket.record_over_query_limit()
+
+    def record_retry_after(self, seconds):
+        with self._lock:
+            for bucket in self.buckets:
+                bucket.record_retry_after(seconds)
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+        for bucket in self.buckets:
+            bucket.after_fork()
+
+
+def quota_rate_limiter(queries_per_second=None, queries_per_minute=None,
+                       clock=time.monotonic, adaptive=False):
+    """Returns a rate limiter enforcing a per-second quota, a per-minute
+    quota, or both.
+
+    The per-second quota allows up to a second's worth of queries at once,
+    and the per-minute quota up to a minute's worth, so a client that has
+    been idle may use its whole per-minute budget at the per-second rate.
+    If adaptive, an AdaptiveTokenBucket starting at the lower of the two
+    rates is also enforced.
+
+    :param queries_per_second: Number of queries per second permitted.
+    :type queries_per_second: int or float
+
+    :param queries_per_minute: Number of queries per minute permitted.
+    :type queries_per_minute: int or float
+
+    :param clock: A monotonic clock returning seconds.
+    :type clock: function
+
+    :param adaptive: Whether to adapt the rate to the API's responses.
+    :type adaptive: bool
+
+    :raises ValueError: if neither quota is set.
+    :rtype: RateLimiter
+    """
+    buckets = []
+    if queries_per_second:
+        buckets.append(TokenBucket(queries_per_second, clock=clock))
+    if queries_per_minute:
+        buckets.append(TokenBucket(queries_per_minute / 60.0,
+                                   burst=queries_per_minute, clock=clock))
+
+    if not buckets:
+        raise ValueError("Must provide queries_per_second or "
+                         "queries_per_minute.")
+    if adaptive:
+        rate = min(bucket.rate for bucket in buckets)
+        buckets.append(AdaptiveTokenBucket(rate, clock=clock))
+    if len(buckets) == 1:
+        return buckets[0]
+    return CombinedRateLimiter(*buckets, clock=clock)
+
+
+# The layout of a SharedRateLimiter's state file: a header, followed by the
+# tokens and update time of each bucket.
+_SHARED_MAGIC = b"GMAPSRL1"
+_SHARED_HEADER = struct.Struct("=8sdI")
+_SHARED_BUCKET = struct.Struct("=dd")
+
+# How far the host's boot time, as computed from the clock, may drift before
+# a state file is taken to be left over from before a reboot.
+_SHARED_BOOT_TOLERANCE = 60
+
+
+class SharedRateLimiter(RateLimiter):
+    """Enforces per-second and per-minute quotas across all of the processes
+    on a host which use the same state file, such as the workers of a gunicorn
+    or celery deployment that share one API key.
+
+    The state of the buckets lives in a small memory-mapped file, which is
+    only read and updated while holding an exclusive lock on it, so each
+    admission costs a lock and unlock system call. Requires fcntl, so it is
+    not available on Windows.
+    """
+
+    def __init__(self, path, queries_per_second=60, queries_per_minute=6000,
+                 clock=time.monotonic):
+        """
+        :param path: The state file, which is created if it does not exist.
+            Every process using the same file shares one budget.
+        :type path: string
+
+        :param queries_per_second: Number of queries per second permitted.
+        :type queries_per_second: int or float
+
+        :param queries_per_minute: Number of queries per minute permitted.
+        :type queries_per_minute: int or float
+
+        :param clock: A clock returning seconds, which must be shared by all
+            processes on the host.
+        :type clock: function
+
+        :raises NotImplementedError: if fcntl is not available.
+        """
+        if fcntl is None:
+            raise NotImplementedError("SharedRateLimiter requires fcntl.")
+
+        self.path = path
+        self._clock = clock
+        self._limiter = quota_rate_limiter(queries_per_second,
+                                           queries_per_minute, clock)
+        if isinstance(self._limiter, CombinedRateLimiter):
+            self._buckets = self._limiter.buckets
+        else:
+            self._buckets = (self._limiter,)
+        self._size = (_SHARED_HEADER.size +
+                      _SHARED_BUCKET.size * len(self._buckets))
+        self._lock = threading.Lock()
+        self._pid = None
+        self._open()
+
+    def _open(self):
+        # File locks are shared by forked processes which inherit the file
+        # descriptor, so each process opens the file for itself.
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._pid = os.getpid()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < self._size:
+                os.ftruncate(self._fd, self._size)
+            self._mmap = mmap.mmap(self._fd, self._size)
+            if not self._is_current():
+                self._store()
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _boot_time(self):
+        return time.time() - self._clock()
+
+    def _is_current(self):
+        magic, boot_time, count = _SHARED_HEADER.unpack_from(self._mmap)
+        return (magic == _SHARED_MAGIC and count == len(self._buckets) and
+                abs(boot_time - self._boot_time()) < _SHARED_BOOT_TOLERANCE)
+
+    def _load(self):
+        offset = _SHARED_HEADER.size
+        for bucket in self._buckets:
+            bucket._tokens, bucket._updated = _SHARED_BUCKET.unpack_from(
+                self._mmap, offset)
+            offset += _SHARED_BUCKET.size
+
+    def _store(self):
+        _SHARED_HEADER.pack_into(self._mmap, 0, _SHARED_MAGIC,
+                                 self._boot_time(), len(self._buckets))
+        offset = _SHARED_HEADER.size
+        for bucket in self._buckets:
+            _SHARED_BUCKET.pack_into(self._mmap, offset, bucket._tokens,
+                                     bucket._updated)
+            offset += _SHARED_BUCKET.size
+
+    def _locked(self, action, store):
+        """Runs action over the shared state, under the file lock, storing
+        the state afterwards if store is set."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._load()
+                result = action()
+                if store:
+                    self._store()
+                return result
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def reserve(self):
+        return self._locked(self._limiter.reserve, store=True)
+
+    def wait_time(self):
+        return self._locked(self._limiter.wait_time, store=False)
+
+    def record_retry_after(self, seconds):
+        self._locked(lambda: self._limiter.record_retry_after(seconds),
+                     store=True)
+
+    def effective_rate(self):
+        return self._limiter.effective_rate()
+
+    def after_fork(self):
+        # The file is opened again by the next request, as the process id
+        # has changed.
+        self._lock = threading.Lock()
+        self._limiter.after_fork()
+
+
+def api_for_path(base_url, path):
+    """Returns the (base_url, path prefix) key of the API that a request is
+    made to. Each Maps web service API under /maps/api/ has its own quota,
+    e.g. ("https://maps.googleapis.com", "/maps/api/geocode"), while other
+    hosts each serve a single API, e.g. ("https://roads.googleapis.com", "").
+
+    :param base_url: The base URL of the request.
+    :type base_url: string
+
+    :param path: The URL path of the request.
+    :type path: string
+
+    :rtype: tuple
+    """
+    if path.startswith("/maps/api/"):
+        return base_url, "/".join(path.split("/", 4)[:4])
+    return base_url, ""
+
+
+class RateLimiterRegistry:
+    """Holds a separate rate limiter for each API a client calls, so that
+    one API's quota doesn't hold back requests to the others.
+
+    Requests are matched against the overrides first, by base URL and the
+    longest matching path prefix. Otherwise each API, as identified by
+    api_for_path, gets its own limiter from the factory when first used.
+    """
+
+    def __init__(self, factory, overrides=None):
+        """
+        :param factory: Creates the rate limiter for an API. It is called
+            with the API's (base_url, path prefix) key.
+        :type factory: function
+
+        :param overrides: Rate limiters for particular APIs, keyed by
+            (base_url, path prefix), or by base_url alone to cover every path
+            on that host.
+        :type overrides: dict
+        """
+        self._factory = factory
+        self._overrides = []
+        for key, limiter in (overrides or {}).items():
+            if isinstance(key, str):
+                key = (key, "")
+            self._overrides.append((key[0], key[1], limiter))
+        # Longest prefixes first, so that the most specific override wins.
+        self._overrides.sort(key=lambda o: len(o[1]), reverse=True)
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, base_url, path):
+        """Returns the rate limiter for a request.
+
+        :param base_url: The base URL of the request.
+        :type base_url: string
+
+        :param path: The URL path of the request.
+        :type path: string
+
+        :rtype: RateLimiter
+        """
+        for override_url, prefix, limiter in self._overrides:
+            if override_url == base_url and path.startswith(prefix):
+                return limiter
+
+        key = api_for_path(base_url, path)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(key)
+                if limiter is None:
+                    limiter = self._limiters[key] = self._factory(key)
+        return limiter
+
+    def limiters(self):
+        """Returns the rate limiters created so far, and the overrides,
+        keyed by (base_url, path prefix).
+
+        :rtype: dict
+        """
+        with self._lock:
+            limiters = dict(self._limiters)
+        for override_url, prefix, limiter in self._overrides:
+            limiters[(override_url, prefix)] = limiter
+        return limiters
+
+    def effective_rates(self):
+        """Returns the number of requests currently permitted per second by
+        each rate limiter, keyed by (base_url, path prefix).
+
+        :rtype: dict
+        """
+        return {api: limiter.effective_rate()
+                for api, limiter in self.limiters().items()}
+
+    def after_fork(self):
+        """Gives the registry and its rate limiters fresh locks in a child
+        process, after os.fork(). Each process keeps its own copy of the
+        limiters' state, so the quota is enforced per process, unless the
+        limiters are SharedRateLimiters.
+        """
+        self._lock = threading.Lock()
+        limiters = {id(limiter): limiter
+                    for limiter in self.limiters().values()}
+        for limiter in limiters.values():
+            limiter.after_fork()
@@ -0,0 +1,319 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""
+Retry policies, which decide which failed requests a client retries, and how
+long it pauses before each retry.
+"""
+
+import collections
+from datetime import datetime
+from datetime import timezone
+import email.utils
+import random
+import threading
+import time
+
+_RETRIABLE_STATUSES = {429, 500, 503, 504}
+
+# The statuses on which a Retry-After header is honoured.
+_RETRY_AFTER_STATUSES = {429, 503}
+
+# Jitter strategies, see
+# https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+FULL_JITTER = "full"
+EQUAL_JITTER = "equal"
+DECORRELATED_JITTER = "decorrelated"
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter.
+
+    The n-th retry is based on a delay of base_delay * multiplier ^ (n - 1)
+    seconds, capped at max_delay. By default that delay is jittered by 50%
+    either way, so the first retry pauses between 0.25 and 0.75 seconds.
+    When a 429 or 503 response carries a Retry-After header, the retry
+    pauses for exactly the time the server asked for instead.
+    """
+
+    def __init__(self, base_delay=0.5, multiplier=1.5, max_delay=None,
+                 jitter=None, max_attempts=None,
+                 retriable_statuses=_RETRIABLE_STATUSES,
+                 retry_after_statuses=_RETRY_AFTER_STATUSES):
+        """
+        :param base_delay: The delay before the first retry, in seconds.
+        :type base_delay: float
+
+        :param multiplier: The factor each successive delay grows by.
+        :type multiplier: float
+
+        :param max_delay: The longest delay, in seconds. Unlimited by default.
+        :type max_delay: float
+
+        :param jitter: How the delay is randomized. One of FULL_JITTER
+            (between zero and the delay), EQUAL_JITTER (between half the
+            delay and the delay), DECORRELATED_JITTER (between base_delay and
+            three times the previous pause, ignoring multiplier), or None for
+            50% either side of the delay.
+        :type jitter: string
+
+        :param max_attempts: The most attempts made at a request, including
+            the first. Unlimited by default, in which case requests are
+            retried until the client's retry_timeout.
+        :type max_attempts: int
+
+        :param retriable_statuses: The HTTP statuses on which requests are
+            retried. Either a set of statuses, or a dict mapping each status
+            to the most attempts made at a request which gets that status.
+        :type retriable_statuses: set or dict
+
+        :param retry_after_statuses: The HTTP statuses on which a Retry-After
+            header is honoured.
+        :type retry_after_statuses: set
+
+        :raises ValueError: if jitter is not recognized.
+        """
+        if jitter not in (None, FULL_JITTER, EQUAL_JITTER,
+                          DECORRELATED_JITTER):
+            raise ValueError("Unknown jitter: %s" % jitter)
+
+        self.base_delay = base_delay
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.max_attempts = max_attempts
+        if not isinstance(retriable_statuses, dict):
+            retriable_statuses = dict.fromkeys(retriable_statuses)
+        self.retriable_statuses = retriable_statuses
+        self.retry_after_statuses = retry_after_statuses
+
+    def allows_retry(self, attempts):
+        """Returns whether a request may be attempted again.
+
+        :param attempts: The number of attempts made so far.
+        :type attempts: int
+
+        :rtype: bool
+        """
+        return self.max_attempts is None or attempts < self.max_attempts
+
+    def retries_status(self, status_code, attempts):
+        """Returns whether a request which got the given HTTP status should
+        be attempted again.
+
+        :param status_code: The HTTP status of the latest attempt.
+        :type status_code: int
+
+        :param attempts: The number of attempts made so far.
+        :type attempts: int
+
+        :rtype: bool
+        """
+        if status_code not in self.retriable_statuses:
+            return False
+
+        max_attempts = self.retriable_statuses[status_code]
+        if max_attempts is not None and attempts >= max_attempts:
+            return False
+        return self.allows_retry(attempts)
+
+    def delay(self, retry_counter, previous_delay=None):
+        """Returns the number of seconds to pause before a retry.
+
+        :param retry_counter: The number of this retry, starting at 1.
+        :type retry_counter: int
+
+        :param previous_delay: The pause before the previous retry, if any.
+        :type previous_delay: float
+
+        :rtype: float
+        """
+        if self.jitter == DECORRELATED_JITTER:
+            upper = (previous_delay or self.base_delay) * 3
+            delay_seconds = random.uniform(self.base_delay, upper)
+            return self._cap(delay_seconds)
+
+        delay_seconds = self._cap(
+            self.base_delay * self.multiplier ** (retry_counter - 1))
+
+        if self.jitter == FULL_JITTER:
+            return random.uniform(0, delay_seconds)
+        if self.jitter == EQUAL_JITTER:
+            return delay_seconds / 2 + random.uniform(0, delay_seconds / 2)
+        return delay_seconds * (random.random() + 0.5)
+
+    def _cap(self, delay_seconds):
+        if self.max_delay is None:
+            return delay_seconds
+        return min(delay_seconds, self.max_delay)
+
+    def retry_after(self, response):
+        """Returns the number of seconds the server asked the client to wait
+        before retrying, or None if it did not.
+
+        :param response: The response to the latest attempt.
+        :type response: requests.Response
+
+        :rtype: float
+        """
+        if response.status_code not in self.retry_after_statuses:
+            return None
+        return parse_retry_after(response.headers.get("Retry-After"))
+
+
+class RetryBudget:
+    """Caps retries at a fraction of first attempts over a sliding window,
+    across every request sharing the budget.
+
+    When an API degrades, each failing request retrying on its own multiplies
+    the load on it. With a budget, only ratio * first attempts, plus a small
+    reserve of min_retries so that quiet clients can still retry, are
+    retried within any window; the client raises RetryBudgetExceeded for
+    the rest rather than retry them.
+
+    Budgets are thread-safe, and may be shared between clients.
+    """
+
+    # The number of buckets the window is split into.
+    _SLOTS = 10
+
+    def __init__(self, ratio=0.1, window=10, min_retries=10,
+                 clock=time.monotonic):
+        """
+        :param ratio: The most retries per first attempt.
+        :type ratio: float
+
+        :param window: The length of the sliding window, in seconds.
+        :type window: float
+
+        :param min_retries: The retries allowed per window regardless of
+            the number of first attempts.
+        :type min_retries: int
+
+        :param clock: Returns the current time in seconds. Monotonic by
+            default.
+        :type clock: function
+
+        :raises ValueError: if ratio or min_retries is negative, or window
+            is not positive.
+        """
+        if ratio < 0 or min_retries < 0:
+            raise ValueError("ratio and min_retries must not be negative.")
+        if window <= 0:
+            raise ValueError("window must be positive.")
+
+        self.ratio = ratio
+        self.window = window
+        self.min_retries = min_retries
+        self._clock = clock
+        self._slot_width = window / float(self._SLOTS)
+        self._lock = threading.Lock()
+        # [slot, first attempts, retries] for each slot with any requests.
+        self._slots = collections.deque()
+        self._requests = 0
+        self._retries = 0
+        self._rejected = 0
+
+    def _current_slot(self):
+        """Drops slots which have left the window, and returns the current
+        slot. Must be called with the lock held."""
+        slot = int(self._clock() // self._slot_width)
+        while self._slots and self._slots[0][0] <= slot - self._SLOTS:
+            self._slots.popleft()
+        if not self._slots or self._slots[-1][0] != slot:
+            self._slots.append([slot, 0, 0])
+        return self._slots[-1]
+
+    def _available(self):
+        requests = sum(s[1] for s in self._slots)
+        retries = sum(s[2] for s in self._slots)
+        return self.min_retries + self.ratio * requests - retries
+
+    def record_request(self):
+        """Records the first attempt at a request."""
+        with self._lock:
+            self._current_slot()[1] += 1
+            self._requests += 1
+
+    def try_retry(self):
+        """Withdraws a retry from the budget, if there is one left.
+
+        :rtype: bool
+        """
+        with self._lock:
+            slot = self._current_slot()
+            if self._available() < 1:
+                self._rejected += 1
+                return False
+            slot[2] += 1
+            self._retries += 1
+            return True
+
+    def stats(self):
+        """Returns counters for the budget: the total first attempts,
+        retries and rejected retries since it was created, and the retries
+        currently available.
+
+        :rtype: dict
+        """
+        with self._lock:
+            self._current_slot()
+            return {
+                "requests": self._requests,
+                "retries": self._retries,
+                "rejected": self._rejected,
+                "available": max(0, int(self._available())),
+            }
+
+    def after_fork(self):
+        """Gives the budget a fresh lock in a child process, after
+        os.fork()."""
+        self._lock = threading.Lock()
+
+
+def parse_retry_after(value, now=None):
+    """Parses the value of a Retry-After header, which is either a number of
+    seconds or an HTTP date.
+
+    :param value: The header value.
+    :type value: string
+
+    :param now: The current time, for an HTTP date. Defaults to now.
+    :type now: datetime.datetime
+
+    :returns: The number of seconds to wait, or None if the value is
+        missing or malformed.
+    :rtype: float
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (date - now).total_seconds())
@@ -120,7 +120,7 @@ def _roads_extract(resp):
     """Extracts a result from a Roads API HTTP response."""
 
     try:
-        j = resp.json()
+        j = googlemaps.client._decode_body(resp)
     except:
         if resp.status_code != 200:
             raise googlemaps.exceptions.HTTPError(resp.status_code)
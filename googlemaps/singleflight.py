@@ -0,0 +1,100 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""
+Coalescing of identical requests, so that callers asking for the same thing
+at the same time share one request instead of each spending quota on it.
+
+The first caller to make a request leads its flight, and sends it. Callers
+making the same request while it is in flight follow: they wait for the
+leader's response, or the exception it raised, instead of sending their own.
+"""
+
+import concurrent.futures
+import threading
+
+
+class SingleFlight:
+    """Tracks the requests in flight, keyed by their canonical URL and body.
+    Thread-safe, and shared by threads and event loops alike, as flights are
+    concurrent.futures.Future objects.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._sent = 0
+        self._coalesced = 0
+
+    def begin(self, key):
+        """Joins the flight of a request, starting it if there is none.
+
+        :param key: The canonical URL and body of the request.
+        :type key: string
+
+        :returns: The flight, and whether the caller leads it. The leader
+            must send the request and then call end(). A follower waits for
+            the flight's result: the leader's response, or None if the leader
+            abandoned the request, in which case the follower should begin
+            again.
+        :rtype: tuple of concurrent.futures.Future and bool
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._coalesced += 1
+                return flight, False
+            flight = self._flights[key] = concurrent.futures.Future()
+            self._sent += 1
+            return flight, True
+
+    def end(self, key, response=None, exception=None):
+        """Lands the flight of a request, passing its outcome to the
+        followers. If neither response nor exception is given, the request
+        was abandoned, e.g. because the leader was cancelled.
+
+        :param key: The key given to begin().
+        :type key: string
+
+        :param response: The response to the request.
+
+        :param exception: The exception the request raised.
+        :type exception: Exception
+        """
+        with self._lock:
+            flight = self._flights.pop(key)
+        if exception is not None:
+            flight.set_exception(exception)
+        else:
+            flight.set_result(response)
+
+    def stats(self):
+        """Returns the number of requests in flight, the number sent, and
+        the number of requests which were coalesced into another instead of
+        being sent.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {"in_flight": len(self._flights), "sent": self._sent,
+                    "coalesced": self._coalesced}
+
+    def after_fork(self):
+        """Forgets the flights in progress in a child process, after
+        os.fork(), as their leaders are threads of the parent."""
+        self._lock = threading.Lock()
+        self._flights = {}
@@ -0,0 +1,408 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""
+Transports, which send the HTTP requests of a Client.
+
+A transport is a Transport whose ``request()`` method takes the keyword args
+the client would give requests (headers, timeout, verify, proxies, json and
+stream), and returns a response with the parts of the requests.Response
+interface used by the response extractors: ``status_code``, ``headers``,
+``content``, ``text``, ``json()``, ``iter_content()`` and ``close()``.
+
+RequestsTransport, over the client's requests session, is the default.
+Urllib3Transport skips the requests layer for lower overhead per call, and
+HTTP2Transport, which requires httpx, multiplexes concurrent requests over
+one HTTP/2 connection per host. Unlike requests, these two only take the
+keyword args above, and don't follow redirects, which the APIs don't send:
+a redirect is returned as it is, and so raised as an HTTPError.
+"""
+
+import json
+import threading
+from urllib.parse import urlparse
+
+import requests
+import requests.adapters
+import urllib3
+
+try:
+    import httpx
+except ImportError:  # httpx is only required for HTTP2Transport.
+    httpx = None
+
+import googlemaps.exceptions
+import googlemaps.pool
+
+# The keyword args of Transport.request().
+TRANSPORT_KWARGS = frozenset(["headers", "timeout", "verify", "proxies",
+                              "json", "stream"])
+
+
+class BufferedResponse:
+    """A response whose body has been read in full, exposing the parts of
+    the requests.Response interface used by the response extractors.
+    """
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        return (self.content[i:i + chunk_size]
+                for i in range(0, len(self.content), chunk_size))
+
+    def close(self):
+        pass
+
+
+class Transport:
+    """Base class for transports."""
+
+    def request(self, method, url, headers=None, timeout=None, verify=True,
+                proxies=None, json=None, stream=False):
+        """Sends an HTTP request.
+
+        :param method: "GET" or "POST".
+        :type method: string
+
+        :param url: The full URL of the request.
+        :type url: string
+
+        :param headers: The request headers.
+        :type headers: dict
+
+        :param timeout: The timeout in seconds, or a (connect, read) tuple.
+        :type timeout: float or tuple
+
+        :param verify: Whether to verify TLS certificates, or the path of a
+            CA bundle to verify them with.
+        :type verify: bool or string
+
+        :param proxies: Proxy URLs, keyed by URL scheme.
+        :type proxies: dict
+
+        :param json: The body of a POST request, sent as JSON.
+        :type json: dict
+
+        :param stream: Whether the body is read through iter_content().
+        :type stream: bool
+
+        :raises Timeout: if the request timed out.
+        """
+        raise NotImplementedError
+
+    def check_kwargs(self, kwargs):
+        """Checks that the transport takes the keyword args a client was
+        given for its requests.
+
+        :param kwargs: The requests_kwargs of the client.
+        :type kwargs: dict
+
+        :raises ValueError: if one of them isn't taken by request().
+        """
+        unsupported = sorted(set(kwargs) - TRANSPORT_KWARGS)
+        if unsupported:
+            raise ValueError("%s doesn't take the requests_kwargs %s. Use "
+                             "RequestsTransport for them." %
+                             (type(self).__name__, ", ".join(unsupported)))
+
+    def warmup(self, base_url, connections=1, timeout=None):
+        """Opens connections to a host, and parks them for later requests.
+
+        :param base_url: The base URL of the host.
+        :type base_url: string
+
+        :param connections: The number of connections wanted.
+        :type connections: int
+
+        :param timeout: The connect timeout, in seconds.
+        :type timeout: float
+
+        :returns: The number of connections open to the host.
+        :rtype: int
+        """
+        return 0
+
+    def close(self):
+        """Closes the transport's connections."""
+
+    def after_fork(self):
+        """Discards the connections and locks inherited from the parent
+        process, without closing the connections, which the parent may
+        still be using. Called in the child after os.fork()."""
+
+
+class RequestsTransport(Transport):
+    """Sends requests through a requests session."""
+
+    def __init__(self, session):
+        """
+        :param session: The session, which keeps the connection pools.
+        :type session: requests.Session
+        """
+        self.session = session
+
+    def request(self, method, url, **kwargs):
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.exceptions.Timeout:
+            raise googlemaps.exceptions.Timeout()
+
+    def check_kwargs(self, kwargs):
+        # Any keyword args are passed on to requests.
+        pass
+
+    def warmup(self, base_url, connections=1, timeout=None):
+        adapter = self.session.get_adapter(base_url)
+        if not isinstance(adapter, requests.adapters.HTTPAdapter):
+            return 0
+        # The pool is looked up as it is for requests, with the TLS settings
+        # of the session and environment.
+        settings = self.session.merge_environment_settings(
+            base_url, {}, None, None, None)
+        try:
+            pool = adapter.get_connection_with_tls_context(
+                requests.Request("GET", base_url).prepare(),
+                settings["verify"], settings["proxies"], settings["cert"])
+        except AttributeError:  # requests < 2.32.2
+            pool = adapter.get_connection(base_url, settings["proxies"])
+        return googlemaps.pool.open_connections(pool, connections, timeout)
+
+    def close(self):
+        self.session.close()
+
+    def after_fork(self):
+        googlemaps.pool.reset_pools(self.session)
+
+
+class Urllib3Transport(Transport):
+    """Sends requests with urllib3 directly, which costs less per request
+    than going through requests. Thread-safe.
+    """
+
+    def __init__(self, pool_maxsize=10, pool_block=False):
+        """
+        :param pool_maxsize: The most connections kept open to each host.
+        :type pool_maxsize: int
+
+        :param pool_block: Whether requests wait for a free connection.
+        :type pool_block: bool
+        """
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self._lock = threading.Lock()
+        self._managers = {}
+
+    def _manager(self, verify, proxy):
+        """Returns the pool manager for a TLS setting and a proxy URL, or
+        None for direct connections."""
+        with self._lock:
+            manager = self._managers.get((verify, proxy))
+            if manager is None:
+                kwargs = {"num_pools": len(googlemaps.pool.GOOGLE_HOSTS),
+                          "maxsize": self.pool_maxsize,
+                          "block": self.pool_block, "retries": False}
+                if verify is False:
+                    kwargs["cert_reqs"] = "CERT_NONE"
+                elif isinstance(verify, str):
+                    kwargs["ca_certs"] = verify
+                if proxy is None:
+                    manager = urllib3.PoolManager(**kwargs)
+                else:
+                    manager = urllib3.ProxyManager(proxy, **kwargs)
+                self._managers[verify, proxy] = manager
+            return manager
+
+    def request(self, method, url, headers=None, timeout=None, verify=True,
+                proxies=None, json=None, stream=False):
+        # Compressed responses are accepted, as they are by requests.
+        request_headers = requests.structures.CaseInsensitiveDict(
+            urllib3.util.make_headers(accept_encoding=True))
+        request_headers.update(headers or {})
+        headers = dict(request_headers.items())
+        body = None
+        if json is not None:
+            body = _json_body(json)
+            headers["Content-Type"] = "application/json"
+
+        proxy = (proxies or {}).get(urlparse(url).scheme)
+        manager = self._manager(verify, proxy)
+        try:
+            response = manager.urlopen(
+                method, url, body=body, headers=headers,
+                timeout=_urllib3_timeout(timeout),
+                preload_content=not stream, redirect=False)
+        except urllib3.exceptions.TimeoutError:
+            raise googlemaps.exceptions.Timeout()
+        return _Urllib3Response(response)
+
+    def warmup(self, base_url, connections=1, timeout=None):
+        pool = self._manager(True, None).connection_from_url(base_url)
+        return googlemaps.pool.open_connections(pool, connections, timeout)
+
+    def close(self):
+        with self._lock:
+            managers, self._managers = self._managers, {}
+        for manager in managers.values():
+            manager.clear()
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+        self._managers = {}
+
+
+class HTTP2Transport(Transport):
+    """Sends requests with httpx over HTTP/2, which multiplexes concurrent
+    requests to a host over one connection, instead of opening one for each.
+    Thread-safe.
+    """
+
+    def __init__(self, max_connections=None, keepalive_expiry=5.0,
+                 http1=True):
+        """
+        :param max_connections: The most connections kept open, or None for
+            no limit.
+        :type max_connections: int
+
+        :param keepalive_expiry: How long idle connections are kept open,
+            in seconds.
+        :type keepalive_expiry: float
+
+        :param http1: Whether HTTP/1.1 may be used, with hosts which don't
+            negotiate HTTP/2. If False, HTTP/2 is spoken to http:// URLs
+            without negotiation, e.g. to a local h2c server.
+        :type http1: bool
+
+        :raises ImportError: if httpx, or its HTTP/2 support, is not
+            installed.
+        """
+        if httpx is None:
+            raise ImportError("HTTP2Transport requires httpx. Install it "
+                              "with `pip install googlemaps[http2]`.")
+
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.http1 = http1
+        self._lock = threading.Lock()
+        self._clients = {}
+        # Fail early if the h2 package is missing.
+        self._client(True, None)
+
+    def _client(self, verify, proxy):
+        """Returns the httpx client for a TLS setting and proxy URL, as
+        httpx configures these per client."""
+        with self._lock:
+            client = self._clients.get((verify, proxy))
+            if client is None:
+                kwargs = {"http1": self.http1, "http2": True,
+                          "limits": self.limits, "verify": verify}
+                if proxy is not None:
+                    kwargs["proxy"] = proxy
+                client = self._clients[verify, proxy] = httpx.Client(**kwargs)
+            return client
+
+    def request(self, method, url, headers=None, timeout=None, verify=True,
+                proxies=None, json=None, stream=False):
+        proxy = (proxies or {}).get(urlparse(url).scheme)
+        client = self._client(verify, proxy)
+        try:
+            response = client.request(method, url, headers=headers,
+                                      json=json,
+                                      timeout=_httpx_timeout(timeout))
+        except httpx.TimeoutException:
+            raise googlemaps.exceptions.Timeout()
+        return BufferedResponse(response.status_code, response.headers,
+                                response.content)
+
+    def warmup(self, base_url, connections=1, timeout=None):
+        # Requests are multiplexed over a single connection, which is opened
+        # by a request, as httpx doesn't expose its pools.
+        try:
+            self._client(True, None).head(base_url + "/",
+                                          timeout=_httpx_timeout(timeout))
+        except httpx.TimeoutException:
+            raise googlemaps.exceptions.Timeout()
+        return 1
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+
+
+class _Urllib3Response:
+    """Exposes a urllib3 response through the requests.Response interface
+    used by the response extractors."""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status
+        self.headers = response.headers
+
+    @property
+    def content(self):
+        return self._response.data
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        return self._response.stream(chunk_size)
+
+    def close(self):
+        self._response.release_conn()
+
+
+def _json_body(value):
+    """Encodes the body of a POST request, for the request() methods whose
+    json argument hides the json module."""
+    return json.dumps(value).encode("utf-8")
+
+
+def _urllib3_timeout(timeout):
+    """Translates a requests timeout into a urllib3 one."""
+    if isinstance(timeout, tuple):
+        connect_timeout, read_timeout = timeout
+        return urllib3.Timeout(connect=connect_timeout, read=read_timeout)
+    return urllib3.Timeout(connect=timeout, read=timeout)
+
+
+def _httpx_timeout(timeout):
+    """Translates a requests timeout into an httpx one."""
+    if isinstance(timeout, tuple):
+        connect_timeout, read_timeout = timeout
+        return httpx.Timeout(None, connect=connect_timeout,
+                             read=read_timeout)
+    return httpx.Timeout(timeout)
@@ -25,6 +25,7 @@ def _install_test_dependencies(session):
     session.install("pytest")
     session.install("pytest-cov")
     session.install("responses")
+    session.install("aiohttp")
 
 
 def _install_doc_dependencies(session):
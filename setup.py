@@ -37,6 +37,9 @@ setup(
     platforms="Posix; MacOS X; Windows",
     setup_requires=requirements,
     install_requires=requirements,
+    extras_require={"async": ["aiohttp>=3.7,<4.0"],
+                    "http2": ["httpx[http2]>=0.26,<1.0"],
+                    "fast-json": ["orjson>=3.0"]},
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
@@ -15,11 +15,14 @@
 # the License.
 #
 
+import threading
 import unittest
 import codecs
 
 from urllib.parse import urlparse, parse_qsl
 
+import googlemaps.ratelimit
+
 
 class TestCase(unittest.TestCase):
     def assertURLEqual(self, first, second, msg=None):
@@ -38,3 +41,30 @@ class TestCase(unittest.TestCase):
         """Create a unicode string, compatible across all versions of Python."""
         # NOTE(cbro): Python 3-3.2 does not have the u'' syntax.
         return codecs.unicode_escape_decode(string)[0]
+
+
+class FakeClock:
+    """A clock for the clock arguments of the client's helpers, which only
+    moves when a test sets now."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingLimiter(googlemaps.ratelimit.RateLimiter):
+    """A rate limiter which never throttles, counting its reservations."""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            self.calls += 1
+        return 0
+
+    def wait_time(self):
+        return 0
@@ -0,0 +1,521 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+
+"""Tests for async_client module."""
+
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+import googlemaps
+import googlemaps.async_client as _async_client
+import googlemaps.cache
+from . import CountingLimiter
+from . import FakeClock
+from . import TestCase
+
+
+class FakeResponse:
+    """Mimics the part of aiohttp.ClientResponse used by AsyncClient."""
+
+    def __init__(self, status, body, headers=None, delay=0, error=None):
+        self.status = status
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.headers = headers or {}
+        self.delay = delay
+        self.error = error
+        self.cancelled = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def read(self):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.body
+
+
+class FakeSession:
+    """Mimics aiohttp.ClientSession, replaying canned responses in order and
+    recording each request."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        if len(self.responses) > 1:
+            return self.responses.pop(0)
+        return self.responses[0]
+
+
+@unittest.skipIf(_async_client.aiohttp is None, "aiohttp is not installed")
+class AsyncClientTest(TestCase):
+    def setUp(self):
+        self.key = "AIzaasdf"
+
+    def _client(self, *responses, **kwargs):
+        session = FakeSession(*responses)
+        client = googlemaps.AsyncClient(key=self.key, aiohttp_session=session,
+                                        **kwargs)
+        return client, session
+
+    def test_geocode(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":["foo"]}'))
+
+        result = asyncio.run(client.geocode("Sesame St."))
+
+        self.assertEqual(["foo"], result["results"])
+        self.assertEqual(1, len(session.calls))
+        method, url, _ = session.calls[0]
+        self.assertEqual("GET", method)
+        self.assertURLEqual(
+            "https://maps.googleapis.com/maps/api/geocode/json?"
+            "key=%s&address=Sesame+St." % self.key,
+            url,
+        )
+
+    def test_post_processing_reused(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","routes":["route"]}'))
+
+        routes = asyncio.run(client.directions("Sydney", "Melbourne"))
+
+        self.assertEqual(["route"], routes)
+
+    def test_stream_rows(self):
+        client, session = self._client(
+            FakeResponse(200, '{"rows":[{"elements":[]},{"elements":[]}],'
+                              '"status":"OK"}'))
+
+        rows = asyncio.run(client.distance_matrix(
+            ["Sydney", "Perth"], "Melbourne", stream_rows=True))
+
+        self.assertEqual([{"elements": []}, {"elements": []}], list(rows))
+
+    def test_stream_rows_over_query_limit(self):
+        limiter = CountingLimiter()
+        client, session = self._client(
+            FakeResponse(200, '{"rows":[],"status":"OVER_QUERY_LIMIT"}'),
+            rate_limiter=limiter)
+
+        rows = asyncio.run(client.distance_matrix(
+            ["Sydney", "Perth"], "Melbourne", stream_rows=True))
+
+        with mock.patch.object(limiter, "record_over_query_limit") as record:
+            with self.assertRaises(googlemaps.exceptions.ApiError):
+                list(rows)
+        record.assert_called_once_with()
+
+    def test_extra_params(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":[]}'))
+
+        asyncio.run(client.geocode("Sesame St.", extra_params={"foo": "bar"}))
+
+        self.assertURLEqual(
+            "https://maps.googleapis.com/maps/api/geocode/json?"
+            "key=%s&address=Sesame+St.&foo=bar" % self.key,
+            session.calls[0][1],
+        )
+
+    def test_validation_errors_raised(self):
+        client, session = self._client(FakeResponse(200, "{}"))
+
+        with self.assertRaises(ValueError):
+            asyncio.run(client.weather_currentconditions({"latitude": 1}))
+        self.assertEqual(0, len(session.calls))
+
+    def test_custom_extractor(self):
+        client, session = self._client(
+            FakeResponse(200, '{"snappedPoints":["foo"]}'))
+
+        results = asyncio.run(client.snap_to_roads((40.714728, -73.998672)))
+
+        self.assertEqual(["foo"], results)
+        self.assertTrue(
+            session.calls[0][1].startswith("https://roads.googleapis.com"))
+
+    def test_post_json(self):
+        client, session = self._client(FakeResponse(200, '{"indexes":[]}'))
+
+        asyncio.run(client.airquality_currentconditions(
+            {"latitude": 1, "longitude": 2}))
+
+        method, _, kwargs = session.calls[0]
+        self.assertEqual("POST", method)
+        self.assertEqual({"latitude": 1, "longitude": 2},
+                         kwargs["json"]["location"])
+
+    def test_stream(self):
+        client, session = self._client(FakeResponse(200, b"map"))
+
+        chunks = asyncio.run(client.static_map(size=(400, 400), zoom=6,
+                                               center=(63.259591, -144.667969)))
+
+        self.assertEqual(b"map", b"".join(chunks))
+        self.assertNotIn("stream", session.calls[0][2])
+
+    def test_retry(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OVER_QUERY_LIMIT"}'),
+            FakeResponse(200, '{"status":"OK","results":[]}'))
+
+        asyncio.run(client.geocode("Sesame St."))
+
+        self.assertEqual(2, len(session.calls))
+        self.assertEqual(session.calls[0][1], session.calls[1][1])
+
+    def test_retry_intermittent(self):
+        client, session = self._client(
+            FakeResponse(500, "Internal Server Error."),
+            FakeResponse(200, '{"status":"OK","results":[]}'))
+
+        asyncio.run(client.geocode("Sesame St."))
+
+        self.assertEqual(2, len(session.calls))
+
+    def test_retry_after(self):
+        client, session = self._client(
+            FakeResponse(429, "Too Many Requests.", {"Retry-After": "1"}),
+            FakeResponse(200, '{"status":"OK","results":[]}'),
+            retry_policy=googlemaps.retry.RetryPolicy(base_delay=0.01))
+
+        start = time.time()
+        asyncio.run(client.geocode("Sesame St."))
+        end = time.time()
+
+        self.assertEqual(2, len(session.calls))
+        self.assertTrue(start + 1 <= end < start + 1.5)
+
+    def test_circuit_breaker(self):
+        client, session = self._client(
+            FakeResponse(503, "Unavailable."),
+            FakeResponse(503, "Unavailable."),
+            retry_policy=googlemaps.retry.RetryPolicy(base_delay=0.01),
+            circuit_breaker_threshold=2)
+
+        with self.assertRaises(googlemaps.exceptions.CircuitOpen):
+            asyncio.run(client.geocode("Sesame St."))
+        self.assertEqual(2, len(session.calls))
+
+    def test_circuit_breaker_probe_released(self):
+        clock = FakeClock()
+        breaker = googlemaps.circuitbreaker.CircuitBreaker(
+            failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.before_request()
+        breaker.record_failure()
+        clock.now += 10
+        limiter = CountingLimiter()
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":[]}'),
+            rate_limiter=limiter,
+            circuit_breakers={"https://maps.googleapis.com": breaker})
+
+        # The rate limiter fails while admitting the half-open probe.
+        with mock.patch.object(limiter, "reserve",
+                               side_effect=[OSError(), 0]):
+            with self.assertRaises(OSError):
+                asyncio.run(client.geocode("Sesame St."))
+            self.assertEqual("half_open", breaker.state)
+
+            # The probe was released, so the next request is let through.
+            asyncio.run(client.geocode("Sesame St."))
+        self.assertEqual("closed", breaker.state)
+        self.assertEqual(1, len(session.calls))
+
+    def test_hedged_request(self):
+        slow = FakeResponse(200, '{"status":"OK","results":["slow"]}',
+                            delay=1)
+        client, session = self._client(
+            slow, FakeResponse(200, '{"status":"OK","results":["fast"]}'))
+
+        start = time.time()
+        results = asyncio.run(client.geocode("Sesame St.", hedge_after_ms=50))
+
+        self.assertEqual(["fast"], results["results"])
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(2, len(session.calls))
+        self.assertEqual(session.calls[0][1], session.calls[1][1])
+        self.assertTrue(slow.cancelled)
+
+    def test_deadline(self):
+        client, session = self._client(
+            FakeResponse(500, "Internal Server Error."),
+            retry_policy=googlemaps.retry.RetryPolicy(base_delay=1))
+
+        with self.assertRaises(googlemaps.exceptions.Timeout):
+            asyncio.run(client.geocode("Sesame St.", deadline=0.3))
+        self.assertEqual(1, len(session.calls))
+        self.assertLessEqual(session.calls[0][2]["timeout"].total, 0.3)
+
+    def test_deadline_timeout_not_breaker_failure(self):
+        client, session = self._client(
+            FakeResponse(200, "", error=asyncio.TimeoutError()),
+            FakeResponse(200, "", error=asyncio.TimeoutError()),
+            circuit_breaker_threshold=1)
+        breaker = client.circuit_breakers.get(client.base_url)
+
+        # The deadline cut the timeout short, so the host isn't at fault.
+        with self.assertRaises(googlemaps.exceptions.Timeout):
+            asyncio.run(client.geocode("Sesame St.", deadline=5))
+        self.assertEqual("closed", breaker.state)
+
+        with self.assertRaises(googlemaps.exceptions.Timeout):
+            asyncio.run(client.geocode("Sesame St."))
+        self.assertEqual("open", breaker.state)
+
+    def test_deadline_refuses_reserved_rate_limit_wait(self):
+        limiter = CountingLimiter()
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":[]}'),
+            rate_limiter=limiter)
+
+        # Another task was admitted between the check and the reservation.
+        start = time.monotonic()
+        with mock.patch.object(limiter, "reserve", return_value=2):
+            with self.assertRaises(googlemaps.exceptions.Timeout):
+                asyncio.run(client.geocode("Sesame St.", deadline=0.5))
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(0, len(session.calls))
+
+    def test_cache(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":[]}'),
+            cache=googlemaps.cache.MemoryCache())
+
+        asyncio.run(client.geocode("Sesame St."))
+        asyncio.run(client.geocode("Sesame St."))
+
+        self.assertEqual(1, len(session.calls))
+        self.assertEqual(1, client.cache.stats()["hits"])
+
+    def test_cache_stale_while_revalidate(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":[{"id":"a"}]}'),
+            FakeResponse(200, '{"status":"OK","results":[{"id":"b"}]}'),
+            cache=googlemaps.cache.MemoryCache(ttl=0.01, stale_ttl=60))
+
+        async def run():
+            await client.geocode("Sesame St.")
+            await asyncio.sleep(0.02)
+            stale = await client.geocode("Sesame St.")
+            await asyncio.gather(*client._refreshes)
+            fresh = await client.geocode("Sesame St.")
+            return stale, fresh
+
+        stale, fresh = asyncio.run(run())
+        self.assertEqual("a", stale["results"][0]["id"])
+        self.assertEqual("b", fresh["results"][0]["id"])
+        self.assertEqual(2, len(session.calls))
+
+    def test_coalesce_requests(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":[]}', delay=0.05),
+            coalesce_requests=True)
+
+        async def run():
+            return await asyncio.gather(
+                *[client.geocode("Sesame St.") for _ in range(3)])
+
+        results = asyncio.run(run())
+        self.assertEqual(3, len(results))
+        self.assertEqual(1, len(session.calls))
+        self.assertEqual(2, client.flights.stats()["coalesced"])
+
+    def test_map(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":["a"]}', delay=0.05),
+            FakeResponse(400, ""),
+            FakeResponse(200, '{"status":"OK","results":["c"]}'))
+
+        async def run(ordered):
+            return [r async for r in client.map(
+                "geocode", [{"address": a} for a in "abc"], max_workers=3,
+                ordered=ordered)]
+
+        results = asyncio.run(run(True))
+        self.assertEqual([0, 1, 2], [r.index for r in results])
+        self.assertEqual(["a"], results[0].result["results"])
+        self.assertIsInstance(results[1].exception,
+                              googlemaps.exceptions.HTTPError)
+        self.assertEqual({"address": "c"}, results[2].kwargs)
+        self.assertEqual(3, len(session.calls))
+
+    def test_map_unordered(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":["a"]}', delay=0.1),
+            FakeResponse(200, '{"status":"OK","results":["b"]}'))
+
+        async def run():
+            return [r.index async for r in client.map(
+                "geocode", [{"address": "a"}, {"address": "b"}],
+                ordered=False)]
+
+        self.assertEqual([1, 0], asyncio.run(run()))
+
+    def test_map_function(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":["a"]}'))
+
+        async def run():
+            return [r async for r in client.map(
+                googlemaps.geocoding.geocode, [{"address": "a"}])]
+
+        result, = asyncio.run(run())
+        self.assertEqual(["a"], result.result["results"])
+
+    def test_map_stopped_early(self):
+        slow = FakeResponse(200, '{"status":"OK","results":[]}', delay=1)
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":[]}'), slow)
+
+        async def run():
+            results = client.map("geocode",
+                                 [{"address": "a"}, {"address": "b"}])
+            async for result in results:
+                await results.aclose()
+                return result
+
+        self.assertEqual(0, asyncio.run(run()).index)
+        self.assertTrue(slow.cancelled)
+
+    def test_no_requests_session(self):
+        client = googlemaps.AsyncClient(key=self.key)
+        self.assertIsNone(client.session)
+        self.assertIsNone(client.transport)
+
+        for name in ("requests_session", "pool_maxsize", "warmup_hosts",
+                     "rewarm_interval"):
+            with self.assertRaises(TypeError):
+                googlemaps.AsyncClient(key=self.key, **{name: 1})
+
+    def test_warmup(self):
+        client, session = self._client()
+        with self.assertRaises(NotImplementedError):
+            client.warmup()
+
+    def test_pool_stats(self):
+        client, session = self._client()
+        with self.assertRaises(NotImplementedError):
+            client.pool_stats()
+
+    def test_coalesced_deadline(self):
+        client, session = self._client(
+            FakeResponse(200, "", delay=0.05, error=asyncio.TimeoutError()),
+            FakeResponse(200, '{"status":"OK","results":["a"]}'),
+            coalesce_requests=True)
+
+        async def follow():
+            await asyncio.sleep(0.01)
+            return await client.geocode("Sesame St.")
+
+        async def run():
+            return await asyncio.gather(
+                client.geocode("Sesame St.", deadline=5), follow(),
+                return_exceptions=True)
+
+        # The leader's deadline cut its timeout short, so the follower, which
+        # has no deadline, sends the request again.
+        leader, follower = asyncio.run(run())
+        self.assertIsInstance(leader, googlemaps.exceptions.Timeout)
+        self.assertEqual(["a"], follower["results"])
+        self.assertEqual(2, len(session.calls))
+
+    def test_view(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":[]}'))
+        view = client.view(extra_params={"region": "au"})
+
+        asyncio.run(view.geocode("Sesame St."))
+        asyncio.run(view.close())
+
+        self.assertIn("region=au", session.calls[0][1])
+        self.assertIs(session, view.session)
+        self.assertIs(session, client.session)
+
+    def test_no_retry_over_query_limit(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OVER_QUERY_LIMIT"}'),
+            retry_over_query_limit=False)
+
+        with self.assertRaises(googlemaps.exceptions.ApiError):
+            asyncio.run(client._request("/foo", {}))
+        self.assertEqual(1, len(session.calls))
+
+    def test_transport_error(self):
+        client, session = self._client(FakeResponse(404, ""))
+
+        with self.assertRaises(googlemaps.exceptions.HTTPError) as e:
+            asyncio.run(client.geocode("Foo"))
+        self.assertEqual(e.exception.status_code, 404)
+
+    def test_queries_per_second(self):
+        # As in ClientTest.test_queries_per_second, but the pauses must not
+        # block the event loop.
+        queries_per_second = 3
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":[]}'),
+            queries_per_second=queries_per_second)
+
+        async def run():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while not done.is_set():
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            done = asyncio.Event()
+            ticker = asyncio.ensure_future(tick())
+            for _ in range(queries_per_second * 2):
+                await client.geocode("Sesame St.")
+            done.set()
+            await ticker
+            return ticks
+
+        start = time.time()
+        ticks = asyncio.run(run())
+        end = time.time()
+        self.assertTrue(start + 1 < end < start + 2)
+        self.assertGreater(ticks, 10)
+
+    def test_requests_kwargs_translated(self):
+        client, session = self._client(
+            FakeResponse(200, '{"status":"OK","results":[]}'),
+            connect_timeout=5, read_timeout=10)
+
+        asyncio.run(client.geocode("Sesame St."))
+
+        kwargs = session.calls[0][2]
+        self.assertEqual(5, kwargs["timeout"].sock_connect)
+        self.assertEqual(10, kwargs["timeout"].sock_read)
+        self.assertTrue(
+            kwargs["headers"]["User-Agent"].startswith("GoogleGeoApiClientPython"))
@@ -0,0 +1,384 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Tests for the cache module."""
+
+import gc
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import googlemaps.cache as cache
+from . import FakeClock
+from . import TestCase
+
+
+class MemoryCacheTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_get_set(self):
+        c = cache.MemoryCache(clock=self.clock)
+        self.assertIsNone(c.get("a"))
+        c.set("a", b"1", 10)
+        self.assertEqual(b"1", c.get("a"))
+        self.assertEqual({"hits": 1, "misses": 1, "evictions": 0,
+                          "entries": 1, "bytes": 1}, c.stats())
+
+    def test_ttl(self):
+        c = cache.MemoryCache(clock=self.clock)
+        c.set("a", b"1", 10)
+        c.set("b", b"2", None)
+
+        self.clock.now += 10
+        self.assertIsNone(c.get("a"))
+        self.assertEqual(b"2", c.get("b"))
+        self.assertEqual(1, c.stats()["entries"])
+
+    def test_ttl_for(self):
+        c = cache.MemoryCache(ttl=60, ttls={"/maps/api/": 120,
+                                            "/maps/api/timezone": 86400})
+        self.assertEqual(86400, c.ttl_for("/maps/api/timezone/json"))
+        self.assertEqual(120, c.ttl_for("/maps/api/geocode/json"))
+        self.assertEqual(60, c.ttl_for("/v1/nearestRoads"))
+
+    @mock.patch("time.time")
+    def test_stale_while_revalidate(self, now):
+        now.return_value = 1000.0
+        c = cache.MemoryCache(ttl=10, stale_ttl=5, clock=self.clock)
+        c.store("a", "/maps/api/geocode/json", b"1")
+        self.assertEqual((b"1", False), c.lookup("a"))
+        self.assertEqual(15, c.export()[0][2])
+
+        now.return_value = 1010.0
+        self.assertEqual((b"1", True), c.lookup("a"))
+
+        now.return_value = 1015.0
+        self.assertEqual((None, False), c.lookup("a"))
+
+    @mock.patch("time.time")
+    def test_negative_ttl(self, now):
+        now.return_value = 1000.0
+        c = cache.MemoryCache(ttl=300, negative_ttl=30, clock=self.clock)
+        c.store("a", "/maps/api/geocode/json", b"{}", negative=True)
+        self.assertEqual(30, c.export()[0][2])
+
+        now.return_value = 1030.0
+        self.assertEqual((None, False), c.lookup("a"))
+
+        # A negative TTL of 0 turns off negative caching.
+        c = cache.MemoryCache(negative_ttl=0, clock=self.clock)
+        c.store("a", "/maps/api/geocode/json", b"{}", negative=True)
+        self.assertEqual((None, False), c.lookup("a"))
+
+    def test_max_entries(self):
+        c = cache.MemoryCache(max_entries=2, clock=self.clock)
+        c.set("a", b"1")
+        c.set("b", b"2")
+        c.get("a")
+        c.set("c", b"3")
+
+        # b was the least recently used.
+        self.assertIsNone(c.get("b"))
+        self.assertEqual(b"1", c.get("a"))
+        self.assertEqual(b"3", c.get("c"))
+        self.assertEqual(1, c.stats()["evictions"])
+
+    def test_max_bytes(self):
+        c = cache.MemoryCache(max_bytes=10, clock=self.clock)
+        c.set("a", b"12345")
+        c.set("b", b"12345")
+        c.set("c", b"123")
+        c.set("d", b"12345678901")
+
+        self.assertIsNone(c.get("a"))
+        self.assertIsNone(c.get("d"))
+        self.assertEqual({"hits": 0, "misses": 2, "evictions": 1,
+                          "entries": 2, "bytes": 8}, c.stats())
+
+    def test_many(self):
+        c = cache.MemoryCache(clock=self.clock)
+        c.set_many([("a", b"1", None), ("b", b"2", 10)])
+        self.assertEqual({"a": b"1", "b": b"2"},
+                         c.get_many(["a", "b", "c"]))
+
+        c.delete("a")
+        self.clock.now += 5
+        self.assertEqual([("b", b"2", 5)], c.export())
+
+    def test_replace(self):
+        c = cache.MemoryCache(clock=self.clock)
+        c.set("a", b"123")
+        c.set("a", b"1")
+        self.assertEqual(b"1", c.get("a"))
+        self.assertEqual(1, c.stats()["bytes"])
+
+        c.clear()
+        self.assertIsNone(c.get("a"))
+        self.assertEqual(0, c.stats()["bytes"])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            cache.MemoryCache(max_entries=0)
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "cache.db")
+
+    def tearDown(self):
+        # Close the caches' connections first, which may delete their WAL.
+        gc.collect()
+        shutil.rmtree(self.dir)
+
+    def _cache(self, **kwargs):
+        return cache.SQLiteCache(self.path, clock=self.clock, **kwargs)
+
+    def test_get_set(self):
+        c = self._cache()
+        self.assertIsNone(c.get("a"))
+        c.set("a", b'{"status":"OK"}', 10)
+        c.set("a", b'{"status":"OK","results":[]}', 10)
+
+        self.assertEqual(b'{"status":"OK","results":[]}', c.get("a"))
+        stats = c.stats()
+        self.assertEqual((1, 1, 1), (stats["hits"], stats["misses"],
+                                     stats["entries"]))
+
+    def test_persistent(self):
+        self._cache().set("a", b"1", None)
+        self.assertEqual(b"1", self._cache().get("a"))
+
+    def test_ttl(self):
+        c = self._cache()
+        c.set("a", b"1", 10)
+        self.clock.now += 10
+        self.assertIsNone(c.get("a"))
+
+    def test_max_entries(self):
+        c = self._cache(max_entries=2)
+        c.set("a", b"1")
+        self.clock.now += 1
+        c.set("b", b"2")
+        self.clock.now += 1
+        c.get("a")
+        self.clock.now += 1
+        c.set("c", b"3")
+
+        # b was the least recently used.
+        self.assertIsNone(c.get("b"))
+        self.assertEqual(b"1", c.get("a"))
+        self.assertEqual(b"3", c.get("c"))
+        self.assertEqual(1, c.stats()["evictions"])
+
+    def test_max_bytes(self):
+        c = self._cache(max_bytes=100)
+        for i in range(20):
+            self.clock.now += 1
+            c.set(str(i), os.urandom(20))
+
+        stats = c.stats()
+        self.assertLessEqual(stats["bytes"], 100)
+        self.assertEqual(20, stats["entries"] + stats["evictions"])
+        self.assertIsNotNone(c.get("19"))
+
+    def test_export_prewarm(self):
+        c = self._cache()
+        c.set("a", b"1", 10)
+        c.set("b", b"2", None)
+        c.set("c", b"3", 1)
+        self.clock.now += 5
+
+        exported = sorted(c.export())
+        self.assertEqual([("a", b"1", 5), ("b", b"2", None)], exported)
+
+        other = cache.SQLiteCache(os.path.join(self.dir, "other.db"),
+                                  clock=self.clock)
+        other.prewarm(exported)
+        self.assertEqual(b"1", other.get("a"))
+        self.clock.now += 5
+        self.assertIsNone(other.get("a"))
+        self.assertEqual(b"2", other.get("b"))
+
+    def test_many(self):
+        c = self._cache()
+        c.set_many([(str(i), str(i).encode("utf-8"), None)
+                    for i in range(1000)])
+        c.delete("0")
+
+        found = c.get_many(str(i) for i in range(1001))
+        self.assertEqual(999, len(found))
+        self.assertEqual(b"999", found["999"])
+        self.assertEqual(2, c.stats()["misses"])
+
+    def test_shared(self):
+        first = self._cache()
+        second = self._cache()
+        first.set("a", b"1")
+        self.assertEqual(b"1", second.get("a"))
+
+        second.clear()
+        self.assertIsNone(first.get("a"))
+        self.assertEqual(0, first.stats()["entries"])
+
+
+class DbmCacheTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_get_set(self):
+        c = cache.DbmCache(self.path, clock=self.clock)
+        c.set_many([("a", b"1", 10), ("b", b"2", None), ("c", b"3", 20)])
+        c.delete("c")
+        self.assertEqual({"a": b"1", "b": b"2"},
+                         c.get_many(["a", "b", "c"]))
+
+        self.clock.now += 10
+        self.assertIsNone(c.get("a"))
+        self.assertEqual([("b", b"2", None)], c.export())
+        self.assertEqual({"hits": 2, "misses": 2, "entries": 1}, c.stats())
+        c.close()
+
+        # Responses survive reopening the database.
+        c = cache.DbmCache(self.path, clock=self.clock)
+        self.assertEqual(b"2", c.get("b"))
+        c.clear()
+        self.assertIsNone(c.get("b"))
+        c.close()
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_after_fork(self):
+        c = cache.DbmCache(self.path, clock=self.clock)
+        c.set("a", b"1", None)
+        db = c._db
+
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                c.after_fork()
+                # The child has its own handle, or if the parent holds the
+                # database's lock, caches in memory.
+                if c._db is not db:
+                    c.set("b", b"2", None)
+                    if c.get("b") == b"2":
+                        status = 0
+            finally:
+                os._exit(status)
+
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(0, status)
+        self.assertEqual(b"1", c.get("a"))
+        self.assertIs(db, c._db)
+        c.close()
+
+
+class TieredCacheTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.l1 = cache.MemoryCache(ttl=60, clock=self.clock)
+        self.l2 = cache.MemoryCache(clock=self.clock)
+
+    def test_read_through(self):
+        self.l2.set("https://maps.googleapis.com/maps/api/geocode/json?a=1",
+                    b"1")
+        c = cache.TieredCache(self.l1, self.l2)
+
+        key = "https://maps.googleapis.com/maps/api/geocode/json?a=1"
+        self.assertEqual(b"1", c.get(key))
+        self.assertEqual(b"1", self.l1.get(key))
+        self.assertEqual(60, self.l1.export()[0][2])
+        self.assertIsNone(c.get("missing"))
+
+    def test_write_back(self):
+        c = cache.TieredCache(self.l1, self.l2, write_back_size=3,
+                              write_back_delay=5, clock=self.clock)
+        c.set("a", b"1", 10)
+        c.set("b", b"2", 10)
+        self.assertIsNone(self.l2.get("a"))
+        self.assertEqual(2, c.stats()["pending"])
+
+        # Pending writes are still visible once evicted from L1.
+        self.l1.clear()
+        self.assertEqual(b"1", c.get("a"))
+
+        c.set("c", b"3", 10)
+        self.assertEqual(b"1", self.l2.get("a"))
+        self.assertEqual(0, c.stats()["pending"])
+
+    def test_write_back_delay(self):
+        c = cache.TieredCache(self.l1, self.l2, write_back_delay=5,
+                              clock=self.clock)
+        c.set("a", b"1", 10)
+        self.clock.now += 5
+        c.set("b", b"2", 10)
+
+        # The TTL counts from when a was first cached.
+        self.assertEqual([("a", b"1", 5), ("b", b"2", 10)],
+                         sorted(self.l2.export()))
+
+    def test_write_back_timer(self):
+        c = cache.TieredCache(self.l1, self.l2, write_back_size=10,
+                              write_back_delay=0.05)
+        c.set("a", b"1", 10)
+
+        # Written back without waiting for another write.
+        deadline = time.monotonic() + 5
+        while self.l2.get("a") is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(b"1", self.l2.get("a"))
+        self.assertEqual(0, c.stats()["pending"])
+
+    def test_close(self):
+        c = cache.TieredCache(self.l1, self.l2, write_back_size=10,
+                              clock=self.clock)
+        c.set("a", b"1", 10)
+        c.close()
+        self.assertEqual([("a", b"1", 10)], self.l2.export())
+
+    def test_store_ttls(self):
+        l2 = cache.MemoryCache(ttl=3600, ttls={"/maps/api/elevation": 0},
+                               clock=self.clock)
+        c = cache.TieredCache(self.l1, l2, write_back_size=1,
+                              clock=self.clock)
+
+        # Each tier keeps the response for its own TTL.
+        c.store("geocode", "/maps/api/geocode/json", b"1")
+        self.assertEqual(60, self.l1.export()[0][2])
+        self.assertEqual(3600, l2.export()[0][2])
+
+        c.store("elevation", "/maps/api/elevation/json", b"2")
+        self.assertIsNone(l2.get("elevation"))
+        self.assertEqual(b"2", c.lookup("elevation")[0])
+
+    def test_delete(self):
+        c = cache.TieredCache(self.l1, self.l2, write_back_size=10)
+        c.set("a", b"1")
+        c.delete("a")
+        c.flush()
+        self.assertIsNone(c.get("a"))
+        self.assertEqual([], self.l2.export())
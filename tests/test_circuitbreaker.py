@@ -0,0 +1,145 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Tests for the circuitbreaker module."""
+
+import googlemaps.circuitbreaker as circuitbreaker
+import googlemaps.exceptions
+from . import FakeClock
+from . import TestCase
+
+
+class CircuitBreakerTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = circuitbreaker.CircuitBreaker(
+            failure_threshold=3, reset_timeout=10, clock=self.clock)
+
+    def _fail(self, times):
+        for _ in range(times):
+            self.breaker.before_request()
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self._fail(2)
+        self.breaker.before_request()
+        self.breaker.record_status(200)
+        self._fail(2)
+        self.assertEqual(circuitbreaker.CLOSED, self.breaker.state)
+
+        self._fail(1)
+        self.assertEqual(circuitbreaker.OPEN, self.breaker.state)
+        with self.assertRaises(googlemaps.exceptions.CircuitOpen) as e:
+            self.breaker.before_request("https://roads.googleapis.com")
+        self.assertEqual("https://roads.googleapis.com", e.exception.base_url)
+        self.assertEqual(10, e.exception.retry_in)
+
+    def test_server_errors_are_failures(self):
+        for status in (500, 503, 404):
+            self.breaker.before_request()
+            self.breaker.record_status(status)
+        self.assertEqual(circuitbreaker.CLOSED, self.breaker.state)
+
+        self.breaker.before_request()
+        self.breaker.record_status(504)
+        self.breaker.before_request()
+        self.breaker.record_status(500)
+        self.breaker.before_request()
+        self.breaker.record_status(502)
+        self.assertEqual(circuitbreaker.OPEN, self.breaker.state)
+
+    def test_half_open_probe_succeeds(self):
+        self._fail(3)
+        self.clock.now += 4
+        self.assertEqual(6, self.breaker.retry_in())
+
+        self.clock.now += 6
+        self.assertEqual(circuitbreaker.HALF_OPEN, self.breaker.state)
+        self.breaker.before_request()
+        # Only one probe at a time.
+        with self.assertRaises(googlemaps.exceptions.CircuitOpen):
+            self.breaker.before_request()
+
+        self.breaker.record_success()
+        self.assertEqual(circuitbreaker.CLOSED, self.breaker.state)
+        self.breaker.before_request()
+
+    def test_half_open_probe_fails(self):
+        self._fail(3)
+        self.clock.now += 10
+        self.breaker.before_request()
+        self.breaker.record_failure()
+
+        self.assertEqual(circuitbreaker.OPEN, self.breaker.state)
+        self.assertEqual(10, self.breaker.retry_in())
+
+    def test_release(self):
+        self._fail(3)
+        self.clock.now += 10
+        self.breaker.before_request()
+        self.breaker.release()
+
+        self.assertEqual(circuitbreaker.HALF_OPEN, self.breaker.state)
+        self.breaker.before_request()
+
+    def test_multiple_probes(self):
+        breaker = circuitbreaker.CircuitBreaker(
+            failure_threshold=1, reset_timeout=10, half_open_probes=2,
+            clock=self.clock)
+        breaker.before_request()
+        breaker.record_failure()
+        self.clock.now += 10
+
+        breaker.before_request()
+        breaker.before_request()
+        breaker.record_success()
+        self.assertEqual(circuitbreaker.HALF_OPEN, breaker.state)
+        breaker.record_success()
+        self.assertEqual(circuitbreaker.CLOSED, breaker.state)
+
+    def test_disabled(self):
+        breaker = circuitbreaker.CircuitBreaker(failure_threshold=None)
+        for _ in range(100):
+            breaker.before_request()
+            breaker.record_failure()
+        self.assertEqual(circuitbreaker.CLOSED, breaker.state)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            circuitbreaker.CircuitBreaker(failure_threshold=0)
+        with self.assertRaises(ValueError):
+            circuitbreaker.CircuitBreaker(half_open_probes=0)
+        with self.assertRaises(ValueError):
+            circuitbreaker.CircuitBreaker(reset_timeout=-1)
+
+
+class CircuitBreakerRegistryTest(TestCase):
+    def test_per_host(self):
+        override = circuitbreaker.CircuitBreaker()
+        registry = circuitbreaker.CircuitBreakerRegistry(
+            lambda base_url: circuitbreaker.CircuitBreaker(),
+            {"https://roads.googleapis.com": override})
+
+        maps = registry.get("https://maps.googleapis.com")
+        self.assertIs(maps, registry.get("https://maps.googleapis.com"))
+        self.assertIsNot(maps, registry.get("https://weather.googleapis.com"))
+        self.assertIs(override, registry.get("https://roads.googleapis.com"))
+        self.assertEqual({
+            "https://maps.googleapis.com": circuitbreaker.CLOSED,
+            "https://weather.googleapis.com": circuitbreaker.CLOSED,
+            "https://roads.googleapis.com": circuitbreaker.CLOSED,
+        }, registry.states())
@@ -18,14 +18,30 @@
 
 """Tests for client module."""
 
+import concurrent.futures
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
 import time
+import traceback
+import unittest
+from unittest import mock
 
 import responses
 import requests
 import uuid
+from urllib.parse import urlparse, parse_qsl
 
 import googlemaps
+import googlemaps.cache
 import googlemaps.client as _client
+import googlemaps.pool
+import googlemaps.weather
+from . import CountingLimiter
+from . import FakeClock
 from . import TestCase
 from googlemaps.client import _X_GOOG_MAPS_EXPERIENCE_ID
 
@@ -414,6 +430,202 @@ class ClientTest(TestCase):
         request = self._perform_mock_request()
         self.assertIsNone(request.headers.get(_X_GOOG_MAPS_EXPERIENCE_ID))
 
+    @responses.activate
+    def test_view(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        client = googlemaps.Client(key="AIzaasdf", experience_id="base")
+        view = client.view(extra_params={"region": "au"},
+                           headers={"X-Tenant": "a"}, experience_id="exp")
+        view.geocode("Sesame St.", extra_params={"language": "en"})
+        client.geocode("Sesame St.")
+
+        view_request = responses.calls[0].request
+        self.assertURLEqual(
+            "https://maps.googleapis.com/maps/api/geocode/json?"
+            "address=Sesame+St.&key=AIzaasdf&language=en&region=au",
+            view_request.url)
+        self.assertEqual("a", view_request.headers["X-Tenant"])
+        self.assertEqual("exp",
+                         view_request.headers[_X_GOOG_MAPS_EXPERIENCE_ID])
+
+        # The client is unchanged.
+        client_request = responses.calls[1].request
+        self.assertURLEqual(
+            "https://maps.googleapis.com/maps/api/geocode/json?"
+            "address=Sesame+St.&key=AIzaasdf", client_request.url)
+        self.assertNotIn("X-Tenant", client_request.headers)
+        self.assertEqual("base", client.get_experience_id())
+
+        # Everything else is shared.
+        self.assertIs(client.session, view.session)
+        self.assertIs(client.rate_limiters, view.rate_limiters)
+        self.assertIs(client._background(), view._background())
+
+    def _in_child(self, check):
+        """Runs check() in a child forked from this process, failing if it
+        raises."""
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                signal.alarm(5)
+                check()
+                status = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(status)
+
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(0, status)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_after_fork(self):
+        client = googlemaps.Client(key="AIzaasdf", coalesce_requests=True,
+                                   cache=googlemaps.cache.MemoryCache())
+        view = client.view(experience_id="exp")
+        adapter = client.session.get_adapter("https://maps.googleapis.com")
+        poolmanager = adapter.poolmanager
+        executor = client._background()
+        hedging = client._hedging()
+        limiter = client.rate_limiters.get("https://maps.googleapis.com",
+                                           "/maps/api/geocode/json")
+        limiter_lock = limiter._lock
+        cache_lock = client.cache._lock
+
+        def check():
+            self.assertIsNot(poolmanager, adapter.poolmanager)
+            self.assertIs(adapter, client.session.get_adapter(
+                "https://maps.googleapis.com"))
+            self.assertIsNot(executor, client._background())
+            self.assertIsNot(hedging, client._hedging())
+            self.assertIsNot(limiter_lock, limiter._lock)
+            self.assertIsNot(cache_lock, client.cache._lock)
+
+            # The view still shares the client's state.
+            self.assertIs(client._background(), view._background())
+            self.assertIs(client._hedging(), view._hedging())
+            self.assertIs(client._executor_lock, view._executor_lock)
+            self.assertIs(client._revalidating, view._revalidating)
+
+        self._in_child(check)
+
+        # The parent's state is left alone.
+        self.assertIs(poolmanager, adapter.poolmanager)
+        self.assertIs(executor, client._background())
+        self.assertIs(limiter_lock, limiter._lock)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_after_fork_rewarm(self):
+        started = []
+
+        def rewarm(client_ref, hosts, connections, interval):
+            started.append((client_ref(), hosts, interval))
+
+        def client_started():
+            return [args for args in started if args[0] is client]
+
+        def wait_for_started(count):
+            deadline = time.monotonic() + 5
+            while (len(client_started()) < count and
+                   time.monotonic() < deadline):
+                time.sleep(0.01)
+            time.sleep(0.05)
+
+        def check():
+            # Restarted once in the child, for the client and its view.
+            wait_for_started(2)
+            self.assertEqual([(client, ["http://127.0.0.1:1"], 60)] * 2,
+                             client_started())
+
+        with mock.patch.object(_client, "_rewarm", rewarm):
+            client = googlemaps.Client(key="AIzaasdf",
+                                       warmup_hosts=["http://127.0.0.1:1"],
+                                       rewarm_interval=60)
+            client.view(experience_id="exp")
+            wait_for_started(1)
+            self._in_child(check)
+        self.assertEqual(1, len(client_started()))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    @responses.activate
+    def test_fork_with_lock_held(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        client = googlemaps.Client(key="AIzaasdf")
+        limiter = client.rate_limiters.get("https://maps.googleapis.com",
+                                           "/maps/api/geocode/json")
+        # As if another thread were sending a request when the process
+        # forked.
+        with limiter._lock:
+            self._in_child(lambda: client.geocode("Sesame St."))
+
+    @responses.activate
+    def test_json_loads(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+        responses.add(
+            responses.GET,
+            "https://roads.googleapis.com/v1/speedLimits",
+            body='{"speedLimits":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        bodies = []
+
+        def json_loads(body):
+            bodies.append(body)
+            return json.loads(body)
+
+        client = googlemaps.Client(key="AIzaasdf", json_loads=json_loads)
+        client.geocode("Sesame St.")
+        client.speed_limits("ChIJ")
+
+        self.assertEqual([b'{"status":"OK","results":[]}',
+                          b'{"speedLimits":[]}'], bodies)
+
+    def test_default_json_loads(self):
+        ujson = mock.Mock()
+
+        def import_module(name):
+            if name == "ujson":
+                return ujson
+            raise ImportError(name)
+
+        with mock.patch("importlib.import_module", import_module):
+            self.assertIs(ujson.loads, _client._default_json_loads())
+        with mock.patch("importlib.import_module", side_effect=ImportError):
+            self.assertIs(json.loads, _client._default_json_loads())
+
+    def test_experience_id_copy_on_write(self):
+        client = googlemaps.Client(key="AIzaasdf", experience_id="a")
+        headers = client.requests_kwargs["headers"]
+        client.set_experience_id("b")
+        client.clear_experience_id()
+
+        # Requests in flight keep the headers they started with.
+        self.assertEqual("a", headers[_X_GOOG_MAPS_EXPERIENCE_ID])
+        self.assertIsNone(client.get_experience_id())
+
     @responses.activate
     def test_no_retry_over_query_limit(self):
         responses.add(
@@ -430,3 +642,930 @@ class ClientTest(TestCase):
             client._request("/foo", {})
 
         self.assertEqual(1, len(responses.calls))
+
+    @responses.activate
+    def test_map(self):
+        def request_callback(req):
+            address = dict(parse_qsl(urlparse(req.url).query))["address"]
+            if address == "Nowhere":
+                return (404, {}, "")
+            return (200, {}, '{"status":"OK","results":["%s"]}' % address)
+
+        responses.add_callback(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            content_type="application/json",
+            callback=request_callback,
+        )
+
+        client = googlemaps.Client(key="AIzaasdf")
+        addresses = ["Sydney", "Nowhere", "Melbourne", "Perth", "Hobart"]
+        results = list(client.map("geocode",
+                                  ({"address": a} for a in addresses),
+                                  max_workers=2))
+
+        self.assertEqual(len(addresses), len(responses.calls))
+        self.assertEqual(list(range(len(addresses))),
+                         [r.index for r in results])
+        for address, r in zip(addresses, results):
+            self.assertEqual({"address": address}, r.kwargs)
+            if address == "Nowhere":
+                self.assertIsNone(r.result)
+                self.assertIsInstance(r.exception,
+                                      googlemaps.exceptions.HTTPError)
+            else:
+                self.assertIsNone(r.exception)
+                self.assertEqual([address], r.result["results"])
+
+    @responses.activate
+    def test_map_unordered(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        client = googlemaps.Client(key="AIzaasdf")
+        results = list(client.map("geocode",
+                                  [{"address": str(i)} for i in range(20)],
+                                  max_workers=4, ordered=False))
+
+        self.assertEqual(list(range(20)), sorted(r.index for r in results))
+
+    @responses.activate
+    def test_map_function(self):
+        responses.add(
+            responses.GET,
+            "https://weather.googleapis.com/v1/currentConditions:lookup",
+            body='{"temperature":{"degrees":20}}',
+            status=200,
+            content_type="application/json",
+        )
+
+        client = googlemaps.Client(key="AIzaasdf")
+        results = list(client.map(
+            googlemaps.weather.weather_currentconditions,
+            [{"coord_dict": {"latitude": 1, "longitude": 2}}]))
+
+        self.assertEqual(20, results[0].result["temperature"]["degrees"])
+
+    @responses.activate
+    def test_map_extra_params(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        client = googlemaps.Client(key="AIzaasdf")
+        inputs = [{"address": str(i), "extra_params": {"tag": str(i)}}
+                  for i in range(20)]
+        list(client.map("geocode", inputs, max_workers=8))
+
+        for call in responses.calls:
+            query = dict(parse_qsl(urlparse(call.request.url).query))
+            self.assertEqual(query["address"], query["tag"])
+
+    @responses.activate
+    def test_rate_limiter_counts_retries(self):
+        class request_callback:
+            def __init__(self):
+                self.first_req = True
+
+            def __call__(self, req):
+                if self.first_req:
+                    self.first_req = False
+                    return (500, {}, "Internal Server Error.")
+                return (200, {}, '{"status":"OK","results":[]}')
+
+        responses.add_callback(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            content_type="application/json",
+            callback=request_callback(),
+        )
+
+        limiter = CountingLimiter()
+        client = googlemaps.Client(key="AIzaasdf", rate_limiter=limiter)
+        client.geocode("Sesame St.")
+
+        self.assertEqual(2, len(responses.calls))
+        self.assertEqual(2, limiter.calls)
+
+    @responses.activate
+    def test_fractional_queries_per_second(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+        client = googlemaps.Client(key="AIzaasdf", queries_per_second=2.5,
+                                   queries_per_minute=None)
+        limiter = client.rate_limiters.get(_client._DEFAULT_BASE_URL,
+                                           "/maps/api/geocode/json")
+        self.assertEqual(2.5, limiter.rate)
+
+        start = time.time()
+        for _ in range(4):
+            client.geocode("Sesame St.")
+        end = time.time()
+        self.assertTrue(start + 0.4 < end < start + 1)
+
+    def test_missing_queries_quota(self):
+        with self.assertRaises(ValueError):
+            googlemaps.Client(key="AIzaasdf", queries_per_second=None,
+                              queries_per_minute=None)
+
+    @responses.activate
+    def test_rate_limit_per_api(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+        responses.add(
+            responses.GET,
+            "https://roads.googleapis.com/v1/snapToRoads",
+            body='{"snappedPoints":[]}',
+            status=200,
+            content_type="application/json",
+        )
+        client = googlemaps.Client(key="AIzaasdf", queries_per_second=1,
+                                   queries_per_minute=None)
+
+        # The APIs' quotas are separate, so neither call waits on the other.
+        start = time.time()
+        client.geocode("Sesame St.")
+        client.snap_to_roads((40.714728, -73.998672))
+        self.assertLess(time.time(), start + 0.5)
+
+    @responses.activate
+    def test_rate_limiters_override(self):
+        responses.add(
+            responses.GET,
+            "https://roads.googleapis.com/v1/snapToRoads",
+            body='{"snappedPoints":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        roads = CountingLimiter()
+        client = googlemaps.Client(
+            key="AIzaasdf",
+            rate_limiters={"https://roads.googleapis.com": roads})
+        client.snap_to_roads((40.714728, -73.998672))
+
+        self.assertEqual(1, roads.calls)
+
+    @responses.activate
+    def test_adaptive_rate_limit(self):
+        class request_callback:
+            def __init__(self):
+                self.first_req = True
+
+            def __call__(self, req):
+                if self.first_req:
+                    self.first_req = False
+                    return (200, {}, '{"status":"OVER_QUERY_LIMIT"}')
+                return (200, {}, '{"status":"OK","results":[]}')
+
+        responses.add_callback(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            content_type="application/json",
+            callback=request_callback(),
+        )
+
+        client = googlemaps.Client(key="AIzaasdf", queries_per_second=10,
+                                   adaptive_rate_limit=True)
+        client.geocode("Sesame St.")
+
+        rate = client.rate_limiters.effective_rates()[
+            (_client._DEFAULT_BASE_URL, "/maps/api/geocode")]
+        self.assertTrue(5 < rate < 6)
+
+    @responses.activate
+    def test_retry_policy_max_attempts(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body="Internal Server Error.",
+            status=500,
+            content_type="application/json",
+        )
+
+        policy = googlemaps.retry.RetryPolicy(base_delay=0.01, max_attempts=3)
+        client = googlemaps.Client(key="AIzaasdf", retry_policy=policy)
+        with self.assertRaises(googlemaps.exceptions.HTTPError) as e:
+            client.geocode("Sesame St.")
+
+        self.assertEqual(500, e.exception.status_code)
+        self.assertEqual(3, len(responses.calls))
+
+    @responses.activate
+    def test_retry_policy_over_query_limit(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OVER_QUERY_LIMIT"}',
+            status=200,
+            content_type="application/json",
+        )
+
+        policy = googlemaps.retry.RetryPolicy(base_delay=0.01, max_attempts=2)
+        client = googlemaps.Client(key="AIzaasdf", retry_policy=policy)
+        with self.assertRaises(googlemaps.exceptions.ApiError) as e:
+            client.geocode("Sesame St.")
+
+        self.assertEqual("OVER_QUERY_LIMIT", e.exception.status)
+        self.assertEqual(2, len(responses.calls))
+
+    @responses.activate
+    def test_retry_after(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body="Too Many Requests.",
+            status=429,
+            headers={"Retry-After": "1"},
+        )
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        # The header overrides the policy's own, much shorter, backoff.
+        policy = googlemaps.retry.RetryPolicy(base_delay=0.01)
+        client = googlemaps.Client(key="AIzaasdf", retry_policy=policy)
+        start = time.time()
+        client.geocode("Sesame St.")
+        end = time.time()
+
+        self.assertEqual(2, len(responses.calls))
+        self.assertTrue(start + 1 <= end < start + 1.5)
+
+    @responses.activate
+    def test_retry_after_beyond_retry_timeout(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body="Unavailable.",
+            status=503,
+            headers={"Retry-After": "120"},
+        )
+
+        client = googlemaps.Client(key="AIzaasdf", retry_timeout=60)
+        start = time.time()
+        with self.assertRaises(googlemaps.exceptions.Timeout):
+            client.geocode("Sesame St.")
+
+        # Fails straight away, rather than sleeping until the deadline.
+        self.assertLess(time.time(), start + 1)
+        self.assertEqual(1, len(responses.calls))
+
+    @responses.activate
+    def test_too_many_requests_no_retry(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body="Too Many Requests.",
+            status=429,
+        )
+
+        client = googlemaps.Client(key="AIzaasdf",
+                                   retry_over_query_limit=False)
+        with self.assertRaises(googlemaps.exceptions.HTTPError) as e:
+            client.geocode("Sesame St.")
+
+        self.assertEqual(429, e.exception.status_code)
+        self.assertEqual(1, len(responses.calls))
+
+    @responses.activate
+    def test_retry_budget(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body="Internal Server Error.",
+            status=500,
+        )
+
+        budget = googlemaps.retry.RetryBudget(ratio=0.1, min_retries=2)
+        policy = googlemaps.retry.RetryPolicy(base_delay=0.01)
+        client = googlemaps.Client(key="AIzaasdf", retry_policy=policy,
+                                   retry_budget=budget)
+        with self.assertRaises(
+                googlemaps.exceptions.RetryBudgetExceeded) as e:
+            client.geocode("Sesame St.")
+        self.assertEqual(500, e.exception.status_code)
+        self.assertIsInstance(e.exception.__cause__,
+                              googlemaps.exceptions.HTTPError)
+        self.assertEqual(500, e.exception.__cause__.status_code)
+
+        # The first attempt and the two retries in the budget.
+        self.assertEqual(3, len(responses.calls))
+
+        # Once spent, failed requests aren't retried at all.
+        with self.assertRaises(googlemaps.exceptions.RetryBudgetExceeded):
+            client.geocode("Sesame St.")
+        self.assertEqual(4, len(responses.calls))
+        self.assertEqual({"requests": 2, "retries": 2, "rejected": 2,
+                          "available": 0}, client.retry_budget.stats())
+
+    @responses.activate
+    def test_retry_budget_over_query_limit(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OVER_QUERY_LIMIT"}',
+            status=200,
+            content_type="application/json",
+        )
+
+        budget = googlemaps.retry.RetryBudget(ratio=0.1, min_retries=0)
+        client = googlemaps.Client(key="AIzaasdf", retry_budget=budget)
+        with self.assertRaises(
+                googlemaps.exceptions.RetryBudgetExceeded) as e:
+            client.geocode("Sesame St.")
+
+        # The API's status is kept.
+        self.assertIsInstance(e.exception.__cause__,
+                              googlemaps.exceptions.ApiError)
+        self.assertEqual("OVER_QUERY_LIMIT", e.exception.__cause__.status)
+        self.assertEqual(1, len(responses.calls))
+
+    @responses.activate
+    def test_circuit_breaker(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body="Internal Server Error.",
+            status=500,
+        )
+        responses.add(
+            responses.GET,
+            "https://roads.googleapis.com/v1/nearestRoads",
+            body='{"snappedPoints":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        policy = googlemaps.retry.RetryPolicy(base_delay=0.01)
+        client = googlemaps.Client(key="AIzaasdf", retry_policy=policy,
+                                   circuit_breaker_threshold=3,
+                                   circuit_breaker_reset_timeout=60)
+        with self.assertRaises(googlemaps.exceptions.CircuitOpen) as e:
+            client.geocode("Sesame St.")
+
+        # The breaker opened after the third attempt.
+        self.assertEqual(3, len(responses.calls))
+        self.assertEqual("https://maps.googleapis.com", e.exception.base_url)
+
+        # Further requests to the host fail without being sent, while other
+        # hosts are unaffected.
+        with self.assertRaises(googlemaps.exceptions.CircuitOpen):
+            client.geocode("Sesame St.")
+        client.nearest_roads((40.714728, -73.998672))
+        self.assertEqual(4, len(responses.calls))
+        self.assertEqual({"https://maps.googleapis.com": "open",
+                          "https://roads.googleapis.com": "closed"},
+                         client.circuit_breakers.states())
+
+    @responses.activate
+    def test_circuit_breaker_probe_released(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        clock = FakeClock()
+        breaker = googlemaps.circuitbreaker.CircuitBreaker(
+            failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.before_request()
+        breaker.record_failure()
+        clock.now += 10
+        limiter = CountingLimiter()
+        client = googlemaps.Client(
+            key="AIzaasdf", rate_limiter=limiter,
+            circuit_breakers={"https://maps.googleapis.com": breaker})
+
+        # The rate limiter fails while admitting the half-open probe.
+        with mock.patch.object(limiter, "reserve",
+                               side_effect=[OSError(), 0]):
+            with self.assertRaises(OSError):
+                client.geocode("Sesame St.")
+            self.assertEqual("half_open", breaker.state)
+
+            # The probe was released, so the next request is let through.
+            client.geocode("Sesame St.")
+        self.assertEqual("closed", breaker.state)
+        self.assertEqual(1, len(responses.calls))
+
+    @responses.activate
+    def test_hedged_request(self):
+        class request_callback:
+            def __init__(self):
+                self.calls = 0
+
+            def __call__(self, req):
+                self.calls += 1
+                if self.calls == 1:
+                    time.sleep(0.5)
+                    return (200, {}, '{"status":"OK","predictions":["slow"]}')
+                return (200, {}, '{"status":"OK","predictions":["fast"]}')
+
+        callback = request_callback()
+        responses.add_callback(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/place/autocomplete/json",
+            content_type="application/json",
+            callback=callback,
+        )
+
+        client = googlemaps.Client(key="AIzaasdf")
+        start = time.time()
+        results = client.places_autocomplete("Google", hedge_after_ms=50)
+
+        self.assertEqual(["fast"], results)
+        self.assertLess(time.time() - start, 0.4)
+        self.assertEqual(2, callback.calls)
+
+        # The slow request finishes before the mock is torn down, rather
+        # than being recorded by a later test.
+        while len(responses.calls) < 2:
+            time.sleep(0.01)
+
+    @responses.activate
+    def test_hedged_requests_in_parallel(self):
+        workers = 3 * _client._BACKGROUND_WORKERS
+        running = []
+        peak = [0]
+        lock = threading.Lock()
+
+        def callback(request):
+            with lock:
+                running.append(request)
+                peak[0] = max(peak[0], len(running))
+            time.sleep(0.03)
+            with lock:
+                running.remove(request)
+            return (200, {}, '{"status":"OK","results":[]}')
+
+        responses.add_callback(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            content_type="application/json",
+            callback=callback,
+        )
+
+        limiter = CountingLimiter()
+        client = googlemaps.Client(key="AIzaasdf", rate_limiter=limiter)
+        inputs = [{"address": str(i), "hedge_after_ms": 500}
+                  for i in range(2 * workers)]
+        list(client.map("geocode", inputs, max_workers=workers))
+
+        # Answered well within hedge_after_ms, none was sent twice, and
+        # the calls weren't held to the background thread pool's size.
+        self.assertEqual(len(inputs), limiter.calls)
+        self.assertEqual(len(inputs), len(responses.calls))
+        self.assertGreater(peak[0], _client._BACKGROUND_WORKERS)
+
+    @responses.activate
+    def test_coalesce_requests(self):
+        release = threading.Event()
+
+        def callback(request):
+            release.wait(5)
+            return (200, {}, '{"status":"OK","results":[{"place_id":"a"}]}')
+
+        responses.add_callback(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            content_type="application/json",
+            callback=callback,
+        )
+
+        client = googlemaps.Client(key="AIzaasdf", coalesce_requests=True)
+        with concurrent.futures.ThreadPoolExecutor(3) as executor:
+            futures = [executor.submit(client.geocode, "Sesame St.")
+                       for _ in range(3)]
+            while client.flights.stats()["coalesced"] < 2:
+                time.sleep(0.01)
+            release.set()
+            results = [f.result() for f in futures]
+
+        # Each caller gets its own copy of the response.
+        results[0]["results"][0]["place_id"] = "changed"
+        self.assertEqual("a", results[1]["results"][0]["place_id"])
+        self.assertEqual(1, len(responses.calls))
+        self.assertEqual({"in_flight": 0, "sent": 1, "coalesced": 2},
+                         client.flights.stats())
+
+        # Once the response has arrived, the request is sent again.
+        client.geocode("Sesame St.")
+        self.assertEqual(2, len(responses.calls))
+
+    @responses.activate
+    def test_coalesced_deadline(self):
+        release = threading.Event()
+        calls = []
+
+        def callback(request):
+            calls.append(request)
+            if len(calls) == 1:
+                release.wait(5)
+                raise requests.exceptions.ReadTimeout()
+            return (200, {}, '{"status":"OK","results":[{"place_id":"a"}]}')
+
+        responses.add_callback(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            content_type="application/json",
+            callback=callback,
+        )
+
+        client = googlemaps.Client(key="AIzaasdf", coalesce_requests=True)
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            leader = executor.submit(client.geocode, "Sesame St.",
+                                     deadline=5)
+            while not calls:
+                time.sleep(0.01)
+            follower = executor.submit(client.geocode, "Sesame St.")
+            while client.flights.stats()["coalesced"] < 1:
+                time.sleep(0.01)
+            release.set()
+
+            # The leader's deadline cut its timeout short, so the follower,
+            # which has no deadline, sends the request again.
+            with self.assertRaises(googlemaps.exceptions.Timeout):
+                leader.result()
+            self.assertEqual("a", follower.result()["results"][0]["place_id"])
+        self.assertEqual(2, len(calls))
+
+    def test_pool_size(self):
+        client = googlemaps.Client(key="AIzaasdf")
+        adapter = client.session.get_adapter("https://maps.googleapis.com/")
+        self.assertEqual(2 * _client._DEFAULT_MAP_WORKERS +
+                         _client._BACKGROUND_WORKERS, adapter._pool_maxsize)
+
+        # The pools grow to cover the threads of map().
+        list(client.map(lambda client: None, [{}], max_workers=50))
+        adapter = client.session.get_adapter("https://maps.googleapis.com/")
+        self.assertEqual(2 * 50 + _client._BACKGROUND_WORKERS,
+                         adapter._pool_maxsize)
+
+        client = googlemaps.Client(key="AIzaasdf", pool_maxsize=5)
+        list(client.map(lambda client: None, [{}], max_workers=50))
+        adapter = client.session.get_adapter("https://maps.googleapis.com/")
+        self.assertEqual(5, adapter._pool_maxsize)
+
+        # A session given to the client is left alone.
+        session = requests.Session()
+        googlemaps.Client(key="AIzaasdf", requests_session=session)
+        self.assertNotIsInstance(session.get_adapter("https://"),
+                                 googlemaps.pool.PoolAdapter)
+
+    def test_view_pool_size(self):
+        client = googlemaps.Client(key="AIzaasdf")
+        list(client.map(lambda client: None, [{}], max_workers=100))
+        adapter = client.session.get_adapter("https://maps.googleapis.com/")
+
+        # A view mapping with fewer threads leaves the shared pools alone.
+        view = client.view(experience_id="exp")
+        list(view.map(lambda client: None, [{}], max_workers=30))
+        self.assertIs(adapter, client.session.get_adapter(
+            "https://maps.googleapis.com/"))
+        self.assertEqual(2 * 100 + _client._BACKGROUND_WORKERS,
+                         adapter._pool_maxsize)
+
+        # Pools grown by a view are kept by the client.
+        list(view.map(lambda client: None, [{}], max_workers=200))
+        list(client.map(lambda client: None, [{}], max_workers=150))
+        adapter = client.session.get_adapter("https://maps.googleapis.com/")
+        self.assertEqual(2 * 200 + _client._BACKGROUND_WORKERS,
+                         adapter._pool_maxsize)
+
+    @responses.activate
+    def test_not_hedged(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        client = googlemaps.Client(key="AIzaasdf")
+        client.geocode("Sesame St.", hedge_after_ms=1000)
+        client.geocode("Sesame St.")
+
+        self.assertEqual(2, len(responses.calls))
+
+    @responses.activate
+    def test_deadline_refuses_backoff(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body="Internal Server Error.",
+            status=500,
+        )
+
+        policy = googlemaps.retry.RetryPolicy(base_delay=1)
+        client = googlemaps.Client(key="AIzaasdf", retry_policy=policy)
+        start = time.time()
+        with self.assertRaises(googlemaps.exceptions.Timeout):
+            client.geocode("Sesame St.", deadline=0.3)
+
+        # The retry would have slept past the deadline.
+        self.assertLess(time.time() - start, 0.3)
+        self.assertEqual(1, len(responses.calls))
+
+    @responses.activate
+    def test_deadline_refuses_rate_limit_wait(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        client = googlemaps.Client(key="AIzaasdf", queries_per_second=1)
+        client.geocode("Sesame St.")
+        with self.assertRaises(googlemaps.exceptions.Timeout):
+            client.geocode("Sesame St.", deadline=0.2)
+
+        # The refused request didn't use up the quota.
+        self.assertEqual(1, len(responses.calls))
+        self.assertGreater(
+            client.rate_limiters.get(client.base_url,
+                                     "/maps/api/geocode/json").wait_time(),
+            0.5)
+
+    @responses.activate
+    def test_deadline_timeout_not_breaker_failure(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body=requests.exceptions.ReadTimeout(),
+        )
+
+        client = googlemaps.Client(key="AIzaasdf",
+                                   circuit_breaker_threshold=1)
+        breaker = client.circuit_breakers.get(client.base_url)
+
+        # The deadline cut the timeout short, so the host isn't at fault.
+        with self.assertRaises(googlemaps.exceptions.Timeout):
+            client.geocode("Sesame St.", deadline=5)
+        self.assertEqual("closed", breaker.state)
+
+        with self.assertRaises(googlemaps.exceptions.Timeout):
+            client.geocode("Sesame St.")
+        self.assertEqual("open", breaker.state)
+
+    @responses.activate
+    def test_deadline_refuses_reserved_rate_limit_wait(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        limiter = CountingLimiter()
+        client = googlemaps.Client(key="AIzaasdf", rate_limiter=limiter)
+
+        # Another thread was admitted between the check and the
+        # reservation.
+        start = time.monotonic()
+        with mock.patch.object(limiter, "reserve", return_value=2):
+            with self.assertRaises(googlemaps.exceptions.Timeout):
+                client.geocode("Sesame St.", deadline=0.5)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(0, len(responses.calls))
+
+    @responses.activate
+    def test_deadline_hedged_waiting_for_thread(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        client = googlemaps.Client(key="AIzaasdf")
+        release = threading.Event()
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            executor.submit(release.wait, 5)
+            with mock.patch.object(client, "_hedging",
+                                   return_value=executor):
+                start = time.monotonic()
+                with self.assertRaises(googlemaps.exceptions.Timeout):
+                    client.geocode("Sesame St.", hedge_after_ms=10,
+                                   deadline=0.2)
+                self.assertLess(time.monotonic() - start, 1)
+            release.set()
+        self.assertEqual(0, len(responses.calls))
+        self.assertEqual(
+            "closed", client.circuit_breakers.get(client.base_url).state)
+
+    def test_deadline_kwargs(self):
+        deadline = time.monotonic() + 2
+        self.assertEqual(({"timeout": 1}, False),
+                         _client._deadline_kwargs({"timeout": 1}, deadline))
+
+        kwargs, cut = _client._deadline_kwargs({"timeout": None}, deadline)
+        self.assertTrue(1.9 < kwargs["timeout"] <= 2)
+        self.assertTrue(cut)
+
+        kwargs, cut = _client._deadline_kwargs({"timeout": (1, 10)},
+                                               deadline)
+        self.assertEqual(1, kwargs["timeout"][0])
+        self.assertTrue(1.9 < kwargs["timeout"][1] <= 2)
+        self.assertTrue(cut)
+
+        kwargs = {"timeout": 10}
+        self.assertEqual((kwargs, False),
+                         _client._deadline_kwargs(kwargs, None))
+
+    @responses.activate
+    def test_cache(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"OK","results":[{"place_id":"a"}]}',
+            status=200,
+            content_type="application/json",
+        )
+
+        client = googlemaps.Client(key="AIzaasdf",
+                                   cache=googlemaps.cache.MemoryCache())
+        first = client.geocode("Sesame St.")
+        first["results"][0]["place_id"] = "changed"
+        second = client.geocode("Sesame St.")
+        client.geocode("Sesame St.", extra_params={"foo": "bar"})
+
+        self.assertEqual([{"place_id": "a"}], second["results"])
+        self.assertEqual(2, len(responses.calls))
+        self.assertEqual(1, client.cache.stats()["hits"])
+
+        # Credentials aren't part of the key.
+        other = googlemaps.Client(key="AIzaother", cache=client.cache)
+        other.geocode("Sesame St.")
+        self.assertEqual(2, len(responses.calls))
+
+    @responses.activate
+    def test_cache_stale_while_revalidate(self):
+        bodies = iter(['{"status":"OK","results":[{"place_id":"a"}]}',
+                       '{"status":"OK","results":[{"place_id":"b"}]}'])
+        responses.add_callback(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            callback=lambda request: (200, {}, next(bodies)),
+            content_type="application/json",
+        )
+
+        client = googlemaps.Client(
+            key="AIzaasdf",
+            cache=googlemaps.cache.MemoryCache(ttl=0.01, stale_ttl=60))
+        client.geocode("Sesame St.")
+        time.sleep(0.02)
+
+        # The stale response is returned, while a fresh one is fetched.
+        stale = client.geocode("Sesame St.")
+        client._executor.shutdown(wait=True)
+        fresh = client.geocode("Sesame St.")
+
+        self.assertEqual("a", stale["results"][0]["place_id"])
+        self.assertEqual("b", fresh["results"][0]["place_id"])
+        self.assertEqual(2, len(responses.calls))
+
+    @responses.activate
+    def test_negative_cache(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"ZERO_RESULTS","results":[]}',
+            status=200,
+            content_type="application/json",
+        )
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/place/details/json",
+            body='{"status":"NOT_FOUND"}',
+            status=200,
+            content_type="application/json",
+        )
+
+        client = googlemaps.Client(key="AIzaasdf",
+                                   cache=googlemaps.cache.MemoryCache())
+        for _ in range(2):
+            self.assertEqual([], client.geocode("Nowhere")["results"])
+            with self.assertRaises(googlemaps.exceptions.ApiError):
+                client.place("ChIJ")
+
+        self.assertEqual(2, len(responses.calls))
+        for _, _, ttl in client.cache.export():
+            self.assertAlmostEqual(60, ttl, delta=1)
+
+    @responses.activate
+    def test_sqlite_cache(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/timezone/json",
+            body='{"status":"OK","timeZoneId":"Australia/Sydney"}',
+            status=200,
+            content_type="application/json",
+        )
+
+        path = os.path.join(tempfile.mkdtemp(), "cache.db")
+        try:
+            for _ in range(2):
+                # A new cache and client each time, as after a restart.
+                client = googlemaps.Client(
+                    key="AIzaasdf", cache=googlemaps.cache.SQLiteCache(path))
+                result = client.timezone((-33.8674869, 151.2069902),
+                                         timestamp=0)
+                self.assertEqual("Australia/Sydney", result["timeZoneId"])
+        finally:
+            shutil.rmtree(os.path.dirname(path))
+
+        self.assertEqual(1, len(responses.calls))
+
+    @responses.activate
+    def test_cache_skips_failures_and_streams(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            body='{"status":"REQUEST_DENIED"}',
+            status=200,
+            content_type="application/json",
+        )
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/staticmap",
+            body=b"map",
+            status=200,
+        )
+
+        client = googlemaps.Client(key="AIzaasdf",
+                                   cache=googlemaps.cache.MemoryCache())
+        for _ in range(2):
+            with self.assertRaises(googlemaps.exceptions.ApiError):
+                client.geocode("Sesame St.")
+            b"".join(client.static_map(size=(400, 400), zoom=6,
+                                       center=(63.259591, -144.667969)))
+
+        self.assertEqual(4, len(responses.calls))
+        self.assertEqual(0, client.cache.stats()["entries"])
+
+    @responses.activate
+    def test_retry_signs_once(self):
+        class request_callback:
+            def __init__(self):
+                self.calls = 0
+
+            def __call__(self, req):
+                self.calls += 1
+                if self.calls < 4:
+                    return (503, {}, "Unavailable.")
+                return (200, {}, '{"status":"OK","results":[]}')
+
+        responses.add_callback(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            content_type="application/json",
+            callback=request_callback(),
+        )
+
+        policy = googlemaps.retry.RetryPolicy(base_delay=0.01)
+        client = googlemaps.Client(client_id="foo", client_secret="a2V5",
+                                   retry_policy=policy)
+        signed = []
+        generate_auth_url = client._generate_auth_url
+
+        def counting_generate_auth_url(*args, **kwargs):
+            signed.append(args)
+            return generate_auth_url(*args, **kwargs)
+
+        client._generate_auth_url = counting_generate_auth_url
+        client.geocode("Sesame St.")
+
+        self.assertEqual(4, len(responses.calls))
+        self.assertEqual(1, len(signed))
+        self.assertEqual(1, len({c.request.url for c in responses.calls}))
@@ -20,10 +20,12 @@
 from datetime import datetime
 from datetime import timedelta
 import time
+from unittest import mock
 
 import responses
 
 import googlemaps
+from . import CountingLimiter
 from . import TestCase
 
 
@@ -323,3 +325,48 @@ class DirectionsTest(TestCase):
             "alternatives=true&key=%s" % self.key,
             responses.calls[0].request.url,
         )
+
+    @responses.activate
+    def test_stream_routes(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/directions/json",
+            body='{"geocoded_waypoints":[],'
+                 '"routes":[{"legs":[{"steps":[{"html_instructions":"x"}],'
+                 '"distance":{"value":18672}}],"summary":"M4"},'
+                 '{"legs":[],"summary":"A44"}],"status":"OK"}',
+            status=200,
+            content_type="application/json",
+        )
+
+        routes = self.client.directions(
+            "Sydney Town Hall", "Parramatta Town Hall", alternatives=True,
+            stream_routes=True, skip_keys=["steps"])
+
+        self.assertEqual(
+            {"legs": [{"distance": {"value": 18672}}], "summary": "M4"},
+            next(routes))
+        self.assertEqual([{"legs": [], "summary": "A44"}], list(routes))
+
+    @responses.activate
+    def test_stream_routes_over_query_limit(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/directions/json",
+            body='{"geocoded_waypoints":[],"routes":[],'
+                 '"status":"OVER_QUERY_LIMIT"}',
+            status=200,
+            content_type="application/json",
+        )
+
+        limiter = CountingLimiter()
+        client = googlemaps.Client(self.key, rate_limiter=limiter)
+        routes = client.directions("Sydney Town Hall", "Parramatta Town Hall",
+                                   stream_routes=True)
+
+        # The status is only read once the routes have been streamed.
+        with mock.patch.object(limiter, "record_over_query_limit") as record:
+            with self.assertRaises(googlemaps.exceptions.ApiError) as e:
+                list(routes)
+        self.assertEqual("OVER_QUERY_LIMIT", e.exception.status)
+        record.assert_called_once_with()
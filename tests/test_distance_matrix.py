@@ -19,10 +19,12 @@
 
 from datetime import datetime
 import time
+from unittest import mock
 
 import responses
 
 import googlemaps
+from . import CountingLimiter
 from . import TestCase
 
 
@@ -216,3 +218,69 @@ class DistanceMatrixTest(TestCase):
             "place_id%%3AChIJjQmTaV0E9YgRC2MLmS_e_mY" % self.key,
             responses.calls[0].request.url,
         )
+
+    @responses.activate
+    def test_stream_rows(self):
+        element = ('{"distance":{"text":"1 km","value":1000},'
+                   '"duration_in_traffic":{"text":"2 mins","value":120},'
+                   '"status":"OK"}')
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/distancematrix/json",
+            body='{"destination_addresses":["Uluru"],'
+                 '"origin_addresses":["Perth","Sydney"],'
+                 '"rows":[{"elements":[%s]},{"elements":[%s]}],'
+                 '"status":"OK"}' % (element, element),
+            status=200,
+            content_type="application/json",
+        )
+
+        rows = self.client.distance_matrix(
+            ["Perth", "Sydney"], "Uluru", stream_rows=True,
+            skip_keys=["duration_in_traffic"])
+
+        row = {"elements": [{"distance": {"text": "1 km", "value": 1000},
+                             "status": "OK"}]}
+        self.assertEqual([row, row], list(rows))
+        self.assertEqual(1, len(responses.calls))
+
+    @responses.activate
+    def test_stream_rows_error(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/distancematrix/json",
+            body='{"destination_addresses":[],"error_message":"Denied",'
+                 '"origin_addresses":[],"rows":[],'
+                 '"status":"REQUEST_DENIED"}',
+            status=200,
+            content_type="application/json",
+        )
+
+        rows = self.client.distance_matrix("Perth", "Uluru", stream_rows=True)
+
+        with self.assertRaises(googlemaps.exceptions.ApiError) as e:
+            list(rows)
+        self.assertEqual("REQUEST_DENIED", e.exception.status)
+        self.assertEqual("Denied", e.exception.message)
+
+    @responses.activate
+    def test_stream_rows_over_query_limit(self):
+        responses.add(
+            responses.GET,
+            "https://maps.googleapis.com/maps/api/distancematrix/json",
+            body='{"destination_addresses":[],"origin_addresses":[],'
+                 '"rows":[],"status":"OVER_QUERY_LIMIT"}',
+            status=200,
+            content_type="application/json",
+        )
+
+        limiter = CountingLimiter()
+        client = googlemaps.Client(self.key, rate_limiter=limiter)
+        rows = client.distance_matrix("Perth", "Uluru", stream_rows=True)
+
+        # The status is only read once the rows have been streamed.
+        with mock.patch.object(limiter, "record_over_query_limit") as record:
+            with self.assertRaises(googlemaps.exceptions.ApiError) as e:
+                list(rows)
+        self.assertEqual("OVER_QUERY_LIMIT", e.exception.status)
+        record.assert_called_once_with()
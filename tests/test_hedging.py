@@ -0,0 +1,55 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Tests for the hedging module."""
+
+import googlemaps.hedging as hedging
+from . import TestCase
+
+
+class LatencyTrackerTest(TestCase):
+    def test_percentile(self):
+        tracker = hedging.LatencyTracker(percentile=90, min_samples=5)
+        for i in range(1, 11):
+            tracker.record("geocode", i / 10.0)
+
+        self.assertEqual(0.9, tracker.latency("geocode"))
+        self.assertIsNone(tracker.latency("places"))
+
+    def test_min_samples(self):
+        tracker = hedging.LatencyTracker(min_samples=3)
+        tracker.record("geocode", 0.1)
+        tracker.record("geocode", 0.2)
+        self.assertIsNone(tracker.latency("geocode"))
+
+        tracker.record("geocode", 0.3)
+        self.assertEqual(0.3, tracker.latency("geocode"))
+
+    def test_window(self):
+        tracker = hedging.LatencyTracker(percentile=100, window=3,
+                                         min_samples=1)
+        for latency in (5.0, 0.1, 0.2, 0.3):
+            tracker.record("geocode", latency)
+
+        # The slow request has left the window.
+        self.assertEqual(0.3, tracker.latency("geocode"))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            hedging.LatencyTracker(percentile=101)
+        with self.assertRaises(ValueError):
+            hedging.LatencyTracker(window=0)
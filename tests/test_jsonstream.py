@@ -0,0 +1,88 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Tests for the jsonstream module."""
+
+import json
+
+import googlemaps.jsonstream as jsonstream
+from . import TestCase
+
+_BODY = {
+    "destination_addresses": ["Uluru", "Kakadu"],
+    "rows": [
+        {"elements": [{"distance": {"value": 1000}, "status": "OK"}] * 2},
+        {"elements": [{"distance": {"value": 2.5e3}, "status": "OK"}] * 2},
+    ],
+    "error_message": "Ünïcode",
+    "count": -12345,
+    "status": "OK",
+}
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class ArrayStreamTest(TestCase):
+    def test_chunk_sizes(self):
+        for indent in (None, 2):
+            data = json.dumps(_BODY, indent=indent,
+                              ensure_ascii=False).encode("utf-8")
+            for size in (1, 2, 7, 64, len(data)):
+                stream = jsonstream.ArrayStream(_chunks(data, size), "rows")
+                self.assertEqual(_BODY["rows"], list(stream))
+                self.assertEqual(
+                    {k: v for k, v in _BODY.items() if k != "rows"},
+                    stream.fields)
+
+    def test_yields_items_as_read(self):
+        data = json.dumps(_BODY).encode("utf-8")
+        read = []
+
+        def chunks():
+            for chunk in _chunks(data, 16):
+                read.append(chunk)
+                yield chunk
+
+        next(iter(jsonstream.ArrayStream(chunks(), "rows")))
+        self.assertLess(sum(len(chunk) for chunk in read), len(data))
+
+    def test_skip_keys(self):
+        data = json.dumps(_BODY).encode("utf-8")
+        stream = jsonstream.ArrayStream([data], "rows",
+                                        skip_keys=["distance"])
+
+        self.assertEqual([{"elements": [{"status": "OK"}] * 2}] * 2,
+                         list(stream))
+        # Only the items are pruned.
+        self.assertEqual(["Uluru", "Kakadu"],
+                         stream.fields["destination_addresses"])
+
+    def test_missing_key(self):
+        stream = jsonstream.ArrayStream([b'{"status": "NOT_FOUND"}'], "rows")
+        self.assertEqual([], list(stream))
+        self.assertEqual({"status": "NOT_FOUND"}, stream.fields)
+
+        stream = jsonstream.ArrayStream([b' { } '], "rows")
+        self.assertEqual([], list(stream))
+
+    def test_invalid(self):
+        for data in (b'["rows"]', b'{"rows": [1 2]}', b'{"rows": [{"a":',
+                     b'{"rows": [1], "status": "OK"', b'{"rows": [1.e]}'):
+            with self.assertRaises(ValueError):
+                list(jsonstream.ArrayStream(_chunks(data, 3), "rows"))
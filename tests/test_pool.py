@@ -0,0 +1,134 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Tests for the pool module."""
+
+import http.server
+import socket
+import threading
+
+import requests
+
+import googlemaps
+import googlemaps.client as _client
+import googlemaps.pool as pool
+from . import TestCase
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections open.
+
+    def do_GET(self):
+        body = b'{"status":"OK"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PoolAdapterTest(TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0),
+                                                      _Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, args=(0.05,),
+                         daemon=True).start()
+        self.url = "http://127.0.0.1:%d" % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_stats(self):
+        session = requests.Session()
+        pool.mount_adapters(session, pool_maxsize=4)
+        for _ in range(3):
+            session.get(self.url + "/maps/api/geocode/json")
+
+        self.assertEqual({self.url: {"maxsize": 4, "in_use": 0, "idle": 1,
+                                     "connections": 1, "requests": 3,
+                                     "reused": 2}},
+                         pool.pool_stats(session))
+
+    def test_keepalive(self):
+        session = requests.Session()
+        pool.mount_adapters(session, pool_maxsize=4, keepalive=30)
+        session.get(self.url)
+
+        adapter = session.get_adapter(self.url)
+        conn_pool, = adapter.poolmanager.pools._container.values()
+        conn = conn_pool.pool.get()
+        self.assertEqual(1, conn.sock.getsockopt(socket.SOL_SOCKET,
+                                                 socket.SO_KEEPALIVE))
+
+    def test_pools(self):
+        session = requests.Session()
+        pool.mount_adapters(
+            session, pool_maxsize=4,
+            pools={"https://roads.googleapis.com": {"pool_maxsize": 50}})
+
+        roads = session.get_adapter("https://roads.googleapis.com/v1/x")
+        maps = session.get_adapter("https://maps.googleapis.com/maps/api/x")
+        self.assertEqual(50, roads._pool_maxsize)
+        self.assertEqual(4, maps._pool_maxsize)
+
+        # Hosts with a pool_maxsize of their own aren't resized.
+        pool.resize_pools(
+            session, 8,
+            pools={"https://roads.googleapis.com": {"pool_maxsize": 50}})
+        self.assertEqual(50, roads._pool_maxsize)
+        self.assertEqual(8, maps._pool_maxsize)
+
+    def test_resize_keeps_connections(self):
+        client = googlemaps.Client(key="AIzaasdf")
+        self.assertEqual({self.url: 3}, client.warmup([self.url], 3))
+        adapter = client.session.get_adapter(self.url)
+
+        list(client.map(lambda client: None, [{}], max_workers=50))
+
+        self.assertIs(adapter, client.session.get_adapter(self.url))
+        stats = client.pool_stats()[self.url]
+        self.assertEqual(2 * 50 + _client._BACKGROUND_WORKERS,
+                         stats["maxsize"])
+        self.assertEqual(3, stats["idle"])
+
+        # Requests go on using the warmed connections.
+        for _ in range(3):
+            client.session.get(self.url)
+        self.assertEqual(1, len(adapter.poolmanager.pools))
+        self.assertEqual({"maxsize": 2 * 50 + _client._BACKGROUND_WORKERS,
+                          "in_use": 0, "idle": 3, "connections": 3,
+                          "requests": 3, "reused": 3},
+                         client.pool_stats()[self.url])
+
+    def test_reset_pools(self):
+        session = requests.Session()
+        pool.mount_adapters(session, pool_maxsize=4)
+        session.get(self.url)
+        adapter = session.get_adapter(self.url)
+        conn_pool, = adapter.poolmanager.pools._container.values()
+
+        pool.reset_pools(session)
+
+        self.assertEqual({}, pool.pool_stats(session))
+        self.assertEqual(4, adapter.poolmanager.connection_pool_kw["maxsize"])
+        # The inherited connection is left open.
+        self.assertIsNotNone(conn_pool.pool.get().sock)
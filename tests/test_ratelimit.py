@@ -0,0 +1,352 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Tests for the ratelimit module."""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import googlemaps.ratelimit as ratelimit
+from . import FakeClock
+from . import TestCase
+
+
+class TokenBucketTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_burst(self):
+        bucket = ratelimit.TokenBucket(3, clock=self.clock)
+
+        self.assertEqual([0, 0, 0], [bucket.reserve() for _ in range(3)])
+        self.assertAlmostEqual(1 / 3.0, bucket.reserve())
+        self.assertAlmostEqual(2 / 3.0, bucket.reserve())
+
+    def test_refill(self):
+        bucket = ratelimit.TokenBucket(2, burst=2, clock=self.clock)
+        bucket.reserve()
+        bucket.reserve()
+
+        self.clock.now += 0.5
+        self.assertEqual(0, bucket.reserve())
+        self.assertAlmostEqual(0.5, bucket.reserve())
+
+        # Idle time doesn't accumulate beyond the burst size.
+        self.clock.now += 60
+        self.assertEqual([0, 0], [bucket.reserve() for _ in range(2)])
+        self.assertAlmostEqual(0.5, bucket.reserve())
+
+    def test_fractional_rate(self):
+        bucket = ratelimit.TokenBucket(0.5, clock=self.clock)
+
+        self.assertEqual(0, bucket.reserve())
+        self.assertAlmostEqual(2, bucket.reserve())
+        self.assertAlmostEqual(4, bucket.reserve())
+
+    def test_custom_burst(self):
+        bucket = ratelimit.TokenBucket(1, burst=5, clock=self.clock)
+
+        self.assertEqual([0] * 5, [bucket.reserve() for _ in range(5)])
+        self.assertAlmostEqual(1, bucket.reserve())
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            ratelimit.TokenBucket(0)
+        with self.assertRaises(ValueError):
+            ratelimit.TokenBucket(1, burst=0)
+
+    def test_threads(self):
+        bucket = ratelimit.TokenBucket(10, burst=1, clock=self.clock)
+        delays = []
+
+        def reserve():
+            for _ in range(100):
+                delays.append(bucket.reserve())
+
+        threads = [threading.Thread(target=reserve) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # Every reservation gets its own slot, 0.1s apart.
+        self.assertEqual(list(range(800)),
+                         sorted(round(d * 10) for d in delays))
+
+    def test_wait_time(self):
+        bucket = ratelimit.TokenBucket(2, burst=1, clock=self.clock)
+
+        self.assertEqual(0, bucket.wait_time())
+        bucket.reserve()
+        self.assertAlmostEqual(0.5, bucket.wait_time())
+        # Peeking doesn't admit a request.
+        self.assertAlmostEqual(0.5, bucket.wait_time())
+        bucket.reserve()
+        self.assertAlmostEqual(1, bucket.wait_time())
+
+        self.clock.now += 1
+        self.assertEqual(0, bucket.wait_time())
+
+    def test_retry_after(self):
+        bucket = ratelimit.TokenBucket(10, clock=self.clock)
+        bucket.reserve()
+
+        bucket.record_retry_after(2)
+        self.assertAlmostEqual(2, bucket.reserve())
+        # The tokens earned while held back don't arrive as a burst.
+        self.assertAlmostEqual(2.1, bucket.reserve())
+
+        # A shorter pause than the queue already ahead changes nothing.
+        bucket.record_retry_after(1)
+        self.assertAlmostEqual(2.2, bucket.reserve())
+
+
+class CombinedRateLimiterTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_per_second_ceiling_within_per_minute_budget(self):
+        limiter = ratelimit.quota_rate_limiter(
+            queries_per_second=10, queries_per_minute=30, clock=self.clock)
+
+        # A second's worth at once, then paced at 10 QPS...
+        delays = [limiter.reserve() for _ in range(30)]
+        self.assertEqual([0] * 10, delays[:10])
+        for i, delay in enumerate(delays[10:20]):
+            self.assertAlmostEqual((i + 1) / 10.0, delay)
+
+        # ...until the minute's budget of 30 (plus the one token it regained
+        # meanwhile) is used, after which queries are paced at 30 per minute.
+        self.assertAlmostEqual(2, delays[29])
+        self.assertAlmostEqual(2.1, limiter.reserve())
+        self.assertAlmostEqual(4, limiter.wait_time())
+
+    def test_buckets_admit_together(self):
+        limiter = ratelimit.quota_rate_limiter(
+            queries_per_second=1, queries_per_minute=600, clock=self.clock)
+
+        self.assertEqual(0, limiter.reserve())
+        self.assertAlmostEqual(1, limiter.reserve())
+        self.assertAlmostEqual(2, limiter.reserve())
+
+        # Once the queue drains, the per-second rate applies again.
+        self.clock.now += 3
+        self.assertEqual(0, limiter.reserve())
+        self.assertAlmostEqual(1, limiter.wait_time())
+
+    def test_single_quota(self):
+        limiter = ratelimit.quota_rate_limiter(queries_per_minute=120,
+                                               clock=self.clock)
+        self.assertIsInstance(limiter, ratelimit.TokenBucket)
+        self.assertEqual(2, limiter.rate)
+        self.assertEqual(120, limiter.burst)
+
+        with self.assertRaises(ValueError):
+            ratelimit.quota_rate_limiter()
+
+
+@unittest.skipIf(ratelimit.fcntl is None, "fcntl is not available")
+class SharedRateLimiterTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "quota")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_shared_budget(self):
+        a = ratelimit.SharedRateLimiter(self.path, 3, None, clock=self.clock)
+        b = ratelimit.SharedRateLimiter(self.path, 3, None, clock=self.clock)
+
+        self.assertEqual([0, 0], [a.reserve(), b.reserve()])
+        self.assertEqual(0, a.reserve())
+        self.assertAlmostEqual(1 / 3.0, b.reserve())
+        self.assertAlmostEqual(2 / 3.0, a.wait_time())
+        self.assertAlmostEqual(2 / 3.0, b.wait_time())
+
+    def test_both_quotas(self):
+        limiter = ratelimit.SharedRateLimiter(self.path, 10, 30,
+                                              clock=self.clock)
+
+        delays = [limiter.reserve() for _ in range(31)]
+        self.assertEqual([0] * 10, delays[:10])
+        self.assertAlmostEqual(2.1, delays[30])
+
+    def test_retry_after(self):
+        a = ratelimit.SharedRateLimiter(self.path, 3, None, clock=self.clock)
+        b = ratelimit.SharedRateLimiter(self.path, 3, None, clock=self.clock)
+
+        a.record_retry_after(5)
+        self.assertAlmostEqual(5, b.reserve())
+
+    def test_state_reset_after_reboot(self):
+        a = ratelimit.SharedRateLimiter(self.path, 1, None, clock=self.clock)
+        a.reserve()
+        a.reserve()
+
+        # The clock restarts from zero after a reboot.
+        self.clock.now = 1.0
+        b = ratelimit.SharedRateLimiter(self.path, 1, None, clock=self.clock)
+        self.assertEqual(0, b.reserve())
+
+    def test_processes(self):
+        limiter = ratelimit.SharedRateLimiter(self.path, 10, None)
+        context = multiprocessing.get_context("fork")
+        queue = context.Queue()
+
+        def reserve():
+            # The time at which the last of this process's requests is sent.
+            queue.put(max(time.monotonic() + limiter.reserve()
+                          for _ in range(10)))
+
+        start = time.monotonic()
+        processes = [context.Process(target=reserve) for _ in range(4)]
+        for p in processes:
+            p.start()
+        last = max(queue.get(timeout=10) for _ in processes)
+        for p in processes:
+            p.join()
+
+        # 10 requests at once, then the other 30 at 10 per second.
+        self.assertTrue(2.9 < last - start < 3.5)
+
+
+class RateLimiterRegistryTest(TestCase):
+    def test_api_for_path(self):
+        self.assertEqual(
+            ("https://maps.googleapis.com", "/maps/api/place"),
+            ratelimit.api_for_path("https://maps.googleapis.com",
+                                   "/maps/api/place/details/json"))
+        self.assertEqual(
+            ("https://roads.googleapis.com", ""),
+            ratelimit.api_for_path("https://roads.googleapis.com",
+                                   "/v1/snapToRoads"))
+
+    def test_limiter_per_api(self):
+        registry = ratelimit.RateLimiterRegistry(
+            lambda api: ratelimit.TokenBucket(1))
+        maps = "https://maps.googleapis.com"
+
+        geocode = registry.get(maps, "/maps/api/geocode/json")
+        self.assertIs(geocode, registry.get(maps, "/maps/api/geocode/json"))
+        self.assertIsNot(geocode,
+                         registry.get(maps, "/maps/api/directions/json"))
+        self.assertIsNot(geocode, registry.get("https://foo.com",
+                                               "/maps/api/geocode/json"))
+        self.assertEqual(3, len(registry.limiters()))
+
+    def test_overrides(self):
+        solar = ratelimit.TokenBucket(1)
+        place_details = ratelimit.TokenBucket(1)
+        registry = ratelimit.RateLimiterRegistry(
+            lambda api: ratelimit.TokenBucket(1),
+            {"https://solar.googleapis.com": solar,
+             ("https://maps.googleapis.com", "/maps/api/place/details"):
+                 place_details})
+
+        self.assertIs(solar, registry.get("https://solar.googleapis.com",
+                                          "/v1/dataLayers:get"))
+        self.assertIs(place_details,
+                      registry.get("https://maps.googleapis.com",
+                                   "/maps/api/place/details/json"))
+        self.assertIsNot(place_details,
+                         registry.get("https://maps.googleapis.com",
+                                      "/maps/api/place/textsearch/json"))
+        self.assertIs(solar,
+                      registry.limiters()[("https://solar.googleapis.com", "")])
+
+    def test_after_fork(self):
+        solar = ratelimit.TokenBucket(1)
+        registry = ratelimit.RateLimiterRegistry(
+            lambda api: ratelimit.quota_rate_limiter(10, 600),
+            {"https://solar.googleapis.com": solar})
+        geocode = registry.get("https://maps.googleapis.com",
+                               "/maps/api/geocode/json")
+        locks = [solar._lock, geocode._lock] + [
+            bucket._lock for bucket in geocode.buckets]
+
+        # As if other threads held the locks when the process forked.
+        for lock in locks:
+            lock.acquire()
+        registry.after_fork()
+
+        self.assertEqual(0, geocode.reserve())
+        self.assertEqual(0, solar.reserve())
+        self.assertEqual(2, len(registry.limiters()))
+
+
+class AdaptiveTokenBucketTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_decrease(self):
+        bucket = ratelimit.AdaptiveTokenBucket(10, clock=self.clock)
+        self.assertEqual(10, bucket.effective_rate())
+
+        bucket.record_over_query_limit()
+        self.assertEqual(5, bucket.effective_rate())
+        self.assertEqual(5, bucket.burst)
+
+        # Rejections within the cooldown come from the same overload.
+        bucket.record_over_query_limit()
+        self.assertEqual(5, bucket.effective_rate())
+
+        self.clock.now += 1
+        bucket.record_over_query_limit()
+        self.assertEqual(2.5, bucket.effective_rate())
+
+    def test_min_rate(self):
+        bucket = ratelimit.AdaptiveTokenBucket(10, min_rate=4, cooldown=0,
+                                               clock=self.clock)
+        for _ in range(5):
+            bucket.record_over_query_limit()
+        self.assertEqual(4, bucket.effective_rate())
+
+    def test_increase(self):
+        bucket = ratelimit.AdaptiveTokenBucket(10, increase=1,
+                                               clock=self.clock)
+        bucket.record_over_query_limit()
+
+        # A second's worth of successes raises the rate by about `increase`.
+        for _ in range(5):
+            bucket.record_success()
+        self.assertAlmostEqual(6, bucket.effective_rate(), delta=0.1)
+
+        for _ in range(100):
+            bucket.record_success()
+        self.assertEqual(10, bucket.effective_rate())
+
+    def test_paces_at_effective_rate(self):
+        bucket = ratelimit.AdaptiveTokenBucket(4, clock=self.clock)
+        bucket.record_over_query_limit()
+
+        self.assertEqual([0, 0], [bucket.reserve() for _ in range(2)])
+        self.assertAlmostEqual(0.5, bucket.reserve())
+
+    def test_combined(self):
+        limiter = ratelimit.quota_rate_limiter(10, 6000, clock=self.clock,
+                                               adaptive=True)
+        self.assertEqual(10, limiter.effective_rate())
+
+        limiter.record_over_query_limit()
+        self.assertEqual(5, limiter.effective_rate())
@@ -0,0 +1,177 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Tests for the retry module."""
+
+from datetime import datetime
+from datetime import timezone
+
+import googlemaps.retry as retry
+from . import FakeClock
+from . import TestCase
+
+
+class RetryPolicyTest(TestCase):
+    def test_default_delay(self):
+        policy = retry.RetryPolicy()
+
+        for _ in range(100):
+            self.assertTrue(0.25 <= policy.delay(1) <= 0.75)
+            self.assertTrue(0.375 <= policy.delay(2) <= 1.125)
+
+    def test_max_delay(self):
+        policy = retry.RetryPolicy(max_delay=2, jitter=retry.EQUAL_JITTER)
+
+        for _ in range(100):
+            self.assertTrue(1 <= policy.delay(20) <= 2)
+
+    def test_full_jitter(self):
+        policy = retry.RetryPolicy(base_delay=1, multiplier=2,
+                                   jitter=retry.FULL_JITTER)
+
+        delays = [policy.delay(3) for _ in range(100)]
+        self.assertTrue(all(0 <= d <= 4 for d in delays))
+        self.assertTrue(any(d < 1 for d in delays))
+
+    def test_equal_jitter(self):
+        policy = retry.RetryPolicy(base_delay=1, multiplier=2,
+                                   jitter=retry.EQUAL_JITTER)
+
+        for _ in range(100):
+            self.assertTrue(2 <= policy.delay(3) <= 4)
+
+    def test_decorrelated_jitter(self):
+        policy = retry.RetryPolicy(base_delay=1, max_delay=10,
+                                   jitter=retry.DECORRELATED_JITTER)
+
+        for _ in range(100):
+            self.assertTrue(1 <= policy.delay(1) <= 3)
+            self.assertTrue(1 <= policy.delay(2, previous_delay=2) <= 6)
+            self.assertTrue(1 <= policy.delay(9, previous_delay=9) <= 10)
+
+    def test_unknown_jitter(self):
+        with self.assertRaises(ValueError):
+            retry.RetryPolicy(jitter="lots")
+
+    def test_max_attempts(self):
+        policy = retry.RetryPolicy(max_attempts=3)
+
+        self.assertTrue(policy.allows_retry(2))
+        self.assertFalse(policy.allows_retry(3))
+        self.assertTrue(policy.retries_status(500, 2))
+        self.assertFalse(policy.retries_status(500, 3))
+        self.assertTrue(retry.RetryPolicy().allows_retry(1000))
+
+    def test_retriable_statuses(self):
+        policy = retry.RetryPolicy(retriable_statuses={500: None, 503: 2})
+
+        self.assertTrue(policy.retries_status(500, 5))
+        self.assertTrue(policy.retries_status(503, 1))
+        self.assertFalse(policy.retries_status(503, 2))
+        self.assertFalse(policy.retries_status(504, 1))
+        self.assertFalse(policy.retries_status(200, 1))
+
+    def test_retry_after(self):
+        class Response:
+            def __init__(self, status_code, headers):
+                self.status_code = status_code
+                self.headers = headers
+
+        policy = retry.RetryPolicy()
+
+        self.assertEqual(3, policy.retry_after(
+            Response(429, {"Retry-After": "3"})))
+        self.assertEqual(3, policy.retry_after(
+            Response(503, {"Retry-After": "3"})))
+        self.assertIsNone(policy.retry_after(
+            Response(500, {"Retry-After": "3"})))
+        self.assertIsNone(policy.retry_after(Response(429, {})))
+
+
+class ParseRetryAfterTest(TestCase):
+    def test_seconds(self):
+        self.assertEqual(120, retry.parse_retry_after("120"))
+        self.assertEqual(0, retry.parse_retry_after(" 0 "))
+
+    def test_http_date(self):
+        now = datetime(2015, 10, 21, 7, 28, 0, tzinfo=timezone.utc)
+
+        self.assertEqual(30, retry.parse_retry_after(
+            "Wed, 21 Oct 2015 07:28:30 GMT", now=now))
+        # Dates in the past mean no wait.
+        self.assertEqual(0, retry.parse_retry_after(
+            "Wed, 21 Oct 2015 07:27:00 GMT", now=now))
+
+    def test_malformed(self):
+        self.assertIsNone(retry.parse_retry_after(None))
+        self.assertIsNone(retry.parse_retry_after(""))
+        self.assertIsNone(retry.parse_retry_after("-1"))
+        self.assertIsNone(retry.parse_retry_after("nan"))
+        self.assertIsNone(retry.parse_retry_after("soon"))
+
+
+class RetryBudgetTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_ratio(self):
+        budget = retry.RetryBudget(ratio=0.1, min_retries=0, clock=self.clock)
+        for _ in range(20):
+            budget.record_request()
+
+        self.assertEqual([True, True, False],
+                         [budget.try_retry() for _ in range(3)])
+        self.assertEqual({"requests": 20, "retries": 2, "rejected": 1,
+                          "available": 0}, budget.stats())
+
+    def test_min_retries(self):
+        budget = retry.RetryBudget(ratio=0.1, min_retries=3, clock=self.clock)
+        budget.record_request()
+
+        self.assertEqual([True] * 3 + [False],
+                         [budget.try_retry() for _ in range(4)])
+
+    def test_sliding_window(self):
+        budget = retry.RetryBudget(ratio=0.5, window=10, min_retries=0,
+                                   clock=self.clock)
+        for _ in range(4):
+            budget.record_request()
+        self.assertTrue(budget.try_retry())
+
+        # Half way through the window, both the requests and the retry
+        # still count.
+        self.clock.now += 5
+        self.assertTrue(budget.try_retry())
+        self.assertFalse(budget.try_retry())
+
+        # Once the requests have left the window, the later retry still
+        # counts against new ones.
+        self.clock.now += 5
+        self.assertFalse(budget.try_retry())
+        budget.record_request()
+        budget.record_request()
+        self.assertFalse(budget.try_retry())
+        budget.record_request()
+        budget.record_request()
+        self.assertTrue(budget.try_retry())
+        self.assertEqual(3, budget.stats()["retries"])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            retry.RetryBudget(ratio=-1)
+        with self.assertRaises(ValueError):
+            retry.RetryBudget(window=0)
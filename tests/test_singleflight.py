@@ -0,0 +1,58 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Tests for the singleflight module."""
+
+import googlemaps.singleflight as singleflight
+from . import TestCase
+
+
+class SingleFlightTest(TestCase):
+    def test_coalesce(self):
+        flights = singleflight.SingleFlight()
+        flight, leader = flights.begin("a")
+        follower, following = flights.begin("a")
+        _, other = flights.begin("b")
+
+        self.assertTrue(leader)
+        self.assertFalse(following)
+        self.assertIs(flight, follower)
+        self.assertTrue(other)
+        self.assertEqual({"in_flight": 2, "sent": 2, "coalesced": 1},
+                         flights.stats())
+
+        flights.end("a", "response")
+        self.assertEqual("response", follower.result())
+        self.assertTrue(flights.begin("a")[1])
+
+    def test_exception(self):
+        flights = singleflight.SingleFlight()
+        flights.begin("a")
+        follower, _ = flights.begin("a")
+        flights.end("a", exception=ValueError("failed"))
+
+        with self.assertRaises(ValueError):
+            follower.result()
+
+    def test_abandoned(self):
+        flights = singleflight.SingleFlight()
+        flights.begin("a")
+        follower, _ = flights.begin("a")
+        flights.end("a")
+
+        self.assertIsNone(follower.result())
+        self.assertEqual(0, flights.stats()["in_flight"])
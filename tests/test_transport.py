@@ -0,0 +1,193 @@
+#
+# Copyright 2014 Google Inc. All rights reserved.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+
+"""Tests for the transport module."""
+
+import http.server
+import json
+import threading
+import time
+import unittest
+
+import requests
+
+import googlemaps
+import googlemaps.transport as transport
+from . import TestCase
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, body):
+        if self.path.startswith("/slow"):
+            time.sleep(0.5)
+        body = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond({"status": "OK", "path": self.path,
+                       "agent": self.headers.get("User-Agent"),
+                       "encoding": self.headers.get("Accept-Encoding")})
+
+    def do_HEAD(self):
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        self._respond({"status": "OK",
+                       "body": json.loads(self.rfile.read(length)),
+                       "type": self.headers.get("Content-Type")})
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+    def handle_error(self, request, client_address):
+        pass  # Clients hang up on /slow.
+
+
+class _TransportTests:
+    """Tests run against each transport."""
+
+    def setUp(self):
+        self.server = _Server(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, args=(0.05,),
+                         daemon=True).start()
+        self.url = "http://127.0.0.1:%d" % self.server.server_port
+        self.transport = self.make_transport()
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get(self):
+        response = self.transport.request(
+            "GET", self.url + "/maps/api/geocode/json?address=Sydney",
+            headers={"User-Agent": "test"}, timeout=5)
+
+        self.assertEqual(200, response.status_code)
+        body = response.json()
+        self.assertIn("gzip", body.pop("encoding"))
+        self.assertEqual({"status": "OK",
+                          "path": "/maps/api/geocode/json?address=Sydney",
+                          "agent": "test"}, body)
+
+    def test_post(self):
+        response = self.transport.request("POST", self.url + "/",
+                                          json={"considerIp": "true"},
+                                          timeout=5)
+        self.assertEqual({"considerIp": "true"}, response.json()["body"])
+        self.assertEqual("application/json", response.json()["type"])
+
+    def test_stream(self):
+        response = self.transport.request("GET", self.url + "/photo",
+                                          timeout=5, stream=True)
+        body = b"".join(response.iter_content(4))
+        self.assertEqual("/photo", json.loads(body)["path"])
+
+    def test_timeout(self):
+        with self.assertRaises(googlemaps.exceptions.Timeout):
+            self.transport.request("GET", self.url + "/slow", timeout=0.1)
+
+    def _wait_for_connections(self, connections):
+        deadline = time.monotonic() + 5
+        while (self.server.connections < connections and
+               time.monotonic() < deadline):
+            time.sleep(0.01)
+        self.assertEqual(connections, self.server.connections)
+
+    def test_warmup(self):
+        self.assertEqual(self.warm_connections,
+                         self.transport.warmup(self.url, 3, timeout=5))
+        self.transport.request("GET", self.url + "/", timeout=5)
+        self.assertEqual(self.warm_connections, self.server.connections)
+
+    def test_client_warmup(self):
+        client = googlemaps.Client(key="AIzaasdf", transport=self.transport,
+                                   warmup_hosts=[self.url],
+                                   warmup_connections=3,
+                                   rewarm_interval=0.05)
+        self._wait_for_connections(self.warm_connections)
+
+        # Connections closed while idle are opened again.
+        self.transport.close()
+        self._wait_for_connections(2 * self.warm_connections)
+
+        self.assertEqual({"http://127.0.0.1:1": 0},
+                         client.warmup(["http://127.0.0.1:1"], timeout=1))
+
+    def test_client(self):
+        client = googlemaps.Client(key="AIzaasdf", base_url=self.url,
+                                   transport=self.transport)
+        body = client._request("/maps/api/geocode/json",
+                               {"address": "Sydney"})
+        self.assertEqual(
+            "/maps/api/geocode/json?address=Sydney&key=AIzaasdf",
+            body["path"])
+
+    def test_requests_kwargs(self):
+        def make_client():
+            return googlemaps.Client(
+                key="AIzaasdf", transport=self.transport,
+                requests_kwargs={"allow_redirects": False, "timeout": 5})
+
+        if self.all_kwargs:
+            make_client()
+        else:
+            with self.assertRaises(ValueError):
+                make_client()
+
+
+class RequestsTransportTest(_TransportTests, TestCase):
+    warm_connections = 3
+    all_kwargs = True
+
+    def make_transport(self):
+        return transport.RequestsTransport(requests.Session())
+
+
+class Urllib3TransportTest(_TransportTests, TestCase):
+    warm_connections = 3
+    all_kwargs = False
+
+    def make_transport(self):
+        return transport.Urllib3Transport()
+
+
+@unittest.skipIf(transport.httpx is None, "httpx is not installed")
+class HTTP2TransportTest(_TransportTests, TestCase):
+    warm_connections = 1
+    all_kwargs = False
+
+    def make_transport(self):
+        return transport.HTTP2Transport()